@@ -27,6 +27,12 @@ if 'BASE_URL' in os.environ:
 if 'SECRET_KEY' in os.environ:
     app.config['SECRET_KEY'] = os.environ['SECRET_KEY']
 
+if 'DATABASE_ENGINE' in os.environ:
+    app.config['DATABASE_ENGINE'] = os.environ['DATABASE_ENGINE']
+
+if 'SQLITE_DATABASE' in os.environ:
+    app.config['SQLITE_DATABASE'] = os.environ['SQLITE_DATABASE']
+
 if 'AUTH_REQUIRED' in os.environ:
     app.config['AUTH_REQUIRED'] = True if os.environ['AUTH_REQUIRED'] == 'True' else False
 
@@ -114,9 +120,11 @@ if sys.version_info[0] == 2:
     import oembed.views
     import management.views
     import auth
+    import housekeeping
 else:
     from .views import *
     from .webhooks.views import *
     from .oembed.views import *
     from .management.views import *
     from .auth import *
+    from .housekeeping import *
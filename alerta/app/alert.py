@@ -19,6 +19,38 @@ DEFAULT_TIMEOUT = 86400
 
 prog = os.path.basename(sys.argv[0])
 
+BODY_ATTRIBUTES = {
+    'id': 'id',
+    'resource': 'resource',
+    'event': 'event',
+    'environment': 'environment',
+    'severity': 'severity',
+    'correlate': 'correlate',
+    'status': 'status',
+    'service': 'service',
+    'group': 'group',
+    'value': 'value',
+    'text': 'text',
+    'tags': 'tags',
+    'attributes': 'attributes',
+    'origin': 'origin',
+    'type': 'event_type',
+    'createTime': 'create_time',
+    'timeout': 'timeout',
+    'rawData': 'raw_data',
+    'customer': 'customer',
+    'duplicateCount': 'duplicate_count',
+    'repeat': 'repeat',
+    'previousSeverity': 'previous_severity',
+    'trendIndication': 'trend_indication',
+    'receiveTime': 'receive_time',
+    'lastReceiveId': 'last_receive_id',
+    'lastReceiveTime': 'last_receive_time',
+    'history': 'history'
+}
+DATE_ATTRIBUTES = ['createTime', 'receiveTime', 'lastReceiveTime']
+
+
 class DateEncoder(json.JSONEncoder):
     def default(self, obj):
 
@@ -59,7 +91,8 @@ class Alert(object):
         self.event_type = kwargs.get('event_type', kwargs.get('type', None)) or "exceptionAlert"
         self.create_time = kwargs.get('create_time', None) or datetime.datetime.utcnow()
         self.receive_time = None
-        self.timeout = kwargs.get('timeout', DEFAULT_TIMEOUT)
+        timeout = kwargs.get('timeout', None)
+        self.timeout = timeout if timeout is not None else DEFAULT_TIMEOUT
         self.raw_data = kwargs.get('raw_data', kwargs.get('rawData', None)) or ""
         self.customer = kwargs.get('customer', None)
 
@@ -236,7 +269,10 @@ class AlertDocument(object):
             "correlation-id": self.id
         }
 
-    def get_body(self, history=True):
+    def get_body(self, history=True, fields=None):
+
+        if fields:
+            return self._get_projected_body(fields, history)
 
         body = {
             'id': self.id,
@@ -271,6 +307,28 @@ class AlertDocument(object):
 
         return body
 
+    def _get_projected_body(self, fields, history=True):
+        """
+        Only serialize the fields selected by a query projection so that attributes that were
+        never fetched from the database are not filled in with defaults.
+        """
+        included = [f.split('.')[0] for f, v in fields.items() if v is True or v == 1]
+        if included:
+            keys = ['id'] + included + [f for f, v in fields.items() if isinstance(v, dict)]
+        else:
+            excluded = [f for f, v in fields.items() if not v]
+            keys = [k for k in BODY_ATTRIBUTES if k not in excluded]
+
+        body = dict()
+        for key in keys:
+            if key not in BODY_ATTRIBUTES or key in body or (key == 'history' and not history):
+                continue
+            if key in DATE_ATTRIBUTES:
+                body[key] = self.get_date(BODY_ATTRIBUTES[key], 'iso')
+            else:
+                body[key] = getattr(self, BODY_ATTRIBUTES[key])
+        return body
+
     def get_date(self, attr, fmt='iso', timezone='Europe/London'):
 
         tz = pytz.timezone(timezone)
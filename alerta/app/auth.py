@@ -1,8 +1,10 @@
 
 import jwt
-import requests
 import bcrypt
 import re
+import hashlib
+import threading
+import time
 
 try:
     import simplejson as json
@@ -38,7 +40,10 @@ except ImportError:
     from urlparse import parse_qsl
     from urllib import urlencode
 
-from alerta.app import app, db
+from alerta.app import app, db, timing
+from alerta.app.authz import snapshot as authz
+from alerta.app.cache import TTLCache
+from alerta.app.httpclient import http
 from alerta.app.utils import absolute_url, deepmerge
 
 BASIC_AUTH_REALM = "Alerta"
@@ -54,14 +59,49 @@ class Forbidden(Exception):
     pass
 
 
+key_cache = TTLCache(maxsize=app.config['API_KEY_CACHE_SIZE'], ttl=app.config['API_KEY_CACHE_TTL'])
+
+key_usage = dict()
+key_usage_lock = threading.Lock()
+key_usage_flushed = time.time()
+
+
 def verify_api_key(key):
-    key_info = db.is_key_valid(key)
-    if not key_info:
-        raise AuthError("API key '%s' is invalid" % key)
-    db.update_key(key)
+    key_info = key_cache.get(key)
+    if not key_info or key_info['expireTime'] <= datetime.utcnow():
+        key_info = db.is_key_valid(key)
+        if not key_info:
+            key_cache.delete(key)
+            raise AuthError("API key '%s' is invalid" % key)
+        key_cache.set(key, key_info)
+    record_key_usage(key)
     return key_info
 
 
+def record_key_usage(key):
+    interval = app.config['API_KEY_USAGE_FLUSH_INTERVAL']
+    if not interval:
+        db.update_key(key)
+        return
+    with key_usage_lock:
+        usage = key_usage.setdefault(key, {'count': 0, 'lastUsedTime': None})
+        usage['count'] += 1
+        usage['lastUsedTime'] = datetime.utcnow()
+        due = time.time() - key_usage_flushed >= interval
+    if due:  # also flushed by housekeeping, but that may not be running eg. HOUSEKEEPING_ENABLED is False
+        flush_key_usage()
+
+
+def flush_key_usage():
+    global key_usage, key_usage_flushed
+    with key_usage_lock:
+        usage, key_usage = key_usage, dict()
+        key_usage_flushed = time.time()
+    if usage:
+        db.update_keys_usage(usage)
+    return len(usage)
+
+
 def create_token(user, name, login, provider, customer, scopes):
     payload = {
         'iss': request.url_root,
@@ -89,6 +129,28 @@ def parse_token(token):
     return jwt.decode(token, key=app.config['SECRET_KEY'], audience=app.config['OAUTH2_CLIENT_ID'] or request.url_root)
 
 
+token_cache = TTLCache(maxsize=app.config['TOKEN_CACHE_SIZE'], ttl=app.config['TOKEN_CACHE_TTL'])
+
+
+def verify_token(token):
+    audience = app.config['OAUTH2_CLIENT_ID'] or request.url_root
+    cache_key = hashlib.sha256(('%s %s' % (audience, token)).encode('utf-8')).hexdigest()
+
+    claims = token_cache.get(cache_key)
+    if not claims:
+        payload = parse_token(token)
+        claims = {
+            'login': payload['login'],
+            'customer': payload.get('customer', None),
+            'scopes': payload.get('scope', '').split(' ')
+        }
+        ttl = app.config['TOKEN_CACHE_TTL']
+        if 'exp' in payload:
+            ttl = min(ttl, max(0, int(payload['exp'] - time.time())))  # never outlive the token
+        token_cache.set(cache_key, claims, ttl=ttl)
+    return claims
+
+
 def authenticate(message, status_code=401):
     return jsonify(status="error", message=message), status_code
 
@@ -104,66 +166,78 @@ def is_in_scope(scope):
         return False
 
 
+def authorize(scope):
+    """
+    Authenticate the request and check that it is in scope. Returns an error response, or None
+    if the request is allowed.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    m = re.match('Key (\S+)', auth_header)
+    key = m.group(1) if m else request.args.get('api-key', None)
+
+    if key:
+        try:
+            ki = verify_api_key(key)
+        except AuthError as e:
+            return authenticate(str(e), 401)
+        except Forbidden as e:
+            return authenticate(str(e), 403)
+        except Exception as e:
+            return authenticate(str(e), 500)
+        g.user = ki['user']
+        g.customer = ki.get('customer', None)
+        g.scopes = ki['scopes']
+
+        if is_in_scope(scope):
+            return None
+        else:
+            return authenticate('Missing required scope: %s' % scope, 403)
+
+    auth_header = request.headers.get('Authorization', '')
+    m = re.match('Bearer (\S+)', auth_header)
+    token = m.group(1) if m else None
+
+    if token:
+        try:
+            claims = verify_token(token)
+        except DecodeError:
+            return authenticate('Token is invalid')
+        except ExpiredSignature:
+            return authenticate('Token has expired')
+        except InvalidAudience:
+            return authenticate('Invalid audience')
+        g.user = claims['login']
+        g.customer = claims['customer']
+        g.scopes = claims['scopes']
+
+        if is_in_scope(scope):
+            return None
+        else:
+            return authenticate('Missing required scope: %s' % scope, 403)
+
+    if not app.config['AUTH_REQUIRED']:
+        return None
+
+    return authenticate('Missing authorization API Key or Bearer Token')
+
+
 def permission(scope):
     def decorated(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
 
-            auth_header = request.headers.get('Authorization', '')
-            m = re.match('Key (\S+)', auth_header)
-            key = m.group(1) if m else request.args.get('api-key', None)
-
-            if key:
-                try:
-                    ki = verify_api_key(key)
-                except AuthError as e:
-                    return authenticate(str(e), 401)
-                except Forbidden as e:
-                    return authenticate(str(e), 403)
-                except Exception as e:
-                    return authenticate(str(e), 500)
-                g.user = ki['user']
-                g.customer = ki.get('customer', None)
-                g.scopes = ki['scopes']
-
-                if is_in_scope(scope):
-                    return f(*args, **kwargs)
-                else:
-                    return authenticate('Missing required scope: %s' % scope, 403)
-
-            auth_header = request.headers.get('Authorization', '')
-            m = re.match('Bearer (\S+)', auth_header)
-            token = m.group(1) if m else None
-
-            if token:
-                try:
-                    payload = parse_token(token)
-                except DecodeError:
-                    return authenticate('Token is invalid')
-                except ExpiredSignature:
-                    return authenticate('Token has expired')
-                except InvalidAudience:
-                    return authenticate('Invalid audience')
-                g.user = payload['login']
-                g.customer = payload.get('customer', None)
-                g.scopes = payload.get('scope', '').split(' ')
-
-                if is_in_scope(scope):
-                    return f(*args, **kwargs)
-                else:
-                    return authenticate('Missing required scope: %s' % scope, 403)
-
-            if not app.config['AUTH_REQUIRED']:
-                return f(*args, **kwargs)
-
-            return authenticate('Missing authorization API Key or Bearer Token')
+            with timing.stage('auth'):
+                denied = authorize(scope)
+            if denied is not None:
+                return denied
+            return f(*args, **kwargs)
 
         return wrapped
     return decorated
 
 
 def scopes(user, groups):
-    return db.get_scopes_by_match(user, groups)
+    return authz.get_scopes(user, groups)
 
 
 class NoCustomerMatch(KeyError):
@@ -174,7 +248,7 @@ def customer_match(user, groups):
     if 'admin' in scopes(user, groups):
         return None
     else:
-        match = db.get_customer_by_match([user] + groups)
+        match = authz.get_customer(user, groups)
         if match:
             if match == '*':
                 return None
@@ -334,7 +408,7 @@ def google():
     }
 
     try:
-        r = requests.post(access_token_url, data=payload)
+        r = http.post(access_token_url, data=payload)
     except Exception:
         return jsonify(status="error", message="Failed to call Google API over HTTPS")
     token = r.json()
@@ -355,7 +429,7 @@ def google():
         return jsonify(status="error", message="User %s is not authorized" % email), 403
 
     headers = {'Authorization': 'Bearer ' + token['access_token']}
-    r = requests.get(people_api_url, headers=headers)
+    r = http.get(people_api_url, headers=headers)
     profile = r.json()
 
     if app.config['CUSTOMER_VIEWS']:
@@ -394,14 +468,14 @@ def github():
     }
 
     headers = {'Accept': 'application/json'}
-    r = requests.get(access_token_url, headers=headers, params=params)
+    r = http.get(access_token_url, headers=headers, params=params)
     access_token = r.json()
 
-    r = requests.get(github_api_url+'/user', params=access_token)
-    profile = r.json()
-
-    r = requests.get(github_api_url+'/user/orgs', params=access_token)  # list public and private Github orgs
-    organizations = [o['login'] for o in r.json()]
+    profile, orgs = http.gather(
+        lambda: http.get(github_api_url+'/user', params=access_token).json(),
+        lambda: http.get(github_api_url+'/user/orgs', params=access_token).json()  # list public and private Github orgs
+    )
+    organizations = [o['login'] for o in orgs]
     login = profile['login']
 
     if app.config['AUTH_REQUIRED'] and not ('*' in app.config['ALLOWED_GITHUB_ORGS']
@@ -440,16 +514,16 @@ def gitlab():
     }
 
     try:
-        r = requests.post(access_token_url, data=payload)
+        r = http.post(access_token_url, data=payload)
     except Exception:
         return jsonify(status="error", message="Failed to call Gitlab API over HTTPS")
     access_token = r.json()
 
-    r = requests.get(gitlab_api_url+'/user', params=access_token)
-    profile = r.json()
-
-    r = requests.get(gitlab_api_url+'/groups', params=access_token)
-    groups = [g['path'] for g in r.json()]
+    profile, gitlab_groups = http.gather(
+        lambda: http.get(gitlab_api_url+'/user', params=access_token).json(),
+        lambda: http.get(gitlab_api_url+'/groups', params=access_token).json()
+    )
+    groups = [g['path'] for g in gitlab_groups]
     login = profile['username']
 
     if app.config['AUTH_REQUIRED'] and not ('*' in app.config['ALLOWED_GITLAB_GROUPS']
@@ -487,13 +561,13 @@ def keycloak():
     }
 
     try:
-        r = requests.post(access_token_url, data=payload)
+        r = http.post(access_token_url, data=payload)
     except Exception:
         return jsonify(status="error", message="Failed to call Keycloak API over HTTPS")
     access_token = r.json()
 
     headers = {"Authorization": "{0} {1}".format(access_token['token_type'], access_token['access_token'])}
-    r = requests.get("{0}/auth/realms/{1}/protocol/openid-connect/userinfo".format(app.config['KEYCLOAK_URL'], app.config['KEYCLOAK_REALM']), headers=headers)
+    r = http.get("{0}/auth/realms/{1}/protocol/openid-connect/userinfo".format(app.config['KEYCLOAK_URL'], app.config['KEYCLOAK_REALM']), headers=headers)
     profile = r.json()
 
     roles = profile['roles']
@@ -0,0 +1,59 @@
+
+import threading
+
+from alerta.app import app, db
+
+
+class AuthzSnapshot(object):
+    """
+    In-memory copy of perms and customers keyed by match. It is reloaded whenever the
+    authz version in the database changes, so every login costs one lookup by _id instead
+    of a query per group.
+    """
+    def __init__(self):
+
+        self.version = ''  # never a valid version so first use loads snapshot
+        self.perms = dict()
+        self.customers = dict()
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+
+        version = db.get_authz_version()
+        if not force and version == self.version:
+            return
+
+        perms = dict()
+        for perm in db.get_perms():
+            perms.setdefault(perm['match'], set()).update(perm['scopes'])
+        customers = dict()
+        for customer in db.get_customers():
+            customers.setdefault(customer['match'], customer['customer'])
+
+        with self.lock:
+            self.perms, self.customers, self.version = perms, customers, version
+
+    def get_scopes(self, login, groups):
+
+        if login in app.config['ADMIN_USERS']:
+            return ['admin', 'read', 'write']
+
+        self.refresh()
+        perms = self.perms
+        scopes = set()
+        for group in groups:
+            scopes.update(perms.get(group, []))
+        return scopes or app.config['USER_DEFAULT_SCOPES']
+
+    def get_customer(self, login, groups):
+        """
+        Return the customer for the first of login or groups that has one.
+        """
+        self.refresh()
+        customers = self.customers
+        for match in [login] + list(groups):
+            if match in customers:
+                return customers[match]
+
+
+snapshot = AuthzSnapshot()
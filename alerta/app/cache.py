@@ -0,0 +1,55 @@
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    Thread-safe in-process cache. Entries expire after ttl seconds and the least recently
+    used entry is evicted once maxsize is reached. A ttl of zero disables the cache.
+    """
+    def __init__(self, maxsize=1000, ttl=60):
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+
+        with self.lock:
+            try:
+                value, expires = self.data.pop(key)
+            except KeyError:
+                return default
+            if expires <= time.time():
+                return default
+            self.data[key] = (value, expires)  # move to end as most recently used
+            return value
+
+    def set(self, key, value, ttl=None):
+
+        ttl = self.ttl if ttl is None else ttl
+        if not ttl or not self.maxsize:
+            return
+        with self.lock:
+            self.data.pop(key, None)
+            while len(self.data) >= self.maxsize:
+                self.data.popitem(last=False)
+            self.data[key] = (value, time.time() + ttl)
+
+    def delete(self, key):
+
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+
+        return len(self.data)
@@ -0,0 +1,524 @@
+
+import threading
+
+from collections import OrderedDict
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from alerta.app import app, status_code
+from alerta.app.database import mongo, monitor, slowlog, query as q
+
+
+LOG = app.logger
+
+# Fields with a hash index of value to document ids, used when a query requires equality
+HASH_INDEXES = {
+    'alerts': ['resource', 'event', 'environment', 'lastReceiveId'],
+    'alerts_archive': ['resource', 'lastReceiveId'],
+    'heartbeats': ['origin'],
+    'blackouts': ['environment'],
+    'users': ['login', 'hash'],
+    'keys': ['key', 'user'],
+    'perms': ['match'],
+    'customers': ['match'],
+    'metrics': ['name']
+}
+
+
+class Cursor(object):
+    """
+    Result of Collection.find(), evaluated when it is iterated.
+    """
+    def __init__(self, collection, filter=None, projection=None, sort=None):
+
+        self.collection = collection
+        self.filter = filter
+        self.projection = projection
+        self._sort = sort
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction=None):
+
+        self._sort = [(key, direction)] if direction is not None else key
+        return self
+
+    def skip(self, skip):
+
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+
+        self._limit = limit
+        return self
+
+    @monitor.command('count')
+    def count(self, with_limit_and_skip=False):
+
+        if with_limit_and_skip:
+            return len(self._find())
+        return self.collection.count(self.filter)
+
+    def _find(self):
+
+        return self.collection._find(self.filter, self._sort, self._skip, self._limit, self.projection)
+
+    @monitor.command('find')
+    def __iter__(self):
+
+        with self.collection._reading():
+            return iter([self.collection._project(doc, self.projection) for doc in self._find()])
+
+
+class Collection(object):
+    """
+    Documents held in a dict by _id with hash indexes on selected fields. Reads and writes
+    take the collection lock so that each operation is atomic, like a single document
+    operation in MongoDB. Documents are copied in and out so callers never share state.
+    """
+    def __init__(self, database, name, indexes=None):
+
+        self.database = database
+        self.name = name
+        self.lock = threading.RLock()
+        self.docs = OrderedDict()
+        self.order = dict()
+        self.seq = 0
+        self.indexes = dict((field, dict()) for field in indexes or [])
+        self.index_info = dict()
+
+    # indexes
+
+    @staticmethod
+    def _index_keys(doc, field):
+
+        values = q.resolve(doc, field)
+        if not values:
+            return [None]
+        keys = list()
+        for value in values:
+            for v in (value if isinstance(value, list) else [value]):
+                v = q.normalize(v)
+                try:
+                    hash(v)
+                except TypeError:
+                    continue
+                keys.append(v)
+        return keys
+
+    def _index(self, doc):
+
+        for field, index in self.indexes.items():
+            for key in self._index_keys(doc, field):
+                index.setdefault(key, set()).add(doc['_id'])
+
+    def _unindex(self, doc):
+
+        for field, index in self.indexes.items():
+            for key in self._index_keys(doc, field):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(doc['_id'])
+                    if not ids:
+                        del index[key]
+
+    def _plan(self, filter):
+        """
+        Return the most selective equality on _id or an indexed field and the ids it matches,
+        or None to scan everything.
+        """
+        equals = q.equality_fields(filter)
+
+        best, best_ids = None, None
+        if '_id' in equals:
+            best, best_ids = '_id', set(v for v in equals['_id'] if v in self.docs)
+        for field, index in self.indexes.items():
+            if field in equals:
+                ids = set()
+                for value in equals[field]:
+                    ids.update(index.get(value, ()))
+                if best_ids is None or len(ids) < len(best_ids):
+                    best, best_ids = field, ids
+        return best, best_ids
+
+    def _candidates(self, filter):
+        """
+        Use the most selective equality on _id or an indexed field, otherwise scan everything.
+        """
+        best = self._plan(filter)[1]
+        if best is None:
+            return list(self.docs.values())
+        return [self.docs[_id] for _id in sorted(best, key=self.order.get)]  # in insertion order
+
+    def _find(self, filter=None, sort=None, skip=0, limit=0, projection=None):
+        """
+        Return stored documents that match, the projection is only a hint of the fields needed.
+        """
+        with self._reading():
+            docs = [doc for doc in self._candidates(filter) if q.match(doc, filter)]
+            if sort:
+                docs = q.sort(docs, sort)
+            if skip:
+                docs = docs[skip:]
+            if limit:
+                docs = docs[:limit]
+            return docs
+
+    def _reading(self):
+
+        return self.lock
+
+    def _find_for_update(self, filter, sort=None, limit=0):
+
+        return self._find(filter, sort, limit=limit)
+
+    def _project(self, doc, projection):
+
+        return q.project(doc, projection)
+
+    def create_index(self, keys, name=None, **kwargs):
+
+        if not isinstance(keys, list):
+            keys = [(keys, 1)]
+        name = name or '_'.join(['%s_%s' % k for k in keys])
+        kwargs.pop('background', None)
+        self.index_info[name] = dict(key=list(keys), **kwargs)
+        return name
+
+    def index_information(self):
+
+        info = {'_id_': {'key': [('_id', 1)]}}
+        info.update(self.index_info)
+        return info
+
+    def drop_index(self, name):
+
+        self.index_info.pop(name, None)
+
+    def index_keys(self):
+
+        keys = dict((name, [tuple(k) for k in info['key']]) for name, info in self.index_information().items())
+        keys.update(('hash_%s' % field, [(field, 1)]) for field in self.indexes)
+        return keys
+
+    def explain(self, filter, sort=None):
+        """
+        Whether a query would use a hash index and how many documents it would examine.
+        """
+        with self._reading():
+            field, ids = self._plan(filter)
+            examined = len(self.docs) if ids is None else len(ids)
+            return {
+                'stage': 'COLLSCAN' if ids is None else 'IDHACK' if field == '_id' else 'IXSCAN',
+                'indexName': None if ids is None else '_id_' if field == '_id' else 'hash_%s' % field,
+                'docsExamined': examined,
+                'nReturned': len(self._find(filter)),
+                'sortInMemory': bool(sort)
+            }
+
+    # reads
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0):
+
+        return Cursor(self, filter, projection, sort).skip(skip).limit(limit)
+
+    @monitor.command('find')
+    def find_one(self, filter=None, projection=None, sort=None):
+
+        with self._reading():
+            for doc in self._find(filter, sort, limit=1, projection=projection):
+                return self._project(doc, projection)
+
+    @monitor.command('count')
+    def count(self, filter=None):
+
+        return len(self._find(filter))
+
+    @monitor.command('aggregate')
+    def count_documents(self, filter):
+
+        return self.count(filter)
+
+    def _aggregate(self, pipeline):
+
+        with self._reading():
+            return q.aggregate(self.docs.values(), pipeline, lookup=self._lookup)
+
+    def _lookup(self, name, pipeline):
+
+        return self.database[name]._aggregate(pipeline)
+
+    @monitor.command('aggregate')
+    def aggregate(self, pipeline):
+
+        with self._reading():
+            return iter([q.copy_value(doc) for doc in self._aggregate(pipeline)])
+
+    # writes
+
+    def _insert(self, doc):
+
+        doc = q.copy_value(doc)
+        doc.setdefault('_id', ObjectId())
+        if doc['_id'] in self.docs:
+            raise DuplicateKeyError('E11000 duplicate key error collection: %s index: _id_ dup key: { _id: %r }' % (self.name, doc['_id']), 11000)
+        self.docs[doc['_id']] = doc
+        self.seq += 1
+        self.order[doc['_id']] = self.seq
+        self._index(doc)
+        return doc
+
+    def _update(self, doc, changes, insert=False):
+
+        self._unindex(doc)
+        try:
+            return q.update(doc, changes, insert=insert)
+        finally:
+            self._index(doc)
+
+    def _remove(self, doc):
+
+        self._unindex(doc)
+        del self.docs[doc['_id']]
+        del self.order[doc['_id']]
+
+    def _upsert(self, filter, changes):
+
+        doc = q.seed(filter)
+        q.update(doc, changes, insert=True)
+        return self._insert(doc)
+
+    @monitor.command('insert')
+    def insert_one(self, document):
+
+        with self.lock:
+            doc = self._insert(document)
+        document['_id'] = doc['_id']
+        return InsertOneResult(doc['_id'], True)
+
+    @monitor.command('insert')
+    def insert_many(self, documents, ordered=True):
+        """
+        Insert documents under one lock, stopping at the first duplicate if ordered or else skipping it.
+        """
+        ids = list()
+        errors = list()
+        with self.lock:
+            for index, document in enumerate(documents):
+                try:
+                    doc = self._insert(document)
+                except DuplicateKeyError as e:
+                    errors.append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': document})
+                    if ordered:
+                        break
+                    continue
+                document['_id'] = doc['_id']
+                ids.append(doc['_id'])
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': len(ids),
+                                  'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []})
+        return InsertManyResult(ids, True)
+
+    def _update_docs(self, filter, changes, upsert=False, multi=False):
+
+        with self.lock:
+            docs = self._find_for_update(filter, limit=0 if multi else 1)
+            if not docs and upsert:
+                doc = self._upsert(filter, changes)
+                return {'n': 1, 'nModified': 0, 'upserted': doc['_id']}
+            modified = sum(1 for doc in docs if self._update(doc, changes))
+            return {'n': len(docs), 'nModified': modified}
+
+    @monitor.command('update')
+    def update_one(self, filter, update, upsert=False):
+
+        return UpdateResult(self._update_docs(filter, update, upsert), True)
+
+    @monitor.command('update')
+    def update_many(self, filter, update, upsert=False):
+
+        return UpdateResult(self._update_docs(filter, update, upsert, multi=True), True)
+
+    @monitor.command('update')
+    def replace_one(self, filter, replacement, upsert=False):
+
+        return UpdateResult(self._update_docs(filter, replacement, upsert), True)
+
+    @monitor.command('findAndModify')
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE):
+
+        with self.lock:
+            docs = self._find_for_update(filter, sort, limit=1)
+            if docs:
+                before = self._project(docs[0], projection)
+                self._update(docs[0], update)
+                return self._project(docs[0], projection) if return_document else before
+            if upsert:
+                doc = self._upsert(filter, update)
+                return self._project(doc, projection) if return_document else None
+
+    def _delete(self, filter, multi=False):
+
+        with self.lock:
+            docs = self._find_for_update(filter, limit=0 if multi else 1)
+            for doc in docs:
+                self._remove(doc)
+            return {'n': len(docs)}
+
+    @monitor.command('delete')
+    def delete_one(self, filter):
+
+        return DeleteResult(self._delete(filter), True)
+
+    @monitor.command('delete')
+    def delete_many(self, filter):
+
+        return DeleteResult(self._delete(filter, multi=True), True)
+
+    @monitor.command('bulkWrite')
+    def bulk_write(self, requests, ordered=True):
+        """
+        Apply InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne and DeleteMany requests.
+        """
+        result = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        with self.lock:
+            for index, request in enumerate(requests):
+                op = type(request).__name__
+                if op == 'InsertOne':
+                    self.insert_one(request._doc)
+                    result['nInserted'] += 1
+                elif op in ('UpdateOne', 'UpdateMany', 'ReplaceOne'):
+                    r = self._update_docs(request._filter, request._doc, request._upsert, multi=(op == 'UpdateMany'))
+                    if 'upserted' in r:
+                        result['nUpserted'] += 1
+                        result['upserted'].append({'index': index, '_id': r['upserted']})
+                    else:
+                        result['nMatched'] += r['n']
+                        result['nModified'] += r['nModified']
+                elif op in ('DeleteOne', 'DeleteMany'):
+                    result['nRemoved'] += self._delete(request._filter, multi=(op == 'DeleteMany'))['n']
+                else:
+                    raise ValueError('Unsupported bulk write request %s' % op)
+        return BulkWriteResult(result, True)
+
+    def drop(self):
+
+        with self.lock:
+            self.docs.clear()
+            self.order.clear()
+            for index in self.indexes.values():
+                index.clear()
+            self.index_info.clear()
+
+
+class MemoryDB(object):
+    """
+    Named collections, accessed as attributes or items like a pymongo database.
+    """
+    def __init__(self, name):
+
+        self.name = name
+        self.lock = threading.Lock()
+        self.collections = dict()
+
+    def __getitem__(self, name):
+
+        with self.lock:
+            if name not in self.collections:
+                self.collections[name] = self._collection(name)
+            return self.collections[name]
+
+    def _collection(self, name):
+
+        return Collection(self, name, HASH_INDEXES.get(name))
+
+    def __getattr__(self, name):
+
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name, **kwargs):
+
+        return self[name]
+
+    def drop(self):
+
+        with self.lock:
+            collections = list(self.collections.values())
+        for collection in collections:
+            collection.drop()
+
+
+class Database(mongo.Database):
+    """
+    Database held in memory by this process, for tests and for benchmarking the API and
+    plugins without a database server. It uses the same queries as the MongoDB backend.
+    Nothing is persisted and each process has its own data, so run a single process.
+    """
+    def connect(self):
+
+        self.connection = None
+        self.db = MemoryDB(app.config.get('MONGO_DATABASE', None) or 'monitoring')
+        self.secondary = None
+        LOG.info('Memory Database: using in-process database "%s"', self.get_db_name())
+
+    def get_version(self):
+
+        return 'memory'
+
+    def is_alive(self):
+
+        return True
+
+    def disconnect(self):
+
+        LOG.debug('Memory database closed.')
+
+    def destroy_db(self, name=None):
+
+        self.db.drop()
+
+        LOG.warning('Memory database "%s" deleted.' % (name or self.get_db_name()))
+
+    def get_index_keys(self, collection):
+
+        return self.db[collection].index_keys()
+
+    def explain(self, collection, name, command):
+
+        filter, sort = slowlog.parse_command(name, command)
+        return self.db[collection].explain(filter, sort)
+
+    def _search(self, terms, query=None):
+
+        query = dict(query or {})
+        if 'status' not in query:
+            query['status'] = {'$ne': status_code.EXPIRED}
+
+        weights = app.config['MONGO_TEXT_INDEX']
+        scored = [(q.text_score(doc, terms, weights), doc) for doc in self.reads.alerts.find(query)]
+        return sorted([s for s in scored if s[0]], key=lambda s: s[0], reverse=True)
+
+    def search_alerts(self, terms, query=None, fields=None, skip=0, limit=0):
+        """
+        Full text search of alert fields in MONGO_TEXT_INDEX, weighted by field, most relevant first.
+        """
+        scored = self._search(terms, query)
+
+        results = list()
+        for score, doc in scored[skip:skip + limit] if limit else scored[skip:]:
+            response = q.project(doc, fields)
+            response['score'] = score
+            response['id'] = response.pop('_id')
+            results.append(response)
+        return results
+
+    def get_search_count(self, terms, query=None):
+
+        return len(self._search(terms, query))
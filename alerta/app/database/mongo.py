@@ -4,12 +4,18 @@ import datetime
 import base64
 import hmac
 import hashlib
+import json
 import bcrypt
 import ssl
+import threading
 
 from uuid import uuid4
 from six import string_types
-from pymongo import MongoClient, ASCENDING, TEXT, ReturnDocument
+from bson import json_util
+from bson.son import SON
+from flask import request, has_request_context
+from pymongo import database, MongoClient, ASCENDING, TEXT, ReadPreference, ReturnDocument, ReplaceOne, UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 try:
     from urllib.parse import urlparse
@@ -18,11 +24,37 @@ except ImportError:
 
 from alerta.app import app, severity_code, status_code
 from alerta.app.alert import AlertDocument
+from alerta.app.database import monitor
 from alerta.app.heartbeat import HeartbeatDocument
 
 
 LOG = app.logger
 
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST
+}
+
+
+class WriteConcernDatabase(database.Database):
+    """
+    Database that applies a different write concern to some collections eg. durable
+    writes for alerts but fast writes for metrics.
+    """
+    def __init__(self, client, name, write_concerns=None, **kwargs):
+
+        super(WriteConcernDatabase, self).__init__(client, name, **kwargs)
+        self.write_concerns = write_concerns or dict()
+
+    def __getitem__(self, name):
+
+        if name in self.write_concerns:
+            return self.get_collection(name, write_concern=self.write_concerns[name])
+        return super(WriteConcernDatabase, self).__getitem__(name)
+
 
 class Database(object):
 
@@ -67,41 +99,226 @@ class Database(object):
                 'ssl_cert_reqs': ssl.CERT_REQUIRED
             }
 
+        pool_args = {
+            'maxPoolSize': app.config['MONGO_MAX_POOL_SIZE'],
+            'minPoolSize': app.config['MONGO_MIN_POOL_SIZE'],
+            'waitQueueTimeoutMS': app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+            'connectTimeoutMS': app.config['MONGO_CONNECT_TIMEOUT_MS'],
+            'socketTimeoutMS': app.config['MONGO_SOCKET_TIMEOUT_MS']
+        }
+        pool_args = dict((k, v) for k, v in pool_args.items() if v is not None)
+
         try:
-            self.connection = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000, connect=False, **ssl_args)
+            self.connection = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000, connect=False,
+                                          event_listeners=[monitor.CommandMonitor()], **dict(ssl_args, **pool_args))
         except Exception as e:
             LOG.error('MongoDB Client: %s : %s', mongo_uri, e)
             sys.exit(1)
         LOG.info('MongoDB Client: Connected to %s', mongo_uri)
 
-        if app.config.get('MONGO_DATABASE', None):
-            self.db = self.connection[app.config['MONGO_DATABASE']]
+        name = app.config.get('MONGO_DATABASE', None) or self.connection.get_default_database().name
+        write_concerns = dict((coll, WriteConcern(**wc)) for coll, wc in app.config['MONGO_WRITE_CONCERN'].items() if wc)
+        self.db = WriteConcernDatabase(self.connection, name, write_concerns)
+
+        read_preference = app.config['MONGO_READ_PREFERENCE']
+        if read_preference and read_preference != 'primary':
+            self.secondary = self.connection.get_database(name, read_preference=READ_PREFERENCES[read_preference])
         else:
-            self.db = self.connection.get_default_database()
+            self.secondary = None
         LOG.info('MongoDB Client: MongoDB v%s, using database "%s"', self.get_version(), self.get_db_name())
 
-        self._create_indexes()
+        if app.config['MONGO_SYNC_INDEXES']:
+            thread = threading.Thread(target=self._sync_indexes_at_startup, name='sync-indexes')
+            thread.daemon = True
+            thread.start()
 
-    def _create_indexes(self):
+    @property
+    def reads(self):
+        """
+        Database for read-only queries. GET requests use MONGO_READ_PREFERENCE unless the client
+        sends "X-Read-Your-Writes: true" to see its own recent changes. Everything else, including
+        background jobs and reads that lead to a write, uses the primary.
+        """
+        if self.secondary is None or not has_request_context() or request.method != 'GET':
+            return self.db
+        if app.config['MONGO_READ_YOUR_WRITES'] and request.headers.get('X-Read-Your-Writes', '').lower() in ['true', '1']:
+            return self.db
+        return self.secondary
 
-        self.db.alerts.create_index(
-            [
-                ('environment', ASCENDING),
-                ('customer', ASCENDING),
-                ('resource', ASCENDING),
-                ('event', ASCENDING)
-            ],
-            unique=True
-        )
-        self.db.alerts.create_index([('$**', TEXT)])
+    def _sync_indexes_at_startup(self):
 
-        self.db.metrics.create_index(
-            [
-                ('group', ASCENDING),
-                ('name', ASCENDING)
-            ],
-            unique=True
-        )
+        try:
+            report = self.sync_indexes()
+        except Exception as e:
+            LOG.error('MongoDB Client: Failed to sync indexes: %s', e)
+            return
+
+        for index in report:
+            if index['state'] in ['conflict', 'failed']:
+                LOG.warning('MongoDB Client: Index %s on "%s" %s: %s',
+                            index['name'], index['collection'], index['state'], index.get('error'))
+
+    def get_index_specs(self):
+        """
+        Return indexes required for correct operation followed by those configured in MONGO_INDEXES.
+        """
+        specs = [
+            {
+                'collection': 'alerts',
+                'key': [('environment', ASCENDING), ('customer', ASCENDING), ('resource', ASCENDING), ('event', ASCENDING)],
+                'unique': True
+            },
+            {
+                'collection': 'alerts',
+                'name': 'alerts_text',
+                'key': [(field, TEXT) for field in sorted(app.config['MONGO_TEXT_INDEX'])],
+                'weights': app.config['MONGO_TEXT_INDEX'],
+                'default_language': app.config['MONGO_TEXT_LANGUAGE']
+            },
+            {
+                'collection': 'metrics',
+                'key': [('group', ASCENDING), ('name', ASCENDING)],
+                'unique': True
+            }
+        ]
+        if app.config['RETENTION_TTL']:
+            specs.append({
+                'collection': 'alerts',
+                'name': 'alerts_retention_ttl',
+                'key': [('lastReceiveTime', ASCENDING)],
+                'expireAfterSeconds': app.config['RETENTION_TTL'],
+                'partialFilterExpression': {'status': status_code.EXPIRED}
+            })
+        if app.config['ARCHIVE_TTL']:
+            specs.append({
+                'collection': 'alerts_archive',
+                'name': 'alerts_archive_ttl',
+                'key': [('lastReceiveTime', ASCENDING)],
+                'expireAfterSeconds': app.config['ARCHIVE_TTL']
+            })
+        specs.extend(app.config['MONGO_INDEXES'])
+
+        indexes = list()
+        for spec in specs:
+            index = dict(spec)
+            index['key'] = [tuple(k) for k in spec['key']]
+            index['name'] = spec.get('name', None) or '_'.join(['%s_%s' % k for k in index['key']])
+            indexes.append(index)
+        return indexes
+
+    @staticmethod
+    def _index_options(index):
+
+        return dict((k, v) for k, v in index.items() if k not in ['collection', 'key', 'name'])
+
+    @staticmethod
+    def _is_text_index(index):
+
+        return index['key'][0][1] == TEXT
+
+    def _index_matches(self, index, info):
+
+        if self._is_text_index(index):
+            return info.get('weights') is not None  # there can only be one text index per collection
+        return [tuple(k) for k in info['key']] == index['key']
+
+    def _index_conflicts(self, index, info):
+
+        if self._is_text_index(index):
+            return (dict(info['weights']) != dict(index['weights']) or
+                    info.get('default_language', 'english') != index.get('default_language', 'english'))
+        return (bool(index.get('unique', False)) != bool(info.get('unique', False)) or
+                index.get('expireAfterSeconds') != info.get('expireAfterSeconds') or
+                dict(index.get('partialFilterExpression') or {}) != dict(info.get('partialFilterExpression') or {}))
+
+    def verify_indexes(self):
+        """
+        Compare declared indexes with those in the database without changing anything. Each
+        index is reported as "ok", "missing", "conflict" (same key, different options) or
+        "unexpected" (exists in the database but is not declared).
+        """
+        return self._compare_indexes(sync=False)
+
+    def sync_indexes(self, prune=False):
+        """
+        Create declared indexes that are missing. If prune is set, also drop conflicting indexes
+        so they can be re-created, and drop indexes that are not declared at all.
+        """
+        return self._compare_indexes(sync=True, prune=prune)
+
+    def _compare_indexes(self, sync=False, prune=False):
+
+        declared = self.get_index_specs()
+        collections = sorted(set([index['collection'] for index in declared]))
+
+        report = list()
+        for collection in collections:
+            existing = self.db[collection].index_information()
+            seen = set(['_id_'])
+
+            for index in [i for i in declared if i['collection'] == collection]:
+                result = {'collection': collection, 'name': index['name'], 'key': index['key']}
+
+                matches = [name for name, info in existing.items() if self._index_matches(index, info)]
+                if matches:
+                    seen.update(matches)
+                    if self._index_conflicts(index, existing[matches[0]]):
+                        if sync and (prune or self._is_text_index(index)):  # replace text index when fields change
+                            self.db[collection].drop_index(matches[0])
+                            result.update(self._create_index(index))
+                        else:
+                            result['state'] = 'conflict'
+                            result['error'] = 'index %s exists with different options' % matches[0]
+                    else:
+                        result['state'] = 'ok'
+                elif sync:
+                    result.update(self._create_index(index))
+                else:
+                    result['state'] = 'missing'
+                report.append(result)
+
+            for name, info in existing.items():
+                if name in seen:
+                    continue
+                result = {'collection': collection, 'name': name, 'key': [tuple(k) for k in info['key']]}
+                if sync and prune:
+                    self.db[collection].drop_index(name)
+                    result['state'] = 'dropped'
+                else:
+                    result['state'] = 'unexpected'
+                report.append(result)
+
+        return report
+
+    def _create_index(self, index):
+
+        options = self._index_options(index)
+        options.setdefault('background', app.config['MONGO_INDEX_BACKGROUND'])
+        try:
+            self.db[index['collection']].create_index(index['key'], name=index['name'], **options)
+        except Exception as e:
+            return {'state': 'failed', 'error': str(e)}
+        LOG.info('MongoDB Client: Created index %s on "%s"', index['name'], index['collection'])
+        return {'state': 'created'}
+
+    def get_index_keys(self, collection):
+        """
+        Keys of each index on a collection, by index name.
+        """
+        return dict((name, [tuple(k) for k in info['key']]) for name, info in self.db[collection].index_information().items())
+
+    def explain(self, collection, name, command):
+        """
+        Query plan the server would choose for a command, without running it.
+        """
+        result = self.db.command(SON([('explain', SON(command)), ('verbosity', 'queryPlanner')]))
+        plan = result.get('queryPlanner', {})
+        return json.loads(json_util.dumps({
+            'namespace': plan.get('namespace'),
+            'parsedQuery': plan.get('parsedQuery'),
+            'winningPlan': plan.get('winningPlan'),
+            'rejectedPlans': plan.get('rejectedPlans', [])
+        }))
 
     def get_db(self):
 
@@ -137,6 +354,14 @@ class Database(object):
 
         LOG.warning('Mongo database "%s" deleted.' % name)
 
+    @staticmethod
+    def _expire_time(receive_time, timeout):
+        """
+        Alerts with a timeout of zero never expire.
+        """
+        if timeout:
+            return receive_time + datetime.timedelta(seconds=timeout)
+
     ####
 
     def get_severity(self, alert):
@@ -184,14 +409,46 @@ class Database(object):
         """
         Return total number of alerts that meet the query filter.
         """
-        return self.db.alerts.find(query).count()
+        return self.reads.alerts.find(query).count()
+
+    @staticmethod
+    def _union_archive(query):
+        """
+        Aggregation stage that adds archived alerts matching the same query, requires MongoDB 4.4+.
+        """
+        return {'$unionWith': {'coll': 'alerts_archive', 'pipeline': [{'$match': query}]}}
+
+    @staticmethod
+    def _project(fields):
+        """
+        Aggregation stages equivalent to a find() projection, which may include a history $slice.
+        """
+        slices = dict((k, v['$slice']) for k, v in fields.items() if isinstance(v, dict) and '$slice' in v)
+        projection = dict((k, v) for k, v in fields.items() if k not in slices)
+
+        stages = list()
+        if slices:
+            stages.append({'$addFields': dict((k, {'$slice': ['$' + k, n]}) for k, n in slices.items())})
+        if projection:
+            stages.append({'$project': projection})
+        return stages
 
-    def get_alerts(self, query=None, fields=None, sort=None, page=1, limit=0):
+    def get_alerts(self, query=None, fields=None, sort=None, page=1, limit=0, archive=False):
 
         if 'status' not in query:
             query['status'] = {'$ne': "expired"}
 
-        responses = self.db.alerts.find(query, projection=fields, sort=sort).skip((page-1)*limit).limit(limit)
+        if archive:
+            pipeline = [{'$match': query}, self._union_archive(query)]
+            if sort:
+                pipeline.append({'$sort': SON(sort)})
+            pipeline.append({'$skip': (page-1)*limit})
+            if limit:
+                pipeline.append({'$limit': limit})
+            pipeline.extend(self._project(fields or {}))
+            responses = self.reads.alerts.aggregate(pipeline)
+        else:
+            responses = self.reads.alerts.find(query, projection=fields, sort=sort).skip((page-1)*limit).limit(limit)
 
         alerts = list()
         for response in responses:
@@ -228,7 +485,49 @@ class Database(object):
             )
         return alerts
 
-    def get_history(self, query=None, fields=None, limit=0):
+    @staticmethod
+    def _search_query(terms, query=None):
+
+        query = dict(query or {})
+        query['$text'] = {'$search': terms}
+        if 'status' not in query:
+            query['status'] = {'$ne': "expired"}
+        return query
+
+    def search_alerts(self, terms, query=None, fields=None, skip=0, limit=0):
+        """
+        Full text search of alert fields in the text index, most relevant first.
+        """
+        projection = dict(fields or {})
+        projection['score'] = {'$meta': 'textScore'}
+
+        responses = self.reads.alerts.find(self._search_query(terms, query), projection=projection,
+                                           sort=[('score', {'$meta': 'textScore'})]).skip(skip).limit(limit)
+
+        results = list()
+        for response in responses:
+            response['id'] = response.pop('_id')
+            results.append(response)
+        return results
+
+    def get_search_count(self, terms, query=None):
+
+        return self.reads.alerts.find(self._search_query(terms, query)).count()
+
+    def get_expired_alerts(self, limit=0, after=None):
+        """
+        Return alerts that have timed out but have not yet been expired, in id order after the
+        given id so that a large backlog can be read a batch at a time.
+        """
+        query = {
+            'expireTime': {'$lt': datetime.datetime.utcnow()},
+            'status': {'$ne': status_code.EXPIRED}
+        }
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        return self.get_alerts(query=query, fields={'history': 0, 'rawData': 0}, sort=[('_id', ASCENDING)], limit=limit)
+
+    def get_history(self, query=None, fields=None, limit=0, archive=False):
 
         if not fields:
             fields = {
@@ -245,15 +544,17 @@ class Database(object):
                 "history": 1
             }
 
-        pipeline = [
-            {'$match': query},
+        pipeline = [{'$match': query}]
+        if archive:
+            pipeline.append(self._union_archive(query))
+        pipeline += [
             {'$unwind': '$history'},
             {'$project': fields},
             {'$limit': limit},
             {'$sort': {'history.updateTime': 1}}
         ]
 
-        responses = self.db.alerts.aggregate(pipeline)
+        responses = self.reads.alerts.aggregate(pipeline)
 
         history = list()
         for response in responses:
@@ -384,7 +685,9 @@ class Database(object):
                 "rawData": alert.raw_data,
                 "repeat": True,
                 "lastReceiveId": alert.id,
-                "lastReceiveTime": now
+                "lastReceiveTime": now,
+                "timeout": alert.timeout,
+                "expireTime": self._expire_time(now, alert.timeout)
             },
             '$addToSet': {"tags": {'$each': alert.tags}},
             '$inc': {"duplicateCount": 1}
@@ -492,7 +795,9 @@ class Database(object):
                 "trendIndication": trend_indication,
                 "receiveTime": now,
                 "lastReceiveId": alert.id,
-                "lastReceiveTime": now
+                "lastReceiveTime": now,
+                "timeout": alert.timeout,
+                "expireTime": self._expire_time(now, alert.timeout)
             },
             '$addToSet': {"tags": {'$each': alert.tags}},
             '$push': {
@@ -622,6 +927,7 @@ class Database(object):
             "receiveTime": now,
             "lastReceiveId": alert.id,
             "lastReceiveTime": now,
+            "expireTime": self._expire_time(now, alert.timeout),
             "history": history
         }
 
@@ -733,6 +1039,9 @@ class Database(object):
             }
         }
 
+        if status == status_code.EXPIRED:
+            update['$set']['expireTime'] = None  # nothing left to expire until alert is received again
+
         response = self.db.alerts.find_one_and_update(
             query,
             update=update,
@@ -770,6 +1079,40 @@ class Database(object):
             history=list()
         )
 
+    def expire_alert(self, alert, status=status_code.EXPIRED, text=None, now=None):
+        """
+        Set status and update history of an alert that timed out, only if it still has, so that
+        an alert received again since it was fetched is left alone. Returns whether it was updated.
+        """
+        now = now or datetime.datetime.utcnow()
+        query = {
+            '_id': alert.id,
+            'expireTime': {'$lt': now},
+            'status': {'$ne': status_code.EXPIRED}
+        }
+        update = {
+            '$set': {"status": status},
+            '$push': {
+                "history": {
+                    '$each': [{
+                        "event": alert.event,
+                        "status": status,
+                        "type": "status",
+                        "text": text,
+                        "id": alert.id,
+                        "updateTime": now
+                    }],
+                    '$slice': -abs(app.config['HISTORY_LIMIT'])
+                }
+            }
+        }
+        if status == status_code.EXPIRED:
+            update['$set']['expireTime'] = None
+
+        response = self.db.alerts.update_one(query, update)
+
+        return response.matched_count == 1
+
     def tag_alert(self, id, tags):
         """
         Append tags to tag list. Don't add same tag more than once.
@@ -807,19 +1150,73 @@ class Database(object):
 
         return True if response.deleted_count == 1 else False
 
-    def get_counts(self, query=None, fields=None, group=None):
+    def bulk_insert_alerts(self, alerts, archive=False):
+        """
+        Insert complete alert documents, eg. a generated dataset, in one unordered bulk write
+        and return the number inserted. Alerts with an id that already exists are skipped.
+        """
+        if not alerts:
+            return 0
+        collection = self.db.alerts_archive if archive else self.db.alerts
+        try:
+            return len(collection.insert_many(alerts, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                raise
+            return e.details['nInserted']
+
+    def archive_alerts(self, query, limit=0):
+        """
+        Move alerts that match the query to the archive collection and return the number moved.
+        An alert that is updated while it is being moved stays live and its archive copy is removed.
+        """
+        responses = list(self.db.alerts.find(query).limit(limit))
+        if not responses:
+            return 0
+        ids = [response['_id'] for response in responses]
+
+        self.db.alerts_archive.bulk_write(
+            [ReplaceOne({'_id': response['_id']}, response, upsert=True) for response in responses],
+            ordered=False
+        )
+
+        query = dict(query)
+        query['_id'] = {'$in': ids}
+        moved = self.db.alerts.delete_many(query).deleted_count
+
+        if moved < len(ids):
+            kept = [response['_id'] for response in self.db.alerts.find({'_id': {'$in': ids}}, projection={'_id': 1})]
+            self.db.alerts_archive.delete_many({'_id': {'$in': kept}})
+
+        return moved
+
+    def get_alert_ids(self, query=None, limit=0):
+
+        return [response['_id'] for response in self.db.alerts.find(query, projection={'_id': 1}).limit(limit)]
+
+    def delete_alerts(self, ids, query=None):
+        """
+        Delete alerts by id that still match the query, eg. the retention policy they were found by.
+        """
+        response = self.db.alerts.delete_many(dict(query or {}, _id={'$in': ids}))
+
+        return response.deleted_count
+
+    def get_counts(self, query=None, fields=None, group=None, archive=False):
         """
         Return counts grouped by severity or status.
         """
         fields = fields or {}
 
-        pipeline = [
-            {'$match': query},
+        pipeline = [{'$match': query}]
+        if archive:
+            pipeline.append(self._union_archive(query))
+        pipeline += [
             {'$project': fields},
             {'$group': {"_id": "$" + group, "count": {'$sum': 1}}}
         ]
 
-        responses = self.db.alerts.aggregate(pipeline)
+        responses = self.reads.alerts.aggregate(pipeline)
 
         counts = dict()
         for response in responses:
@@ -849,7 +1246,7 @@ class Database(object):
             {'$limit': limit}
         ]
 
-        responses = self.db.alerts.aggregate(pipeline)
+        responses = self.reads.alerts.aggregate(pipeline)
 
         top = list()
         for response in responses:
@@ -889,7 +1286,7 @@ class Database(object):
             {'$limit': limit}
         ]
 
-        responses = self.db.alerts.aggregate(pipeline)
+        responses = self.reads.alerts.aggregate(pipeline)
 
         top = list()
         for response in responses:
@@ -919,7 +1316,7 @@ class Database(object):
             {'$group': {"_id": "$environment", "count": {'$sum': 1}}}
         ]
 
-        responses = self.db.alerts.aggregate(pipeline)
+        responses = self.reads.alerts.aggregate(pipeline)
 
         environments = list()
         for response in responses:
@@ -947,7 +1344,7 @@ class Database(object):
             {'$group': {"_id": {"environment": "$environment", "service": "$service"}, "count": {'$sum': 1}}}
         ]
 
-        responses = self.db.alerts.aggregate(pipeline)
+        responses = self.reads.alerts.aggregate(pipeline)
 
         services = list()
         for response in responses:
@@ -964,7 +1361,7 @@ class Database(object):
 
         now = datetime.datetime.utcnow()
 
-        responses = self.db.blackouts.find(query)
+        responses = self.reads.blackouts.find(query)
         blackouts = list()
         for response in responses:
             response['id'] = response['_id']
@@ -1105,9 +1502,9 @@ class Database(object):
 
         return True if response.deleted_count == 1 else False
 
-    def get_heartbeats(self, query=None):
+    def get_heartbeats(self, query=None, sort=None, limit=0):
 
-        responses = self.db.heartbeats.find(query)
+        responses = self.reads.heartbeats.find(query, sort=sort).limit(limit)
 
         heartbeats = list()
         for response in responses:
@@ -1125,11 +1522,14 @@ class Database(object):
             )
         return heartbeats
 
-    def save_heartbeat(self, heartbeat):
+    @staticmethod
+    def _heartbeat_update(heartbeat, now):
 
-        now = datetime.datetime.utcnow()
-        update = {
-            #  '$setOnInsert': {"_id": heartbeat.id},
+        return {
+            '$setOnInsert': {
+                "_id": heartbeat.id,
+                "status": "ok"
+            },
             '$set': {
                 "origin": heartbeat.origin,
                 "tags": heartbeat.tags,
@@ -1137,48 +1537,116 @@ class Database(object):
                 "createTime": heartbeat.create_time,
                 "timeout": heartbeat.timeout,
                 "receiveTime": now,
+                "expireTime": now + datetime.timedelta(seconds=heartbeat.timeout),
                 "customer": heartbeat.customer
             }
         }
 
-        LOG.debug('Save heartbeat to database: %s', update)
+    def save_heartbeat(self, heartbeat):
+
+        now = datetime.datetime.utcnow()
+        update = self._heartbeat_update(heartbeat, now)
 
-        heartbeat_id = self.db.heartbeats.find_one({"origin": heartbeat.origin, "customer": heartbeat.customer}, {})
+        LOG.debug('Save heartbeat to database: %s', update)
 
-        if heartbeat_id:
+        query = {"origin": heartbeat.origin, "customer": heartbeat.customer}
+        try:
             response = self.db.heartbeats.find_one_and_update(
-                {"origin": heartbeat.origin, "customer": heartbeat.customer},
+                query,
                 update=update,
                 upsert=True,
                 return_document=ReturnDocument.AFTER
             )
-
-            return HeartbeatDocument(
-                id=response['_id'],
-                origin=response['origin'],
-                tags=response['tags'],
-                event_type=response['type'],
-                create_time=response['createTime'],
-                timeout=response['timeout'],
-                receive_time=response['receiveTime'],
-                customer=response.get('customer', None)
-            )
-        else:
-            update = update['$set']
-            update["_id"] = heartbeat.id
-            response = self.db.heartbeats.insert_one(update)
-
-            return HeartbeatDocument(
-                id=response.inserted_id,
-                origin=update['origin'],
-                tags=update['tags'],
-                event_type=update['type'],
-                create_time=update['createTime'],
-                timeout=update['timeout'],
-                receive_time=update['receiveTime'],
-                customer=update.get('customer', None)
+        except DuplicateKeyError:  # lost a race to insert the same origin, so update the winner
+            response = self.db.heartbeats.find_one_and_update(
+                query,
+                update=update,
+                return_document=ReturnDocument.AFTER
             )
 
+        return HeartbeatDocument(
+            id=response['_id'],
+            origin=response['origin'],
+            tags=response['tags'],
+            event_type=response['type'],
+            create_time=response['createTime'],
+            timeout=response['timeout'],
+            receive_time=response['receiveTime'],
+            customer=response.get('customer', None)
+        )
+
+    def save_heartbeats(self, heartbeats):
+        """
+        Save many heartbeats in one unordered bulk write and return the number saved. If an
+        origin appears more than once only the last heartbeat for it is kept.
+        """
+        now = datetime.datetime.utcnow()
+        latest = dict(((hb.origin, hb.customer), hb) for hb in heartbeats)
+        requests = [
+            UpdateOne({"origin": hb.origin, "customer": hb.customer}, self._heartbeat_update(hb, now), upsert=True)
+            for hb in latest.values()
+        ]
+        if not requests:
+            return 0
+
+        try:
+            self.db.heartbeats.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            self.db.heartbeats.bulk_write([requests[error['index']] for error in errors], ordered=False)
+
+        return len(requests)
+
+    def backfill_heartbeat_expiry(self):
+        """
+        Set the expire time of heartbeats saved without one, eg. by an earlier release, from their
+        receive time and timeout, so that they are checked too. Returns the number updated.
+        """
+        requests = [
+            UpdateOne({'_id': hb['_id'], 'expireTime': {'$exists': False}},
+                      {'$set': {"expireTime": hb['receiveTime'] + datetime.timedelta(seconds=hb['timeout'])}})
+            for hb in self.db.heartbeats.find({'expireTime': {'$exists': False}}, projection={'receiveTime': 1, 'timeout': 1})
+        ]
+        if not requests:
+            return 0
+
+        self.db.heartbeats.bulk_write(requests, ordered=False)
+        return len(requests)
+
+    def get_stale_heartbeats(self, limit=0, after=None):
+        """
+        Return heartbeats that are overdue and have not already raised a heartbeat alert, in id
+        order after the given id.
+        """
+        query = {
+            'expireTime': {'$lt': datetime.datetime.utcnow()},
+            'status': {'$ne': 'expired'}
+        }
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        return self.get_heartbeats(query, sort=[('_id', ASCENDING)], limit=limit)
+
+    def get_recovered_heartbeats(self, limit=0, after=None):
+        """
+        Return heartbeats that raised a heartbeat alert and have since been received again, in
+        id order after the given id.
+        """
+        query = {
+            'expireTime': {'$gte': datetime.datetime.utcnow()},
+            'status': 'expired'
+        }
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        return self.get_heartbeats(query, sort=[('_id', ASCENDING)], limit=limit)
+
+    def set_heartbeat_status(self, ids, status):
+
+        response = self.db.heartbeats.update_many({'_id': {'$in': ids}}, {'$set': {"status": status}})
+
+        return response.modified_count
+
     def get_heartbeat(self, id, customer=None):
 
         if len(id) == 8:
@@ -1210,6 +1678,44 @@ class Database(object):
 
         return True if response.deleted_count == 1 else False
 
+    def acquire_lease(self, name, holder, ttl):
+        """
+        Acquire or renew a named lease for ttl seconds. Return the fencing token, which only
+        increases when the lease changes hands, or None if the lease is held by someone else.
+        """
+        now = datetime.datetime.utcnow()
+        expire_time = now + datetime.timedelta(seconds=ttl)
+
+        response = self.db.leases.find_one_and_update(
+            {'_id': name, 'holder': holder, 'expireTime': {'$gte': now}},
+            {'$set': {"expireTime": expire_time}},
+            return_document=ReturnDocument.AFTER
+        )
+        if response:
+            return response['token']
+
+        try:
+            response = self.db.leases.find_one_and_update(
+                {'_id': name, '$or': [{'expireTime': {'$lt': now}}, {'holder': holder}]},
+                {
+                    '$set': {"holder": holder, "acquireTime": now, "expireTime": expire_time},
+                    '$inc': {"token": 1}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:  # lease exists and is held by someone else
+            return None
+        return response['token']
+
+    def release_lease(self, name, holder):
+
+        response = self.db.leases.update_one(
+            {'_id': name, 'holder': holder},
+            {'$set': {"expireTime": datetime.datetime.utcnow()}}
+        )
+        return response.modified_count == 1
+
     def get_user(self, id):
 
         user = self.db.users.find_one({"_id": id})
@@ -1369,6 +1875,7 @@ class Database(object):
             "match": match
         }
         if self.db.perms.insert_one(data):
+            self.bump_authz_version()
             data['id'] = data.pop('_id')
             return data
 
@@ -1378,10 +1885,8 @@ class Database(object):
             return ['admin', 'read', 'write']
 
         scopes = list()
-        for match in matches:
-            response = self.db.perms.find_one({"match": match}, projection={"scopes": 1, "_id": 0})
-            if response:
-                scopes.extend(response['scopes'])
+        for response in self.db.perms.find({"match": {'$in': list(matches)}}, projection={"scopes": 1, "_id": 0}):
+            scopes.extend(response['scopes'])
         return set(scopes) or app.config['USER_DEFAULT_SCOPES']
 
     def get_perms(self, query=None):
@@ -1401,6 +1906,7 @@ class Database(object):
     def delete_perm(self, perm):
 
         response = self.db.perms.delete_one({"_id": perm})
+        self.bump_authz_version()
         return True if response.deleted_count == 1 else False
 
     def create_customer(self, customer, match):
@@ -1414,6 +1920,7 @@ class Database(object):
             "match": match
         }
         if self.db.customers.insert_one(data):
+            self.bump_authz_version()
             data['id'] = data.pop('_id')
             return data
 
@@ -1422,10 +1929,12 @@ class Database(object):
         if isinstance(matches, string_types):
             matches = [matches]
 
-        for match in matches:
-            response = self.db.customers.find_one({"match": match}, projection={"customer": 1, "_id": 0})
-            if response:
-                return response['customer']
+        found = dict()
+        for response in self.db.customers.find({"match": {'$in': list(matches)}}, projection={"customer": 1, "match": 1, "_id": 0}):
+            found.setdefault(response['match'], response['customer'])
+        for match in matches:  # first match wins, so order of matches is significant
+            if match in found:
+                return found[match]
         return
 
     def get_customers(self, query=None):
@@ -1445,8 +1954,20 @@ class Database(object):
     def delete_customer(self, customer):
 
         response = self.db.customers.delete_one({"_id": customer})
+        self.bump_authz_version()
         return True if response.deleted_count == 1 else False
 
+    def get_authz_version(self):
+        """
+        Return a random version that changes whenever perms or customers are changed.
+        """
+        response = self.db.versions.find_one({"_id": "authz"})
+        return response['version'] if response else None
+
+    def bump_authz_version(self):
+
+        self.db.versions.update_one({"_id": "authz"}, {'$set': {"version": str(uuid4())}}, upsert=True)
+
     @staticmethod
     def key_type_to_scope(user, key_type):
         if user in app.config['ADMIN_USERS']:
@@ -1547,6 +2068,22 @@ class Database(object):
             upsert=True
         )
 
+    def update_keys_usage(self, usage):
+        """
+        Apply usage counts for many keys at once, usage is a dict of key to count and lastUsedTime.
+        """
+        requests = [
+            UpdateOne(
+                {"key": key},
+                {
+                    '$max': {"lastUsedTime": u['lastUsedTime']},
+                    '$inc': {"count": u['count']}
+                }
+            ) for key, u in usage.items()
+        ]
+        if requests:
+            self.db.keys.bulk_write(requests, ordered=False)
+
     def delete_key(self, key):
 
         response = self.db.keys.delete_one({"key": key})
@@ -1656,3 +2193,42 @@ class Database(object):
                 total_time=t.get('totalTime', 0)
             ) for t in self.db.metrics.find({"type": "timer"}, {"_id": 0})
         ]
+
+    def update_histogram(self, group, name, title=None, description=None, buckets=None, counts=None, count=1, duration=0):
+
+        inc = dict(('counts.%d' % i, c) for i, c in enumerate(counts or []) if c)
+        inc.update({"count": count, "totalTime": duration})
+        return self.db.metrics.find_one_and_update(
+            {
+                "group": group,
+                "name": name
+            },
+            {
+                '$set': {
+                    "group": group,
+                    "name": name,
+                    "title": title,
+                    "description": description,
+                    "buckets": buckets,
+                    "type": "histogram"
+                },
+                '$inc': inc
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def get_histograms(self):
+        from alerta.app.metrics import Histogram
+        return [
+            Histogram(
+                group=h.get('group'),
+                name=h.get('name'),
+                title=h.get('title', ''),
+                description=h.get('description', ''),
+                buckets=h.get('buckets'),
+                counts=[h.get('counts', {}).get(str(i), 0) for i in range(len(h.get('buckets') or []) + 1)],
+                count=h.get('count', 0),
+                total_time=h.get('totalTime', 0)
+            ) for h in self.db.metrics.find({"type": "histogram"}, {"_id": 0})
+        ]
@@ -0,0 +1,185 @@
+"""
+Count database commands, and the time spent in them, for each API request. Commands slower
+than SLOW_QUERY_THRESHOLD are also added to the slow query log.
+
+MongoDB commands are reported by pymongo command monitoring, the memory and SQLite backends
+record their collection operations under the equivalent MongoDB command name. Totals for each
+endpoint are kept in process and written to metrics by housekeeping, so monitoring doesn't add
+database writes to every request.
+"""
+
+import functools
+import inspect
+import re
+import threading
+import time
+import timeit
+
+from collections import Counter
+
+from flask import g, request, has_request_context
+from pymongo import monitoring
+from six import string_types
+
+from alerta.app import app
+from alerta.app.database.slowlog import slow_queries
+
+LOG = app.logger
+
+HEADER = 'X-Database-Commands'
+
+endpoint_stats = dict()
+endpoint_stats_lock = threading.Lock()
+endpoint_stats_flushed = time.time()
+
+_local = threading.local()
+
+
+def started(collection, command):
+
+    if has_request_context() and 'db_commands' in g:
+        g.db_commands['%s.%s' % (collection, command)] += 1
+
+
+def finished(seconds):
+
+    if has_request_context() and 'db_commands' in g:
+        g.db_time += seconds
+
+
+def is_slow(seconds):
+
+    threshold = app.config['SLOW_QUERY_THRESHOLD']
+    return bool(threshold) and seconds * 1000 >= threshold
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """
+    Called by pymongo, in the thread that runs the command, before and after every command.
+    """
+    def __init__(self):
+
+        self.commands = dict()  # commands in progress, kept until they finish in case they are slow
+
+    def started(self, event):
+
+        collection = event.command.get(event.command_name)
+        started(collection if isinstance(collection, string_types) else event.database_name, event.command_name)
+        if app.config['SLOW_QUERY_THRESHOLD']:
+            self.commands[(event.connection_id, event.request_id)] = (collection, event.command)
+
+    def succeeded(self, event):
+
+        self.finished(event)
+
+    def failed(self, event):
+
+        self.finished(event)
+
+    def finished(self, event):
+
+        seconds = event.duration_micros / 1000000.0
+        finished(seconds)
+        collection, command = self.commands.pop((event.connection_id, event.request_id), (None, None))
+        if command is not None and is_slow(seconds) and isinstance(collection, string_types):
+            slow_queries.record(collection, event.command_name, command, seconds * 1000)
+
+
+def as_command(name, collection, func, self, args, kwargs):
+    """
+    The MongoDB command equivalent to a call to a memory or SQLite collection method.
+    """
+    if hasattr(self, 'collection'):  # a cursor
+        return {name: collection, 'filter': self.filter or {}, 'sort': self._sort or []}
+    call = inspect.getcallargs(func, self, *args, **kwargs)
+    command = {name: collection}
+    for arg in ['filter', 'sort', 'pipeline']:
+        if call.get(arg) is not None:
+            command[arg] = call[arg]
+    return command
+
+
+def command(name):
+    """
+    Record calls to a memory or SQLite collection method as the MongoDB command name. Operations
+    made from within another one, eg. by bulk_write(), are part of that command.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if getattr(_local, 'active', False):
+                return func(self, *args, **kwargs)
+            _local.active = True
+            collection = getattr(self, 'name', None) or self.collection.name
+            started(collection, name)
+            start = timeit.default_timer()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                seconds = timeit.default_timer() - start
+                finished(seconds)
+                _local.active = False
+                if is_slow(seconds):
+                    slow_queries.record(collection, name, as_command(name, collection, func, self, args, kwargs), seconds * 1000)
+        return wrapper
+    return decorator
+
+
+@app.before_request
+def start_command_count():
+
+    g.db_commands = Counter()
+    g.db_time = 0.0
+
+
+@app.after_request
+def end_command_count(response):
+
+    if 'db_commands' not in g:
+        return response
+    commands = sum(g.db_commands.values())
+    endpoint = '%s %s' % (request.method, request.url_rule.rule if request.url_rule else 'unknown')
+
+    interval = app.config['DATABASE_METRICS_FLUSH_INTERVAL']
+    with endpoint_stats_lock:
+        stats = endpoint_stats.setdefault(endpoint, {'requests': 0, 'commands': 0, 'time': 0.0})
+        stats['requests'] += 1
+        stats['commands'] += commands
+        stats['time'] += g.db_time
+        due = time.time() - endpoint_stats_flushed >= interval
+
+    if app.debug or app.config['DATABASE_COMMANDS_HEADER']:
+        response.headers[HEADER] = '%d; time=%.3f' % (commands, g.db_time * 1000)
+
+    budget = app.config['DATABASE_COMMANDS_BUDGET']
+    repeated = [(name, count) for name, count in g.db_commands.most_common() if count >= app.config['DATABASE_COMMANDS_REPEAT_LIMIT']]
+    if (budget and commands > budget) or repeated:
+        LOG.warning('%s made %d database commands in %.1f ms%s: %s', endpoint, commands, g.db_time * 1000,
+                    ', possible N+1 query' if repeated else '',
+                    ', '.join('%s x%d' % (name, count) for name, count in g.db_commands.most_common()))
+
+    if due:  # also flushed by housekeeping, but that may not be running eg. HOUSEKEEPING_ENABLED is False
+        flush_endpoint_stats()
+
+    return response
+
+
+def flush_endpoint_stats():
+    """
+    Add the database commands and time for each endpoint since the last flush to the metrics.
+    """
+    from alerta.app import db
+    global endpoint_stats, endpoint_stats_flushed
+
+    with endpoint_stats_lock:
+        stats, endpoint_stats = endpoint_stats, dict()
+        endpoint_stats_flushed = time.time()
+
+    for endpoint, s in stats.items():
+        name = re.sub(r'[^a-zA-Z0-9]+', '_', endpoint).strip('_')
+        db.update_timer('database', name, 'Database time for %s' % endpoint,
+                        'Total time in database commands and number of %s requests' % endpoint,
+                        count=s['requests'], duration=int(round(s['time'] * 1000)))
+        db.inc_counter('database', '%s_commands' % name, 'Database commands for %s' % endpoint,
+                       'Total number of database commands made by %s requests' % endpoint, count=s['commands'])
+    return len(stats)
@@ -0,0 +1,564 @@
+"""
+Evaluate MongoDB style queries, projections, updates and aggregation pipelines against
+plain Python documents. Used by backends that store documents without a native MongoDB
+query engine so that the rest of the application can keep building MongoDB queries.
+
+Only the subset of operators used by alerta is supported and anything else raises a
+ValueError rather than silently returning the wrong answer.
+"""
+
+import datetime
+import re
+
+from six import string_types
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+RegexType = type(re.compile(''))
+
+_MISSING = object()
+
+
+def copy_value(value):
+    """
+    Deep copy of a document. Faster than copy.deepcopy() because documents only contain
+    dicts, lists and immutable values.
+    """
+    if isinstance(value, dict):
+        return dict((k, copy_value(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [copy_value(v) for v in value]
+    return value
+
+
+def normalize(value):
+    """
+    Timezone aware datetimes are compared as naive UTC, the same as they are stored by pymongo.
+    """
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        return (value - value.utcoffset()).replace(tzinfo=None)
+    return value
+
+
+def resolve(doc, path):
+    """
+    Return all values at a dotted path. Lists of sub-documents are traversed so that
+    "history.severity" returns the severity of every history entry.
+    """
+    values = [doc]
+    for part in path.split('.'):
+        found = list()
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                else:
+                    found.extend(v[part] for v in value if isinstance(v, dict) and part in v)
+        values = found
+    return values
+
+
+def _expand(values):
+
+    expanded = list()
+    for value in values:
+        expanded.append(value)
+        if isinstance(value, list):
+            expanded.extend(value)
+    return expanded
+
+
+def _equals(value, target):
+
+    if isinstance(target, RegexType):
+        return isinstance(value, string_types) and target.search(value) is not None
+    return normalize(value) == target
+
+
+def _matches_value(values, target):
+
+    target = normalize(target)
+    if target is None and not values:
+        return True
+    if isinstance(target, list):
+        return any(value == target for value in values)
+    return any(_equals(value, target) for value in _expand(values))
+
+
+def _compare(values, op, target):
+
+    target = normalize(target)
+    for value in _expand(values):
+        value = normalize(value)
+        if value is None or target is None or isinstance(value, (dict, list)):
+            continue
+        try:
+            if op == '$gt' and value > target:
+                return True
+            if op == '$gte' and value >= target:
+                return True
+            if op == '$lt' and value < target:
+                return True
+            if op == '$lte' and value <= target:
+                return True
+        except TypeError:  # values of different types never match a range
+            continue
+    return False
+
+
+def _regex(spec):
+
+    pattern = spec['$regex']
+    if isinstance(pattern, RegexType):
+        return pattern
+    flags = 0
+    for option in spec.get('$options', ''):
+        flags |= {'i': re.I, 'm': re.M, 's': re.S, 'x': re.X}[option]
+    return re.compile(pattern, flags)
+
+
+def is_operator_spec(value):
+
+    return isinstance(value, Mapping) and len(value) > 0 and all(k.startswith('$') for k in value)
+
+
+def _match_operators(values, spec):
+
+    for op, target in spec.items():
+        if op == '$options':
+            continue
+        elif op == '$eq':
+            if not _matches_value(values, target):
+                return False
+        elif op == '$ne':
+            if _matches_value(values, target):
+                return False
+        elif op == '$in':
+            if not any(_matches_value(values, t) for t in target):
+                return False
+        elif op == '$nin':
+            if any(_matches_value(values, t) for t in target):
+                return False
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            if not _compare(values, op, target):
+                return False
+        elif op == '$exists':
+            if bool(values) != bool(target):
+                return False
+        elif op == '$regex':
+            if not _matches_value(values, _regex(spec)):
+                return False
+        elif op == '$not':
+            if isinstance(target, RegexType):
+                target = {'$regex': target}
+            if _match_operators(values, target):
+                return False
+        elif op == '$elemMatch':
+            elements = [e for value in values if isinstance(value, list) for e in value]
+            if is_operator_spec(target):
+                found = any(_match_operators([e], target) for e in elements)
+            else:
+                found = any(isinstance(e, dict) and match(e, target) for e in elements)
+            if not found:
+                return False
+        elif op == '$size':
+            if not any(isinstance(value, list) and len(value) == target for value in values):
+                return False
+        elif op == '$all':
+            if not all(_matches_value(values, t) for t in target):
+                return False
+        else:
+            raise ValueError('Unsupported query operator %s' % op)
+    return True
+
+
+def match(doc, query):
+    """
+    Return True if the document matches the query.
+    """
+    if not query:
+        return True
+
+    for key, spec in query.items():
+        if key == '$or':
+            if not any(match(doc, q) for q in spec):
+                return False
+        elif key == '$and':
+            if not all(match(doc, q) for q in spec):
+                return False
+        elif key == '$nor':
+            if any(match(doc, q) for q in spec):
+                return False
+        elif key.startswith('$'):
+            raise ValueError('Unsupported query operator %s' % key)
+        elif is_operator_spec(spec):
+            if not _match_operators(resolve(doc, key), spec):
+                return False
+        elif not _matches_value(resolve(doc, key), spec):
+            return False
+    return True
+
+
+def equality_fields(query):
+    """
+    Return the fields of a query that must equal one of a list of values, for use with an index.
+    """
+    fields = dict()
+    for key, spec in (query or {}).items():
+        if key.startswith('$'):
+            continue
+        if is_operator_spec(spec):
+            if '$eq' in spec:
+                values = [spec['$eq']]
+            elif '$in' in spec:
+                values = list(spec['$in'])
+            else:
+                continue
+        elif isinstance(spec, (Mapping, list, RegexType)):
+            continue
+        else:
+            values = [spec]
+        values = [normalize(v) for v in values]
+        if all(v is not None and not isinstance(v, (Mapping, list, RegexType)) for v in values):
+            fields[key] = values
+    return fields
+
+
+def _set_path(doc, path, value):
+
+    parts = path.split('.')
+    for part in parts[:-1]:
+        if not isinstance(doc.get(part), dict):
+            doc[part] = dict()
+        doc = doc[part]
+    doc[parts[-1]] = value
+
+
+def _get_path(doc, path, default=None):
+
+    for part in path.split('.'):
+        if not isinstance(doc, dict) or part not in doc:
+            return default
+        doc = doc[part]
+    return doc
+
+
+def _unset_path(doc, path):
+
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _each(value):
+
+    if isinstance(value, Mapping) and '$each' in value:
+        return list(value['$each'])
+    return [value]
+
+
+def _slice(values, n):
+
+    if isinstance(n, list):
+        skip, n = n
+        values = values[skip:]
+    if n >= 0:
+        return values[:n]
+    return values[n:] if n else []
+
+
+def project(doc, fields=None):
+    """
+    Return a copy of the document with only the fields selected by a find() projection.
+    """
+    if not fields:
+        return copy_value(doc)
+
+    slices = dict((k, v['$slice']) for k, v in fields.items() if isinstance(v, Mapping) and '$slice' in v)
+    flags = dict((k, bool(v)) for k, v in fields.items() if not isinstance(v, Mapping))
+    include = [k for k, v in flags.items() if v and k != '_id']
+
+    if include:
+        result = dict()
+        if flags.get('_id', True) and '_id' in doc:
+            result['_id'] = doc['_id']
+        for path in include + [k for k in slices if k not in include]:
+            value = _get_path(doc, path, _MISSING)
+            if value is not _MISSING:
+                _set_path(result, path, copy_value(value))
+    else:
+        result = copy_value(doc)
+        for path, flag in flags.items():
+            if not flag:
+                _unset_path(result, path)
+
+    for path, n in slices.items():
+        value = _get_path(result, path)
+        if isinstance(value, list):
+            _set_path(result, path, _slice(value, n))
+    return result
+
+
+def seed(query):
+    """
+    Return the new document created by an upsert, which has the equality fields of the query.
+    """
+    doc = dict()
+    for key, spec in (query or {}).items():
+        if key.startswith('$'):
+            continue
+        if is_operator_spec(spec):
+            if '$eq' in spec:
+                _set_path(doc, key, copy_value(spec['$eq']))
+        elif not isinstance(spec, RegexType):
+            _set_path(doc, key, copy_value(spec))
+    return doc
+
+
+def update(doc, changes, insert=False):
+    """
+    Apply update operators to a document in place and return True if it was modified. A
+    document without update operators replaces everything except the _id.
+    """
+    before = copy_value(doc)
+
+    if not any(k.startswith('$') for k in changes):
+        _id = doc.get('_id', _MISSING)
+        doc.clear()
+        doc.update(copy_value(changes))
+        if _id is not _MISSING:
+            doc['_id'] = _id
+        return doc != before
+
+    for op, spec in changes.items():
+        if op == '$setOnInsert' and not insert:
+            continue
+        for path, value in spec.items():
+            value = normalize(value)
+            if op in ('$set', '$setOnInsert'):
+                _set_path(doc, path, copy_value(value))
+            elif op == '$unset':
+                _unset_path(doc, path)
+            elif op == '$inc':
+                _set_path(doc, path, (_get_path(doc, path) or 0) + value)
+            elif op in ('$max', '$min'):
+                current = _get_path(doc, path, _MISSING)
+                if current is _MISSING or current is None:
+                    _set_path(doc, path, value)
+                elif value is not None and (value > current if op == '$max' else value < current):
+                    _set_path(doc, path, value)
+            elif op == '$push':
+                values = list(_get_path(doc, path) or []) + copy_value(_each(value))
+                if isinstance(value, Mapping) and '$slice' in value:
+                    values = _slice(values, value['$slice'])
+                _set_path(doc, path, values)
+            elif op == '$addToSet':
+                values = list(_get_path(doc, path) or [])
+                for v in _each(value):
+                    if v not in values:
+                        values.append(copy_value(v))
+                _set_path(doc, path, values)
+            elif op == '$pullAll':
+                _set_path(doc, path, [v for v in _get_path(doc, path) or [] if v not in value])
+            elif op == '$pull':
+                _set_path(doc, path, [v for v in _get_path(doc, path) or [] if not _matches_value([v], value)])
+            else:
+                raise ValueError('Unsupported update operator %s' % op)
+    return doc != before
+
+
+def _sort_value(value):
+    """
+    Order values of different types the way MongoDB does: null, numbers, strings, objects,
+    arrays, booleans then dates.
+    """
+    value = normalize(value)
+    if value is None or value is _MISSING:
+        return 0, 0
+    if isinstance(value, bool):
+        return 5, value
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, string_types):
+        return 2, value
+    if isinstance(value, dict):
+        return 3, repr(sorted(value.items(), key=lambda i: i[0]))
+    if isinstance(value, list):
+        return 4, repr(value)
+    if isinstance(value, datetime.datetime):
+        return 6, value
+    return 7, repr(value)
+
+
+def sort(docs, spec):
+    """
+    Sort documents in place by a list of (field, direction) pairs or an ordered dict.
+    """
+    if not spec:
+        return docs
+    if isinstance(spec, Mapping):
+        spec = list(spec.items())
+    for field, direction in reversed(list(spec)):
+        if isinstance(direction, Mapping):  # eg. text score, sorted by the caller
+            continue
+        docs.sort(key=lambda d: _sort_value(_get_path(d, field, _MISSING)), reverse=direction < 0)
+    return docs
+
+
+def evaluate(doc, expr):
+    """
+    Evaluate an aggregation expression eg. "$field", {"$slice": ["$history", 10]} or a literal.
+    """
+    if isinstance(expr, string_types) and expr.startswith('$'):
+        return _get_path(doc, expr[1:])
+    if isinstance(expr, Mapping):
+        if is_operator_spec(expr):
+            (op, args), = expr.items()
+            if op == '$slice':
+                values = evaluate(doc, args[0])
+                return _slice(values, args[1] if len(args) == 2 else list(args[1:])) if isinstance(values, list) else None
+            if op == '$size':
+                return len(evaluate(doc, args) or [])
+            if op == '$literal':
+                return args
+            raise ValueError('Unsupported expression operator %s' % op)
+        return dict((k, evaluate(doc, v)) for k, v in expr.items())
+    if isinstance(expr, list):
+        return [evaluate(doc, e) for e in expr]
+    return expr
+
+
+def _freeze(value):
+
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _group(docs, spec):
+
+    groups = dict()
+    order = list()
+    for doc in docs:
+        _id = evaluate(doc, spec['_id'])
+        key = _freeze(_id)
+        if key not in groups:
+            groups[key] = {'_id': _id}
+            order.append(key)
+        result = groups[key]
+        for field, acc in spec.items():
+            if field == '_id':
+                continue
+            (op, expr), = acc.items()
+            value = evaluate(doc, expr)
+            if op == '$sum':
+                result.setdefault(field, 0)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    result[field] += value
+            elif op in ('$max', '$min'):
+                current = result.get(field)
+                if value is not None and (current is None or (value > current if op == '$max' else value < current)):
+                    result[field] = value
+                else:
+                    result.setdefault(field, current)
+            elif op == '$addToSet':
+                values = result.setdefault(field, [])
+                if value is not None and value not in values:
+                    values.append(value)
+            elif op == '$push':
+                result.setdefault(field, []).append(value)
+            elif op == '$first':
+                result.setdefault(field, value)
+            elif op == '$last':
+                result[field] = value
+            else:
+                raise ValueError('Unsupported accumulator %s' % op)
+    return [groups[key] for key in order]
+
+
+def aggregate(docs, pipeline, lookup=None):
+    """
+    Run an aggregation pipeline. lookup(name, pipeline) runs a pipeline on another collection
+    for $unionWith. Returned documents may share values with the input documents.
+    """
+    docs = list(docs)
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == '$match':
+            docs = [d for d in docs if match(d, spec)]
+        elif name == '$project':
+            docs = [project(d, spec) for d in docs]
+        elif name == '$addFields':
+            added = list()
+            for d in docs:
+                d = dict(d)
+                for path, expr in spec.items():
+                    _set_path(d, path, evaluate(d, expr))
+                added.append(d)
+            docs = added
+        elif name == '$unwind':
+            path = (spec['path'] if isinstance(spec, Mapping) else spec)[1:]
+            unwound = list()
+            for d in docs:
+                values = _get_path(d, path)
+                if isinstance(values, list):
+                    for value in values:
+                        u = dict(d)
+                        _set_path(u, path, value)
+                        unwound.append(u)
+                elif values is not None:
+                    unwound.append(d)
+            docs = unwound
+        elif name == '$group':
+            docs = _group(docs, spec)
+        elif name == '$sort':
+            docs = sort(docs, spec)
+        elif name == '$skip':
+            docs = docs[spec:]
+        elif name == '$limit':
+            docs = docs[:spec] if spec else docs
+        elif name == '$unionWith':
+            docs = docs + list(lookup(spec['coll'], spec.get('pipeline', [])))
+        else:
+            raise ValueError('Unsupported aggregation stage %s' % name)
+    return docs
+
+
+def text_score(doc, terms, weights):
+    """
+    Relevance of a document to search terms. Each term found in a field scores the weight of
+    that field, quoted phrases must appear as-is and terms starting with "-" exclude the document.
+    """
+    phrases = re.findall(r'"([^"]+)"', terms)
+    words = re.findall(r'-?\w+', re.sub(r'"[^"]*"', ' ', terms).lower())
+
+    texts = dict()
+    for field in weights:
+        texts[field] = ' '.join(
+            v for v in _expand(resolve(doc, field)) if isinstance(v, string_types)
+        )
+    combined = ' '.join(texts.values()).lower()
+
+    if any(w[1:] in re.findall(r'\w+', combined) for w in words if w.startswith('-')):
+        return 0
+    if any(p.lower() not in combined for p in phrases):
+        return 0
+
+    score = 0.0
+    for field, text in texts.items():
+        tokens = re.findall(r'\w+', text.lower())
+        for word in words:
+            if not word.startswith('-'):
+                score += weights[field] * tokens.count(word)
+    return score
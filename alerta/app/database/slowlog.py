@@ -0,0 +1,231 @@
+"""
+Slow database commands aggregated by query shape, with index suggestions.
+
+A query shape is the command with every value replaced by "?" so that, eg. queries for
+different resources or time ranges are counted together, while field names, operators, sort
+order and aggregation stages are kept. Shapes are kept in process and shown by the
+/management/queries endpoint.
+"""
+
+import datetime
+import json
+import threading
+
+from collections import OrderedDict
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from bson import json_util
+from six import string_types
+
+from alerta.app import app
+
+COMMANDS = ['find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete']
+
+KEEP = ['$sort', '$project', 'coll']  # values that are part of the shape
+
+INTERNAL = ['$db', 'lsid', '$clusterTime', '$readPreference', 'txnNumber', 'autocommit', 'startTransaction']
+
+EQUALITY = ['$eq', '$in']
+RANGE = ['$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$regex', '$exists', '$not', '$elemMatch', '$all', '$size']
+
+
+def shape(value):
+    """
+    Replace values with "?", keeping keys, operators and field paths eg. "$service".
+    """
+    if isinstance(value, Mapping):
+        return OrderedDict((k, value[k] if k in KEEP else shape(v)) for k, v in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        shaped = [shape(v) for v in value]
+        if all(v == '?' for v in shaped):
+            return ['?'] if shaped else []
+        return shaped
+    if isinstance(value, string_types) and value.startswith('$'):
+        return value
+    if hasattr(value, 'pattern'):
+        return {'$regex': '?'}
+    return '?'
+
+
+def parse_command(name, command):
+    """
+    Return the filter and sort of a find, count, update, delete or aggregate command. For an
+    aggregation these are the first $match and a $sort that follows it.
+    """
+    filter = command.get('filter', command.get('query'))
+    sort = command.get('sort')
+    if filter is None and command.get('updates'):
+        filter = command['updates'][0].get('q')
+    if filter is None and command.get('deletes'):
+        filter = command['deletes'][0].get('q')
+
+    pipeline = command.get('pipeline') or []
+    if pipeline and '$match' in pipeline[0]:
+        filter = pipeline[0]['$match']
+        if len(pipeline) > 1 and '$sort' in pipeline[1]:
+            sort = pipeline[1]['$sort']
+
+    if isinstance(sort, Mapping):
+        sort = list(sort.items())
+    return filter or {}, sort or []
+
+
+def suggest_index(filter, sort):
+    """
+    Suggest index keys for a query following the Equality, Sort, Range rule: fields compared by
+    equality first, then the sort fields, then fields compared by range. Returns the key and the
+    number of equality fields for each branch of an $or, or none if the query is by _id or a
+    text search.
+    """
+    if '$text' in filter or '_id' in filter:
+        return []
+    if '$or' in filter:
+        rest = dict((k, v) for k, v in filter.items() if k != '$or')
+        keys = list()
+        for branch in filter['$or']:
+            merged = dict(rest)
+            merged.update(branch)
+            keys.extend(k for k in suggest_index(merged, sort) if k not in keys)
+        return keys
+
+    equality, ranges = list(), list()
+    for field, spec in sorted(filter.items()):
+        if field.startswith('$'):
+            continue
+        if isinstance(spec, Mapping) and spec and all(k.startswith('$') for k in spec):
+            if any(op in spec for op in EQUALITY) and not any(op in spec for op in RANGE):
+                equality.append(field)
+            else:
+                ranges.append(field)
+        elif hasattr(spec, 'pattern'):
+            ranges.append(field)
+        else:
+            equality.append(field)
+
+    key = [(field, 1) for field in equality]
+    key += [(field, 1 if direction >= 0 else -1) for field, direction in sort if field not in equality]
+    key += [(field, 1) for field in ranges if field not in equality and field not in dict(sort)]
+    return [(key, len(equality))] if key else []
+
+
+def covered_by(key, equality, indexes):
+    """
+    Return the name of an existing index that starts with the suggested key. The first equality
+    fields may be in any order, the sort and range fields that follow must be in the same order
+    and direction, or all reversed as an index can be read backwards.
+    """
+    fields = set(f for f, _ in key[:equality])
+    rest = [tuple(k) for k in key[equality:]]
+    reverse = [(f, -d) for f, d in rest]
+    for name, index in indexes.items():
+        index = [tuple(k) for k in index]
+        if len(index) < len(key) or set(f for f, _ in index[:equality]) != fields:
+            continue
+        if index[equality:len(key)] in (rest, reverse):
+            return name
+    return None
+
+
+class SlowQueryLog(object):
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.shapes = dict()
+
+    def record(self, collection, name, command, duration):
+        """
+        Add a command that took duration milliseconds to the totals for its shape.
+        """
+        if name not in COMMANDS:
+            return
+        filter, sort = parse_command(name, command)
+        query_shape = OrderedDict([('filter', shape(filter)), ('sort', sort)])
+        if command.get('pipeline'):
+            query_shape['pipeline'] = shape(command['pipeline'])
+        key = '%s.%s %s' % (collection, name, json.dumps(query_shape, default=str))
+
+        with self.lock:
+            entry = self.shapes.get(key)
+            if entry is None:
+                if len(self.shapes) >= app.config['SLOW_QUERY_MAX_SHAPES']:
+                    return
+                entry = self.shapes[key] = {
+                    'collection': collection,
+                    'command': name,
+                    'shape': query_shape,
+                    'count': 0,
+                    'totalTime': 0.0,
+                    'maxTime': 0.0
+                }
+            entry['count'] += 1
+            entry['totalTime'] += duration
+            entry['lastTime'] = datetime.datetime.utcnow()
+            if duration >= entry['maxTime']:
+                entry['maxTime'] = duration
+                entry['example'] = OrderedDict((k, v) for k, v in command.items() if k not in INTERNAL)
+
+    def top(self, limit=10):
+        """
+        Return the shapes with the most total time.
+        """
+        with self.lock:
+            entries = sorted(self.shapes.values(), key=lambda e: e['totalTime'], reverse=True)[:limit or None]
+            return [dict(e) for e in entries]
+
+    def reset(self):
+
+        with self.lock:
+            self.shapes.clear()
+
+
+def report(db, limit=10, explain=True):
+    """
+    The slowest query shapes with their mean time, query plan and suggested indexes.
+    """
+    queries = list()
+    indexes = dict()
+    for entry in slow_queries.top(limit):
+        collection = entry['collection']
+        filter, sort = parse_command(entry['command'], entry['example'])
+
+        if collection not in indexes:
+            try:
+                indexes[collection] = db.get_index_keys(collection)
+            except Exception as e:
+                app.logger.warning('Failed to get indexes of %s: %s', collection, e)
+                indexes[collection] = dict()
+
+        suggestions = list()
+        for key, equality in suggest_index(filter, sort):
+            suggestions.append({
+                'key': key,
+                'existing': covered_by(key, equality, indexes[collection])
+            })
+
+        query = {
+            'collection': collection,
+            'command': entry['command'],
+            'shape': entry['shape'],
+            'count': entry['count'],
+            'totalTime': round(entry['totalTime'], 3),
+            'meanTime': round(entry['totalTime'] / entry['count'], 3),
+            'maxTime': round(entry['maxTime'], 3),
+            'lastTime': entry['lastTime'],
+            'example': json.loads(json_util.dumps(entry['example'])),
+            'suggestedIndexes': suggestions
+        }
+        if explain:
+            try:
+                query['explain'] = db.explain(collection, entry['command'], entry['example'])
+            except Exception as e:
+                query['explain'] = {'error': str(e)}
+        queries.append(query)
+    return queries
+
+
+slow_queries = SlowQueryLog()
@@ -0,0 +1,689 @@
+
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from six import string_types
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from alerta.app import app
+from alerta.app.database import memory, monitor, query as q
+
+
+LOG = app.logger
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# Scalar fields copied from the JSON document into columns so that queries on them run in SQLite
+COLUMNS = {
+    'alerts': ['environment', 'resource', 'event', 'customer', 'status', 'severity', 'lastReceiveTime', 'expireTime', 'lastReceiveId'],
+    'alerts_archive': ['environment', 'resource', 'event', 'customer', 'status', 'severity', 'lastReceiveTime', 'lastReceiveId'],
+    'heartbeats': ['origin', 'customer', 'status', 'expireTime'],
+    'blackouts': ['environment'],
+    'users': ['login', 'hash'],
+    'keys': ['key', 'user'],
+    'perms': ['match'],
+    'customers': ['match'],
+    'metrics': ['group', 'name', 'type']
+}
+
+INDEXES = {
+    'alerts': [
+        ['environment', 'resource', 'event', 'customer'],  # de-duplication key
+        ['lastReceiveTime'],
+        ['status', 'lastReceiveTime'],
+        ['severity', 'lastReceiveTime'],
+        ['expireTime'],
+        ['lastReceiveId']
+    ],
+    'alerts_archive': [
+        ['environment', 'resource', 'event', 'customer'],
+        ['lastReceiveTime'],
+        ['lastReceiveId']
+    ],
+    'heartbeats': [['origin', 'customer'], ['status', 'expireTime']],
+    'blackouts': [['environment']],
+    'users': [['login'], ['hash']],
+    'keys': [['key'], ['user']],
+    'perms': [['match']],
+    'customers': [['match']],
+    'metrics': [['group', 'name']]
+}
+
+# Indexes that are unique like those of the MongoDB backend, a missing customer is the same as any other
+UNIQUE = {
+    'alerts': ['environment', 'resource', 'event', 'customer'],
+    'heartbeats': ['origin', 'customer'],
+    'keys': ['key'],
+    'metrics': ['group', 'name']
+}
+
+# Collections that keep the history array of each document in a separate table
+HISTORY = ['alerts', 'alerts_archive']
+
+_UNSUPPORTED = object()
+
+
+class FixedIndexError(NotImplementedError):
+    """
+    Indexes of the SQLite database are part of its schema and can't be created or dropped.
+    """
+    pass
+
+
+def _default(value):
+
+    if isinstance(value, datetime.datetime):
+        return {'$date': q.normalize(value).strftime(DATE_FORMAT)}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def _object_hook(obj):
+
+    if len(obj) == 1:
+        if '$date' in obj:
+            return datetime.datetime.strptime(obj['$date'], DATE_FORMAT)
+        if '$oid' in obj:
+            return ObjectId(obj['$oid'])
+    return obj
+
+
+def dumps(doc):
+
+    return json.dumps(doc, default=_default, separators=(',', ':'))
+
+
+def loads(text):
+
+    return json.loads(text, object_hook=_object_hook)
+
+
+def _sql_value(value):
+    """
+    Value as stored in a column, dates as sortable text. Documents and arrays can't be stored.
+    """
+    value = q.normalize(value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if value is None or isinstance(value, string_types):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return _UNSUPPORTED
+
+
+def _query_fields(query):
+
+    for key, spec in (query or {}).items():
+        if key in ('$or', '$and', '$nor'):
+            for sub in spec:
+                for field in _query_fields(sub):
+                    yield field
+        else:
+            yield key
+
+
+def _is_history(field):
+
+    return field == 'history' or field.startswith('history.')
+
+
+class Transaction(object):
+    """
+    Re-entrant transaction on the connection of the current thread. Write transactions start
+    immediately so that a read followed by a write is atomic across threads and processes.
+    """
+    def __init__(self, database, mode='IMMEDIATE'):
+
+        self.database = database
+        self.mode = mode
+
+    def __enter__(self):
+
+        conn = self.database.conn
+        local = self.database.local
+        if not local.depth:
+            conn.execute('BEGIN %s' % self.mode)
+        local.depth += 1
+        return conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        local = self.database.local
+        local.depth -= 1
+        if not local.depth:
+            self.database.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class Collection(memory.Collection):
+    """
+    Documents stored as JSON in a table with an "id" primary key. Fields listed in COLUMNS are
+    also stored in indexed columns so that equality, range and prefix queries on them, and sorts,
+    are done by SQLite. The rest of a query is evaluated in Python. The history of an alert is
+    kept in a separate table so that adding to it doesn't rewrite the alert.
+    """
+    def __init__(self, database, name):
+
+        self.database = database
+        self.name = name
+        self.columns = COLUMNS.get(name, [])
+        self.history = name in HISTORY
+        self.lock = Transaction(database, 'IMMEDIATE')
+        self.read_lock = Transaction(database, 'DEFERRED')
+
+    def create_table(self, conn):
+
+        conn.execute('CREATE TABLE IF NOT EXISTS "%s" (id PRIMARY KEY, doc TEXT NOT NULL%s)' % (
+            self.name, ''.join(', "%s"' % c for c in self.columns)))
+        existing = dict((row[1], bool(row[2])) for row in conn.execute('PRAGMA index_list("%s")' % self.name))
+        for columns in INDEXES.get(self.name, []):
+            name = '%s_%s' % (self.name, '_'.join(columns))
+            if columns == UNIQUE.get(self.name):
+                if existing.get(name) is False:
+                    conn.execute('DROP INDEX "%s"' % name)  # created before it was unique
+                try:
+                    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS "%s" ON "%s" (%s)' % (name, self.name, ', '.join(
+                        'IFNULL("%s", \'\')' % c if c == 'customer' else '"%s"' % c for c in columns)))
+                    continue
+                except sqlite3.IntegrityError as e:
+                    LOG.warning('SQLite Database: Index %s is not unique as "%s" has duplicates: %s', name, self.name, e)
+            conn.execute('CREATE INDEX IF NOT EXISTS "%s" ON "%s" (%s)' % (
+                name, self.name, ', '.join('"%s"' % c for c in columns)))
+        if self.history:
+            conn.execute('CREATE TABLE IF NOT EXISTS "%s_history" (id NOT NULL, seq INTEGER NOT NULL, entry TEXT NOT NULL, '
+                         'PRIMARY KEY (id, seq)) WITHOUT ROWID' % self.name)
+
+    def _reading(self):
+
+        return self.read_lock
+
+    # queries
+
+    def _column(self, field):
+
+        if field == '_id':
+            return 'id'
+        if field in self.columns:
+            return '"%s"' % field
+
+    @staticmethod
+    def _clause(column, op, target, spec):
+
+        if op in ('$in', '$nin'):
+            values = [_sql_value(v) for v in target]
+            if not values or _UNSUPPORTED in values:
+                return
+            nulls = None in values
+            values = [v for v in values if v is not None]
+            sql = '%s %s (%s)' % (column, 'IN' if op == '$in' else 'NOT IN', ', '.join('?' * len(values))) if values else None
+            if op == '$in':
+                sql = ' OR '.join(s for s in [sql, '%s IS NULL' % column if nulls else None] if s)
+            else:
+                sql = ' AND '.join(s for s in [sql, '%s IS NOT NULL' % column if nulls else None] if s)
+                sql = sql if nulls else '(%s IS NULL OR %s)' % (column, sql)
+            return '(%s)' % sql, values
+
+        if op == '$regex':
+            pattern = target.pattern if isinstance(target, q.RegexType) else target
+            flags = target.flags & ~re.UNICODE if isinstance(target, q.RegexType) else spec.get('$options')
+            if flags or not pattern.startswith('^') or re.search(r'[.^$*+?{}\[\]\\|()]', pattern[1:]):
+                return  # only a literal prefix can use an index
+            return '(%s >= ? AND %s < ?)' % (column, column), [pattern[1:], pattern[1:] + u'\U0010ffff']
+
+        value = _sql_value(target)
+        if value is _UNSUPPORTED:
+            return
+        if op == '$eq':
+            return ('%s IS NULL' % column, []) if value is None else ('%s = ?' % column, [value])
+        if op == '$ne':
+            return ('%s IS NOT NULL' % column, []) if value is None else ('(%s IS NULL OR %s != ?)' % (column, column), [value])
+        if op in ('$gt', '$gte', '$lt', '$lte') and value is not None:
+            if isinstance(q.normalize(target), datetime.datetime):
+                types = "'text'"
+            elif not isinstance(value, string_types):
+                types = "'integer', 'real'"
+            else:
+                return
+            return '(typeof(%s) IN (%s) AND %s %s ?)' % (
+                column, types, column, {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}[op]), [value]
+
+    def _where(self, filter):
+        """
+        Translate as much of a query as possible to SQL. Returns the conditions, their parameters
+        and whether the whole query was translated.
+        """
+        conditions, params, complete = list(), list(), True
+        for key, spec in (filter or {}).items():
+            if key == '$or':
+                branches = [self._where(sub) for sub in spec]
+                if branches and all(b[0] and b[2] for b in branches):
+                    conditions.append('(%s)' % ' OR '.join('(%s)' % ' AND '.join(b[0]) for b in branches))
+                    for b in branches:
+                        params.extend(b[1])
+                else:
+                    complete = False
+                continue
+            column = None if key.startswith('$') else self._column(key)
+            if column is None:
+                complete = False
+                continue
+            if q.is_operator_spec(spec):
+                ops = spec
+            elif isinstance(spec, q.RegexType):
+                ops = {'$regex': spec}
+            elif isinstance(spec, (Mapping, list)):
+                complete = False
+                continue
+            else:
+                ops = {'$eq': spec}
+            for op, target in ops.items():
+                if op == '$options':
+                    continue
+                clause = self._clause(column, op, target, ops)
+                if clause is None:
+                    complete = False
+                    continue
+                conditions.append(clause[0])
+                params.extend(clause[1])
+        return conditions, params, complete
+
+    def _order(self, sort):
+
+        if isinstance(sort, Mapping):
+            sort = list(sort.items())
+        order = list()
+        for field, direction in sort or []:
+            column = self._column(field)
+            if column is None or isinstance(direction, Mapping):
+                return
+            order.append('%s %s' % (column, 'DESC' if direction < 0 else 'ASC'))
+        return ', '.join(order + ['rowid'])
+
+    def _needs_history(self, filter, projection):
+
+        if not self.history:
+            return False
+        if any(_is_history(field) for field in _query_fields(filter)):
+            return True
+        return 'history' in q.project({'history': []}, projection)
+
+    def _select(self, filter=None, sort=None, skip=0, limit=0):
+        """
+        Return the SQL for a query, its parameters and whether SQLite does the whole query and
+        sort. If not, the rest is done in Python on the rows returned.
+        """
+        conditions, params, complete = self._where(filter)
+        order = self._order(sort) if sort else 'rowid'
+        pushdown = complete and order is not None
+
+        sql = 'SELECT doc FROM "%s"' % self.name
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + (order if pushdown else 'rowid')
+        if pushdown and (skip or limit):
+            sql += ' LIMIT ? OFFSET ?'
+            params += [limit or -1, skip]
+        return sql, params, pushdown
+
+    def _find(self, filter=None, sort=None, skip=0, limit=0, projection=None, history=None):
+
+        if history is None:
+            history = self._needs_history(filter, projection)
+        sql, params, pushdown = self._select(filter, sort, skip, limit)
+
+        with self._reading() as conn:
+            docs = [loads(row[0]) for row in conn.execute(sql, params)]
+            if history:
+                self._load_history(conn, docs)
+
+        if not pushdown:
+            docs = q.sort([doc for doc in docs if q.match(doc, filter)], sort)
+            if skip:
+                docs = docs[skip:]
+            if limit:
+                docs = docs[:limit]
+        return docs
+
+    def _find_for_update(self, filter, sort=None, limit=0):
+
+        return self._find(filter, sort, limit=limit, history=self._needs_history(filter, {'history': 0}))
+
+    def _project(self, doc, projection):
+
+        if self.history and 'history' not in doc and self._needs_history(None, projection):
+            with self._reading() as conn:
+                self._load_history(conn, [doc])
+        return q.project(doc, projection)
+
+    @monitor.command('count')
+    def count(self, filter=None):
+
+        conditions, params, complete = self._where(filter)
+        if not complete:
+            return len(self._find(filter, projection={'_id': 1}))
+        sql = 'SELECT COUNT(*) FROM "%s"' % self.name
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        with self._reading() as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+    def _aggregate(self, pipeline):
+
+        history = self.history and ('history' in repr(pipeline) or
+                                    not any('$project' in stage or '$group' in stage for stage in pipeline))
+        with self._reading():
+            if pipeline and '$match' in pipeline[0]:
+                docs = self._find(pipeline[0]['$match'], history=history)
+                pipeline = pipeline[1:]
+            else:
+                docs = self._find(history=history)
+            return q.aggregate(docs, pipeline, lookup=self._lookup)
+
+    # history
+
+    def _load_history(self, conn, docs):
+
+        ids = [_sql_value(doc['_id']) for doc in docs]
+        entries = dict()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = conn.execute('SELECT id, entry FROM "%s_history" WHERE id IN (%s) ORDER BY id, seq' % (
+                self.name, ', '.join('?' * len(chunk))), chunk)
+            for id, entry in rows:
+                entries.setdefault(id, []).append(loads(entry))
+        for id, doc in zip(ids, docs):
+            doc['history'] = entries.get(id, [])
+
+    def _append_history(self, conn, id, entries, keep=None):
+
+        last = conn.execute('SELECT MAX(seq) FROM "%s_history" WHERE id = ?' % self.name, (id,)).fetchone()[0] or 0
+        conn.executemany('INSERT INTO "%s_history" (id, seq, entry) VALUES (?, ?, ?)' % self.name,
+                         [(id, last + i + 1, dumps(entry)) for i, entry in enumerate(entries)])
+        if keep is not None:
+            conn.execute('DELETE FROM "%s_history" WHERE id = ? AND seq <= ?' % self.name, (id, last + len(entries) - keep))
+
+    def _replace_history(self, conn, id, entries):
+
+        conn.execute('DELETE FROM "%s_history" WHERE id = ?' % self.name, (id,))
+        self._append_history(conn, id, entries or [])
+
+    @staticmethod
+    def _history_push(changes):
+        """
+        Return the entries and number to keep if the only change to history is a $push with a
+        negative $slice, which can be done without reading the existing history.
+        """
+        push = changes.get('$push', {}).get('history')
+        if push is None or any(_is_history(path) for op, spec in changes.items() for path in spec if op != '$push'):
+            return
+        if not isinstance(push, Mapping) or '$each' not in push:
+            return [push], None
+        n = push.get('$slice')
+        if n is None:
+            return list(push['$each']), None
+        if isinstance(n, int) and n <= 0:
+            return list(push['$each']), abs(n)
+
+    # writes
+
+    def _row(self, doc):
+
+        values = list()
+        for field in self.columns:
+            value = _sql_value(doc.get(field))
+            values.append(None if value is _UNSUPPORTED else value)
+        return values
+
+    def _insert(self, doc):
+
+        doc = q.copy_value(doc)
+        doc.setdefault('_id', ObjectId())
+        history = doc.pop('history', None) if self.history else None
+
+        conn = self.database.conn
+        try:
+            conn.execute('INSERT INTO "%s" (id, doc%s) VALUES (?, ?%s)' % (
+                self.name, ''.join(', "%s"' % c for c in self.columns), ', ?' * len(self.columns)),
+                [_sql_value(doc['_id']), dumps(doc)] + self._row(doc))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError('E11000 duplicate key error collection: %s: %s' % (self.name, e), 11000)
+
+        if history is not None:
+            self._append_history(conn, _sql_value(doc['_id']), history)
+            doc['history'] = history
+        return doc
+
+    def _write(self, conn, doc):
+
+        stored = dict((k, v) for k, v in doc.items() if not (self.history and k == 'history'))
+        try:
+            conn.execute('UPDATE "%s" SET doc = ?%s WHERE id = ?' % (
+                self.name, ''.join(', "%s" = ?' % c for c in self.columns)),
+                [dumps(stored)] + self._row(stored) + [_sql_value(doc['_id'])])
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError('E11000 duplicate key error collection: %s: %s' % (self.name, e), 11000)
+
+    def _update(self, doc, changes, insert=False):
+
+        conn = self.database.conn
+        id = _sql_value(doc['_id'])
+
+        push = self._history_push(changes) if self.history else None
+        if push is not None:
+            entries, keep = push
+            changes = dict(changes)
+            changes['$push'] = dict((k, v) for k, v in changes['$push'].items() if k != 'history')
+            if not changes['$push']:
+                del changes['$push']
+            history = doc.pop('history', None)
+            if changes:
+                q.update(doc, changes, insert=insert)
+            self._write(conn, doc)
+            self._append_history(conn, id, entries, keep)
+            if history is not None:
+                history = history + q.copy_value(entries)
+                doc['history'] = history[len(history) - keep:] if keep is not None else history
+            return True
+
+        replace = not any(op.startswith('$') for op in changes)
+        touches_history = self.history and (
+            replace or any(_is_history(path) for op, spec in changes.items() for path in spec))
+        if touches_history and 'history' not in doc:
+            self._load_history(conn, [doc])
+        before = doc.get('history')
+
+        modified = q.update(doc, changes, insert=insert)
+        if modified:
+            self._write(conn, doc)
+            if touches_history and doc.get('history') != before:
+                self._replace_history(conn, id, doc.get('history'))
+        return modified
+
+    def _remove(self, doc):
+
+        conn = self.database.conn
+        conn.execute('DELETE FROM "%s" WHERE id = ?' % self.name, (_sql_value(doc['_id']),))
+        if self.history:
+            conn.execute('DELETE FROM "%s_history" WHERE id = ?' % self.name, (_sql_value(doc['_id']),))
+
+    def create_index(self, keys, name=None, **kwargs):
+        """
+        Return the name of the schema index on the same fields, as the index already exists.
+        """
+        if not isinstance(keys, list):
+            keys = [(keys, 1)]
+        fields = [field for field, _ in keys]
+        for existing, info in self.index_information().items():
+            if [field for field, _ in info['key']] == fields:
+                return existing
+        raise FixedIndexError('Indexes of the SQLite database are fixed, can\'t create index on %s of "%s"' % (', '.join(fields), self.name))
+
+    def index_information(self):
+
+        with self._reading() as conn:
+            info = dict()
+            for row in conn.execute('PRAGMA index_list("%s")' % self.name).fetchall():
+                name, unique = row[1], row[2]
+                columns = [r[2] for r in conn.execute('PRAGMA index_info("%s")' % name)]
+                if None in columns:  # an expression, eg. IFNULL(customer, '')
+                    columns = next((c for c in INDEXES.get(self.name, []) if name == '%s_%s' % (self.name, '_'.join(c))), columns)
+                info[name] = {'key': [(c, 1) for c in columns]}
+                if unique:
+                    info[name]['unique'] = True
+            return info
+
+    def drop_index(self, name):
+
+        raise FixedIndexError('Indexes of the SQLite database are fixed, can\'t drop index %s of "%s"' % (name, self.name))
+
+    def index_keys(self):
+
+        keys = dict((name, [('_id' if field == 'id' else field, 1) for field, _ in info['key']])
+                    for name, info in self.index_information().items())
+        keys['_id_'] = [('_id', 1)]
+        return keys
+
+    def explain(self, filter, sort=None):
+        """
+        The SQLite query plan, and whether any of the query or sort is done in Python.
+        """
+        sql, params, pushdown = self._select(filter, sort)
+        with self._reading() as conn:
+            plan = [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        return {
+            'sql': sql,
+            'plan': plan,
+            'pushdown': pushdown
+        }
+
+    def drop(self):
+
+        with self.lock as conn:
+            conn.execute('DELETE FROM "%s"' % self.name)
+            if self.history:
+                conn.execute('DELETE FROM "%s_history"' % self.name)
+
+
+class SQLiteDB(memory.MemoryDB):
+    """
+    Collections stored in one SQLite database file in WAL mode, so readers don't block the
+    writer. Each thread has its own connection and forked processes open new connections.
+    """
+    def __init__(self, path, timeout=5, synchronous='NORMAL'):
+
+        super(SQLiteDB, self).__init__(os.path.splitext(os.path.basename(path))[0])
+        self.path = path
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self.local = threading.local()
+
+        with Transaction(self) as conn:
+            for name in COLUMNS:
+                self[name].create_table(conn)
+
+    @property
+    def conn(self):
+
+        if getattr(self.local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=%s' % self.synchronous)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+            self.local.depth = 0
+        return self.local.conn
+
+    def _collection(self, name):
+
+        collection = Collection(self, name)
+        if name not in COLUMNS:
+            with Transaction(self) as conn:
+                collection.create_table(conn)
+        return collection
+
+    def close(self):
+
+        if getattr(self.local, 'pid', None) == os.getpid():
+            self.local.conn.close()
+        self.local.pid = None
+
+    def drop(self):
+
+        with Transaction(self) as conn:
+            tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table in tables:
+                conn.execute('DELETE FROM "%s"' % table)
+
+
+class Database(memory.Database):
+    """
+    Database in a single SQLite file for small sites, which doesn't need a MongoDB server.
+    Documents use the same queries as the MongoDB backend and the indexes are fixed.
+    """
+    def connect(self):
+
+        path = app.config['SQLITE_DATABASE']
+        self.connection = None
+        self.db = SQLiteDB(path, timeout=app.config['SQLITE_TIMEOUT'], synchronous=app.config['SQLITE_SYNCHRONOUS'])
+        self.secondary = None
+        LOG.info('SQLite Database: SQLite v%s, using database "%s"', self.get_version(), path)
+
+    def get_version(self):
+
+        return sqlite3.sqlite_version
+
+    def is_alive(self):
+
+        try:
+            self.db.conn.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    def disconnect(self):
+
+        self.db.close()
+
+        LOG.debug('SQLite connection closed.')
+
+    def destroy_db(self, name=None):
+
+        self.db.drop()
+
+        LOG.warning('SQLite database "%s" deleted.' % (name or self.get_db_name()))
+
+    def verify_indexes(self):
+        """
+        The SQLite schema and its indexes are created on connect, so report what exists. Declared
+        indexes that aren't part of the schema, eg. the text index or MONGO_INDEXES, are "skipped".
+        """
+        report = list()
+        existing = dict()
+        for collection in sorted(COLUMNS):
+            for name, info in sorted(self.db[collection].index_information().items()):
+                if not name.startswith('sqlite_autoindex'):
+                    existing.setdefault(collection, list()).append([field for field, _ in info['key']])
+                    report.append({'collection': collection, 'name': name, 'key': info['key'], 'state': 'ok'})
+
+        for index in self.get_index_specs():
+            if [field for field, _ in index['key']] not in existing.get(index['collection'], []):
+                report.append({'collection': index['collection'], 'name': index['name'], 'key': index['key'],
+                               'state': 'skipped', 'error': 'indexes of the SQLite database are fixed'})
+        return report
+
+    def sync_indexes(self, prune=False):
+
+        return self.verify_indexes()
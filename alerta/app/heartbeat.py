@@ -101,7 +101,7 @@ class Heartbeat(object):
         try:
             if isinstance(heartbeat, bytes):
                 heartbeat = json.loads(heartbeat.decode('utf-8'))  # See https://bugs.python.org/issue10976
-            else:
+            elif not isinstance(heartbeat, dict):
                 heartbeat = json.loads(heartbeat)
         except ValueError as e:
             raise ValueError('Could not parse heartbeat - %s: %s' % (e, heartbeat))
@@ -114,6 +114,13 @@ class Heartbeat(object):
         if heartbeat.get('tags', None):
             if not isinstance(heartbeat['tags'], list):
                 raise ValueError('Attribute must be list: tags')
+        if heartbeat.get('timeout', None) is not None:
+            if isinstance(heartbeat['timeout'], bool):
+                raise ValueError('Timeout must be an integer')
+            try:
+                heartbeat['timeout'] = int(heartbeat['timeout'])
+            except (TypeError, ValueError):
+                raise ValueError('Timeout must be an integer')
 
         return Heartbeat(
             origin=heartbeat.get('origin', None),
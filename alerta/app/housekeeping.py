@@ -0,0 +1,381 @@
+
+import os
+import atexit
+import datetime
+import socket
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
+from uuid import uuid4
+
+from alerta.app import app, db, status_code
+from alerta.app.alert import Alert
+from alerta.app.auth import flush_key_usage
+from alerta.app.database.monitor import flush_endpoint_stats
+from alerta.app.exceptions import RejectException, RateLimit, BlackoutPeriod
+from alerta.app.metrics import Counter, Histogram, Timer
+from alerta.app.utils import process_alert, process_status
+
+LOG = app.logger
+
+expire_timer = Timer('alerts', 'expired', 'Expired alerts', 'Total time and number of timed out alerts expired by housekeeping')
+heartbeat_alert_timer = Timer('heartbeats', 'alerts', 'Heartbeat alerts', 'Total time and number of stale and recovered heartbeat alerts')
+retention_timer = Timer('alerts', 'retention', 'Retention policy', 'Total time and number of alerts deleted by retention policy')
+archive_timer = Timer('alerts', 'archived', 'Archived alerts', 'Total time and number of alerts moved to the archive')
+job_error_counter = Counter('housekeeping', 'errored', 'Housekeeping errors', 'Number of housekeeping jobs that failed')
+
+
+class LeaseLost(Exception):
+    """Another process took over the housekeeping lease while a job was running."""
+    pass
+
+
+class Scheduler(object):
+    """
+    Run housekeeping jobs at a fixed interval in a background thread of each API server process.
+
+    Jobs added with leader_only=True run in only one process across the cluster at a time, the
+    one holding the "housekeeping" lease. The lease is renewed while it is held and taken over
+    by another process within HOUSEKEEPING_LEASE_TTL seconds if the holder goes away. Each new
+    holder gets a larger fencing token so a job can check that it has not been superseded.
+    """
+    def __init__(self, lease='housekeeping'):
+
+        self.jobs = list()
+        self.pid = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        self.lease = lease
+        self.instance = str(uuid4())[:8]
+        self.token = None  # fencing token while lease is held
+        self.lease_until = 0
+        self.next_lease_check = 0
+        self.fence = None  # token of the lease that the running job was started under
+
+    @property
+    def holder(self):
+
+        return '%s/%s/%s' % (socket.gethostname(), os.getpid(), self.instance)
+
+    def add_job(self, func, interval, leader_only=True):
+
+        if interval:
+            self.jobs.append({'func': func, 'interval': interval, 'leaderOnly': leader_only, 'nextRun': 0})
+
+    def start(self):
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()  # threads don't survive a fork so start again in each worker
+            self.token = None
+
+            thread = threading.Thread(target=self.run, name='housekeeping')
+            thread.daemon = True
+            thread.start()
+            LOG.info('Housekeeping: Started %s jobs', len(self.jobs))
+
+    def stop(self):
+
+        self.stopped.set()
+        self.release_lease()
+
+    def run(self):
+
+        while not self.stopped.is_set():
+            if any(job['leaderOnly'] for job in self.jobs):
+                self.is_leader()  # keep lease renewed between jobs
+            self.run_pending()
+            self.stopped.wait(1)
+
+    def is_leader(self, renew=False):
+        """
+        Acquire or renew the lease, at most every third of HOUSEKEEPING_LEASE_TTL unless renew is set.
+        """
+        ttl = app.config['HOUSEKEEPING_LEASE_TTL']
+        now = time.time()
+        if renew or now >= self.next_lease_check:
+            try:
+                token = db.acquire_lease(self.lease, self.holder, ttl)
+            except Exception as e:
+                LOG.error('Housekeeping: Failed to acquire lease: %s', e)
+                token = None
+            if token and token != self.token:
+                LOG.info('Housekeeping: Acquired lease "%s" with token %s', self.lease, token)
+            self.token = token
+            self.lease_until = now + ttl if token else 0
+            self.next_lease_check = now + ttl / 3.0
+        return self.token is not None and now < self.lease_until
+
+    def check_lease(self):
+        """
+        Called by leader-only jobs between batches. Raises LeaseLost if another process
+        has taken over since the job started.
+        """
+        if self.fence is None:
+            return  # not running under the scheduler eg. called directly
+        if not self.is_leader(renew=True) or self.token != self.fence:
+            raise LeaseLost('lease "%s" token %s superseded' % (self.lease, self.fence))
+
+    def release_lease(self):
+
+        if self.token is not None:
+            try:
+                db.release_lease(self.lease, self.holder)
+            except Exception as e:
+                LOG.warning('Housekeeping: Failed to release lease: %s', e)
+            self.token = None
+
+    def run_pending(self, force=False):
+
+        leader = None
+        for job in self.jobs:
+            now = time.time()
+            if not force and job['nextRun'] > now:
+                continue
+            if job['leaderOnly']:
+                if leader is None:
+                    leader = self.is_leader(renew=force)
+                if not leader:
+                    continue
+                self.fence = self.token
+            job['nextRun'] = now + job['interval']
+            try:
+                with app.app_context():
+                    job['func']()
+            except LeaseLost as e:
+                LOG.warning('Housekeeping: Job %s stopped: %s', job['func'].__name__, e)
+            except Exception as e:
+                job_error_counter.inc()
+                LOG.error('Housekeeping: Job %s failed: %s', job['func'].__name__, e)
+            finally:
+                self.fence = None
+
+
+def expire_alert(alert):
+
+    started = expire_timer.start_timer()
+    try:
+        alert, status, text = process_status(alert, status_code.EXPIRED, 'alert timeout status change')
+        if not db.expire_alert(alert, status, text):
+            LOG.debug('Housekeeping: Alert %s was received again before it expired', alert.id)
+            return False
+    except RejectException as e:
+        LOG.info('Housekeeping: Expiry of alert %s rejected: %s', alert.id, e)
+        return False
+    except Exception as e:
+        LOG.error('Housekeeping: Failed to expire alert %s: %s', alert.id, e)
+        return False
+    finally:
+        expire_timer.stop_timer(started)
+    return True
+
+
+def run_in_batches(fetch, func, batch_size, concurrency):
+    """
+    Call func for each item returned by fetch, a batch at a time, using a pool of worker
+    threads. Each batch is fetched after the last id of the one before, so items that func
+    doesn't complete, eg. rejected by a plugin, are left for the next run without holding up
+    the rest.
+    """
+    pool = ThreadPool(concurrency)
+
+    after = None
+    done = 0
+    try:
+        while True:
+            items = fetch(limit=batch_size, after=after)
+            if not items:
+                break
+            after = items[-1].id
+
+            done += pool.map(func, items).count(True)
+            if len(items) < batch_size:
+                break
+            scheduler.check_lease()
+    finally:
+        pool.close()
+        pool.join()
+    return done
+
+
+def expire_alerts():
+    """
+    Expire alerts that have timed out, in batches of ALERT_EXPIRE_BATCH_SIZE so that a large
+    backlog doesn't hold all matching alerts in memory at once. Alerts go through status change
+    plugins and history in the same way as a status update from the API.
+    """
+    expired = run_in_batches(
+        db.get_expired_alerts,
+        expire_alert,
+        batch_size=app.config['ALERT_EXPIRE_BATCH_SIZE'],
+        concurrency=app.config['ALERT_EXPIRE_CONCURRENCY']
+    )
+    if expired:
+        LOG.info('Housekeeping: Expired %s alerts', expired)
+    return expired
+
+
+def heartbeat_alert(heartbeat, event, severity, text):
+
+    return Alert(
+        resource=heartbeat.origin,
+        event=event,
+        correlate=['HeartbeatFail', 'HeartbeatOK'],
+        environment=app.config['HEARTBEAT_ALERT_ENVIRONMENT'],
+        severity=severity,
+        service=app.config['HEARTBEAT_ALERT_SERVICE'],
+        group='System',
+        value='%ss' % heartbeat.timeout,
+        text=text,
+        tags=list(heartbeat.tags),
+        origin='alerta/housekeeping',
+        event_type='heartbeatAlert',
+        timeout=0,
+        customer=heartbeat.customer
+    )
+
+
+def send_heartbeat_alert(heartbeat, status):
+
+    if status == 'expired':
+        alert = heartbeat_alert(heartbeat, 'HeartbeatFail', app.config['HEARTBEAT_ALERT_SEVERITY'],
+                                'Heartbeat not received in %s seconds' % heartbeat.timeout)
+    else:
+        alert = heartbeat_alert(heartbeat, 'HeartbeatOK', 'normal', 'Heartbeat received')
+
+    started = heartbeat_alert_timer.start_timer()
+    try:
+        process_alert(alert)
+        db.set_heartbeat_status([heartbeat.id], status)
+    except (RejectException, RateLimit, BlackoutPeriod) as e:
+        LOG.info('Housekeeping: Heartbeat alert for %s suppressed: %s', heartbeat.origin, e)
+        db.set_heartbeat_status([heartbeat.id], status)  # don't retry an alert that will never be accepted
+    except Exception as e:
+        LOG.error('Housekeeping: Failed to send heartbeat alert for %s: %s', heartbeat.origin, e)
+        return False
+    finally:
+        heartbeat_alert_timer.stop_timer(started)
+    return True
+
+
+def check_heartbeats():
+    """
+    Raise a HeartbeatFail alert for each heartbeat that is overdue and clear it with a HeartbeatOK
+    alert once the heartbeat is received again. Only heartbeats that changed state are queried.
+    """
+    batch_size = app.config['HEARTBEAT_CHECK_BATCH_SIZE']
+    concurrency = app.config['HEARTBEAT_CHECK_CONCURRENCY']
+
+    backfilled = db.backfill_heartbeat_expiry()
+    if backfilled:
+        LOG.info('Housekeeping: Set expire time of %s heartbeats saved without one', backfilled)
+
+    stale = run_in_batches(db.get_stale_heartbeats, lambda hb: send_heartbeat_alert(hb, 'expired'),
+                           batch_size=batch_size, concurrency=concurrency)
+    recovered = run_in_batches(db.get_recovered_heartbeats, lambda hb: send_heartbeat_alert(hb, 'ok'),
+                               batch_size=batch_size, concurrency=concurrency)
+    if stale or recovered:
+        LOG.info('Housekeeping: %s heartbeats stale, %s recovered', stale, recovered)
+    return stale, recovered
+
+
+def retention_query(policy, now):
+
+    if not policy.get('age'):
+        raise ValueError('Retention policy must have an age: %s' % policy)
+
+    query = {'lastReceiveTime': {'$lt': now - datetime.timedelta(seconds=policy['age'])}}
+    for field in ['severity', 'status', 'environment']:
+        if policy.get(field):
+            values = policy[field] if isinstance(policy[field], list) else [policy[field]]
+            query[field] = {'$in': values}
+    return query
+
+
+def apply_retention_policies():
+    """
+    Delete alerts matched by RETENTION_POLICIES a batch at a time, pausing between batches so
+    that deletes don't compete with normal traffic. Anything left over when RETENTION_MAX_BATCHES
+    is reached is deleted on the next run.
+    """
+    batch_size = app.config['RETENTION_BATCH_SIZE']
+    batches = app.config['RETENTION_MAX_BATCHES']
+
+    now = datetime.datetime.utcnow()
+    deleted = 0
+    for policy in app.config['RETENTION_POLICIES']:
+        query = retention_query(policy, now)
+        while batches > 0:
+            ids = db.get_alert_ids(query, limit=batch_size)
+            if not ids:
+                break
+
+            started = retention_timer.start_timer()
+            count = db.delete_alerts(ids, query)  # unless changed since they were found
+            retention_timer.stop_timer(started, count=count)
+            deleted += count
+            batches -= 1
+
+            if len(ids) < batch_size or scheduler.stopped.wait(app.config['RETENTION_BATCH_DELAY']):
+                break
+            scheduler.check_lease()
+
+    if deleted:
+        LOG.info('Housekeeping: Deleted %s alerts by retention policy', deleted)
+    return deleted
+
+
+def archive_alerts():
+    """
+    Move closed and expired alerts to the archive a batch at a time, pausing between batches in
+    the same way as retention policies.
+    """
+    if not app.config['ARCHIVE_AFTER']:
+        return 0
+
+    batch_size = app.config['ARCHIVE_BATCH_SIZE']
+    query = {
+        'status': {'$in': app.config['ARCHIVE_STATUS']},
+        'lastReceiveTime': {'$lt': datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['ARCHIVE_AFTER'])}
+    }
+
+    archived = 0
+    for _ in range(app.config['RETENTION_MAX_BATCHES']):
+        started = archive_timer.start_timer()
+        count = db.archive_alerts(query, limit=batch_size)
+        archive_timer.stop_timer(started, count=count)
+        archived += count
+
+        if count < batch_size or scheduler.stopped.wait(app.config['RETENTION_BATCH_DELAY']):
+            break
+        scheduler.check_lease()
+
+    if archived:
+        LOG.info('Housekeeping: Archived %s alerts', archived)
+    return archived
+
+
+scheduler = Scheduler()
+scheduler.add_job(expire_alerts, app.config['ALERT_EXPIRE_INTERVAL'])
+scheduler.add_job(check_heartbeats, app.config['HEARTBEAT_CHECK_INTERVAL'])
+scheduler.add_job(apply_retention_policies, app.config['RETENTION_INTERVAL'])
+scheduler.add_job(archive_alerts, app.config['ARCHIVE_INTERVAL'])
+scheduler.add_job(flush_key_usage, app.config['API_KEY_USAGE_FLUSH_INTERVAL'], leader_only=False)
+scheduler.add_job(flush_endpoint_stats, app.config['DATABASE_METRICS_FLUSH_INTERVAL'], leader_only=False)
+scheduler.add_job(Histogram.flush_all, app.config['HISTOGRAM_FLUSH_INTERVAL'], leader_only=False)
+
+
+atexit.register(scheduler.release_lease)
+atexit.register(flush_key_usage)
+atexit.register(flush_endpoint_stats)
+atexit.register(Histogram.flush_all)
+
+
+@app.before_request
+def start_housekeeping():
+
+    if app.config['HOUSEKEEPING_ENABLED'] and not app.config.get('TESTING', False):
+        scheduler.start()
@@ -0,0 +1,117 @@
+
+import os
+import re
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib3.util.retry import Retry
+except ImportError:
+    from requests.packages.urllib3.util.retry import Retry
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+from alerta.app import app
+from alerta.app.metrics import Timer
+
+LOG = app.logger
+
+
+class HTTPClient(object):
+    """
+    Shared outbound HTTP client for auth providers and plugins. Connections are pooled per
+    process, every request has a timeout, idempotent requests are retried on connection
+    errors and gateway errors and the latency of each remote host is recorded as a metric.
+
+        from alerta.app.httpclient import http
+        r = http.get('https://api.github.com/user', params=token)
+    """
+    def __init__(self):
+
+        self.pid = None
+        self.lock = threading.Lock()
+        self._session = None
+        self._pool = None
+        self.timers = dict()
+
+    def _init(self):
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()  # connections and threads can't be shared with a forked child
+
+            retries = Retry(
+                total=app.config['HTTP_CLIENT_RETRIES'],
+                backoff_factor=0.3,
+                status_forcelist=[502, 503, 504],
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=app.config['HTTP_CLIENT_POOL_SIZE'],
+                pool_maxsize=app.config['HTTP_CLIENT_POOL_SIZE'],
+                max_retries=retries
+            )
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+            self._session = session
+            self._pool = ThreadPool(app.config['HTTP_CLIENT_CONCURRENCY'])
+
+    @property
+    def session(self):
+
+        if self.pid != os.getpid():
+            self._init()
+        return self._session
+
+    def _timer(self, url):
+
+        host = urlparse(url).hostname or 'unknown'
+        if host not in self.timers:
+            name = re.sub(r'[^a-zA-Z0-9_]', '_', host)
+            self.timers[host] = Timer('http', name, 'HTTP requests to %s' % host,
+                                      'Total time and number of outbound HTTP requests to %s' % host)
+        return self.timers[host]
+
+    def request(self, method, url, **kwargs):
+
+        kwargs.setdefault('timeout', (app.config['HTTP_CLIENT_CONNECT_TIMEOUT'], app.config['HTTP_CLIENT_READ_TIMEOUT']))
+
+        timer = self._timer(url)
+        started = timer.start_timer()
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            LOG.warning('HTTP %s %s failed: %s', method, url, e)
+            raise
+        finally:
+            timer.stop_timer(started)
+
+    def get(self, url, **kwargs):
+
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+
+        return self.request('POST', url, **kwargs)
+
+    def gather(self, *funcs):
+        """
+        Run independent calls concurrently and return their results in the same order.
+        The first exception raised by any call is re-raised.
+        """
+        if self.pid != os.getpid():
+            self._init()
+        return self._pool.map(lambda func: func(), funcs)
+
+
+http = HTTPClient()
@@ -1,4 +1,6 @@
 
+import math
+import os
 import time
 import datetime
 import logging
@@ -7,9 +9,11 @@ from flask import request, Response, url_for, jsonify, render_template
 from flask_cors import cross_origin
 
 from alerta.app import app, db
+from alerta.app import profiler
 from alerta.app.auth import permission
+from alerta.app.database import slowlog
 from alerta.app.switch import Switch, SwitchState
-from alerta.app.metrics import Gauge, Counter, Timer
+from alerta.app.metrics import Gauge, Counter, Timer, Histogram
 from alerta import build
 from alerta.version import __version__
 
@@ -34,7 +38,9 @@ def management():
         url_for('good_to_go'),
         url_for('health_check'),
         url_for('status'),
-        url_for('prometheus_metrics')
+        url_for('prometheus_metrics'),
+        url_for('slow_queries'),
+        url_for('profile')
     ]
     return render_template('management/index.html', endpoints=endpoints)
 
@@ -114,11 +120,12 @@ def health_check():
 
     try:
 
-        heartbeats = db.get_heartbeats()
+        now = datetime.datetime.utcnow()
+        heartbeats = db.get_heartbeats({'expireTime': {'$lt': now}})  # only those already overdue
         for heartbeat in heartbeats:
-            delta = datetime.datetime.utcnow() - heartbeat.receive_time
+            delta = now - heartbeat.receive_time
             threshold = float(heartbeat.timeout) * 4
-            if delta.seconds > threshold:
+            if delta.total_seconds() > threshold:
                 return 'HEARTBEAT_STALE: %s' % heartbeat.origin , 503
 
     except Exception as e:
@@ -137,6 +144,7 @@ def status():
     metrics = Gauge.get_gauges(format='json')
     metrics.extend(Counter.get_counters(format='json'))
     metrics.extend(Timer.get_timers(format='json'))
+    metrics.extend(Histogram.get_histograms(format='json'))
 
     auto_refresh_allow = {
         "group": "switch",
@@ -163,5 +171,67 @@ def prometheus_metrics():
     output = Gauge.get_gauges(format='prometheus')
     output += Counter.get_counters(format='prometheus')
     output += Timer.get_timers(format='prometheus')
+    output += Histogram.get_histograms(format='prometheus')
 
     return Response(output, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/management/queries', methods=['OPTIONS', 'GET', 'DELETE'])
+@cross_origin()
+@permission('admin:management')
+def slow_queries():
+
+    if request.method == 'DELETE':
+        slowlog.slow_queries.reset()
+        return jsonify(status="ok")
+
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError as e:
+        return jsonify(status="error", message=str(e)), 400
+    explain = request.args.get('explain', 'true').lower() not in ['false', '0', 'no']
+
+    queries = slowlog.report(db, limit=limit, explain=explain)
+
+    return jsonify(status="ok", threshold=app.config['SLOW_QUERY_THRESHOLD'], total=len(queries), queries=queries)
+
+
+@app.route('/management/profile', methods=['OPTIONS', 'GET'])
+@cross_origin()
+@permission('admin:management')
+def profile():
+    """
+    Sample the threads handling other requests. The request that asks for the profile waits for it,
+    so the server must run requests in threads, eg. gunicorn --threads or "alertad" itself.
+    """
+    if not request.environ.get('wsgi.multithread'):
+        return jsonify(status="error", message="profiling needs a server that handles requests in threads"), 409
+
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', app.config['PROFILE_SAMPLE_INTERVAL']))
+    except ValueError as e:
+        return jsonify(status="error", message=str(e)), 400
+    if any(math.isnan(v) or math.isinf(v) for v in [seconds, interval]):
+        return jsonify(status="error", message="seconds and interval must be finite numbers"), 400
+    if not 0 < seconds <= app.config['PROFILE_MAX_SECONDS']:
+        return jsonify(status="error", message="seconds must be more than 0 and at most %s" % app.config['PROFILE_MAX_SECONDS']), 400
+    if interval < 1:
+        return jsonify(status="error", message="sample interval must be at least 1 ms"), 400
+
+    format = request.args.get('format', 'collapsed')
+    if format not in ['collapsed', 'pstats']:
+        return jsonify(status="error", message="format must be 'collapsed' or 'pstats'"), 400
+    all_threads = request.args.get('threads', 'requests') == 'all'
+
+    LOG.info('Profiling for %ss every %sms', seconds, interval)
+    try:
+        result = profiler.profile(seconds, interval / 1000.0, all_threads)
+    except profiler.ProfilerBusy as e:
+        return jsonify(status="error", message=str(e)), 409
+
+    headers = {'X-Profile-Samples': str(result.count)}
+    if format == 'pstats':
+        headers['Content-Disposition'] = 'attachment; filename=alerta-%d.pstats' % os.getpid()
+        return Response(result.pstats(), content_type='application/octet-stream', headers=headers)
+    return Response(result.collapsed(), content_type='text/plain', headers=headers)
@@ -1,4 +1,6 @@
 
+import bisect
+import threading
 import time
 
 try:
@@ -6,7 +8,7 @@ try:
 except ImportError:
     import json
 
-from alerta.app import db
+from alerta.app import app, db
 
 
 class MetricEncoder(json.JSONEncoder):
@@ -137,3 +139,111 @@ class Timer(object):
             return "".join(timers)
         else:
             return db.get_timers()
+
+
+class Histogram(object):
+    """
+    Distribution of durations in milliseconds, counted in buckets with upper bounds of
+    HISTOGRAM_BUCKETS. Observations are kept in process and added to the database by flush(),
+    so timing a request doesn't add database writes to it.
+    """
+    histograms = dict()
+    lock = threading.Lock()
+    flushed = time.time()
+
+    def __init__(self, group, name, title=None, description=None, buckets=None, counts=None, count=0, total_time=0):
+
+        self.group = group
+        self.name = name
+        self.title = title
+        self.description = description
+
+        self.buckets = buckets or app.config['HISTOGRAM_BUCKETS']
+        self.counts = counts or [0] * (len(self.buckets) + 1)
+        self.count = count
+        self.total_time = total_time
+
+        self._reset()
+
+    def _reset(self):
+
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._total_time = 0.0
+
+    @classmethod
+    def get(cls, group, name, title=None, description=None):
+        """
+        The histogram with this group and name, so observations from every request are added together.
+        """
+        with cls.lock:
+            histogram = cls.histograms.get((group, name))
+            if histogram is None:
+                histogram = cls.histograms[(group, name)] = cls(group, name, title, description)
+            return histogram
+
+    def observe(self, duration):
+
+        with self.lock:
+            self._counts[bisect.bisect_left(self.buckets, duration)] += 1
+            self._count += 1
+            self._total_time += duration
+
+    def flush(self):
+
+        with self.lock:
+            counts, count, total_time = self._counts, self._count, self._total_time
+            self._reset()
+        if not count:
+            return False
+
+        r = db.update_histogram(self.group, self.name, self.title, self.description, self.buckets,
+                                counts=counts, count=count, duration=total_time)
+        self.count, self.total_time = r['count'], r['totalTime']
+        return True
+
+    @classmethod
+    def flush_all(cls):
+        """
+        Add observations since the last flush to the database and return the number of histograms updated.
+        """
+        with cls.lock:
+            histograms = list(cls.histograms.values())
+            Histogram.flushed = time.time()
+        return sum(1 for h in histograms if h.flush())
+
+    @classmethod
+    def is_flush_due(cls, interval):
+
+        return time.time() - cls.flushed >= interval
+
+    def to_json(self):
+        return json.dumps(self, cls=MetricEncoder)
+
+    @classmethod
+    def get_histograms(cls, format=None):
+        if format == 'json':
+            return db.get_metrics(type='histogram')
+        elif format == 'prometheus':
+            histograms = list()
+            for h in Histogram.get_histograms():
+                buckets = ''
+                cumulative = 0
+                for le, count in zip([str(b) for b in h.buckets] + ['+Inf'], h.counts):
+                    cumulative += count
+                    buckets += 'alerta_{group}_{name}_bucket{{le="{le}"}} {count}\n'.format(
+                        group=h.group, name=h.name, le=le, count=cumulative
+                    )
+                histograms.append(
+                    '# HELP alerta_{group}_{name} {description}\n'
+                    '# TYPE alerta_{group}_{name} histogram\n'
+                    '{buckets}'
+                    'alerta_{group}_{name}_count {count}\n'
+                    'alerta_{group}_{name}_sum {total_time}\n'.format(
+                            group=h.group, name=h.name, description=h.description, buckets=buckets,
+                            count=h.count, total_time=h.total_time
+                    )
+                )
+            return "".join(histograms)
+        else:
+            return db.get_histograms()
@@ -0,0 +1,134 @@
+"""
+Sampling profiler for the running API server. A background thread takes the Python stack of
+every thread handling a request at a fixed interval, so there's no overhead when not profiling
+and little while profiling, unlike a tracing profiler that hooks every call.
+
+Samples are returned as collapsed stacks, one line per distinct stack with the number of
+samples, for flamegraph.pl or speedscope, or as a pstats file for pstats or snakeviz.
+"""
+
+import marshal
+import sys
+import threading
+import time
+
+from collections import Counter
+
+from alerta.app import app
+
+request_threads = set()  # threads handling a request, by thread id
+_lock = threading.Lock()  # only one profile at a time
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+@app.before_request
+def start_request_thread():
+
+    request_threads.add(threading.current_thread().ident)
+
+
+@app.teardown_request
+def end_request_thread(exc):
+
+    request_threads.discard(threading.current_thread().ident)
+
+
+def code_key(code):
+
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+class SamplingProfiler(object):
+
+    def __init__(self, interval=0.005, all_threads=False, exclude=None):
+
+        self.interval = interval
+        self.all_threads = all_threads
+        self.exclude = set(exclude or [])
+        self.samples = Counter()
+        self.count = 0
+
+    def sample(self):
+
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in self.exclude or not (self.all_threads or thread_id in request_threads):
+                continue
+            stack = list()
+            while frame is not None:
+                stack.append(code_key(frame.f_code))
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+        self.count += 1
+
+    def run(self, seconds):
+        """
+        Take samples for the given number of seconds in a background thread and wait for it to finish.
+        """
+        if not _lock.acquire(False):
+            raise ProfilerBusy('A profile is already running')
+        try:
+            end = time.time() + seconds
+            stopped = threading.Event()
+
+            def sampler():
+                while time.time() < end and not stopped.wait(self.interval):
+                    self.sample()
+
+            thread = threading.Thread(target=sampler, name='profiler')
+            thread.daemon = True
+            self.exclude.add(threading.current_thread().ident)
+            thread.start()
+            self.exclude.add(thread.ident)
+            try:
+                thread.join(seconds + 1)
+            finally:
+                stopped.set()
+                thread.join()
+        finally:
+            _lock.release()
+        return self
+
+    def collapsed(self):
+        """
+        One line for each stack, root first, with the number of samples eg. "main;handle;query 12".
+        """
+        def label(key):
+            filename, line, name = key
+            return '%s (%s:%d)' % (name, filename, line)
+
+        lines = ['%s %d' % (';'.join(label(key) for key in stack), count)
+                 for stack, count in self.samples.most_common()]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def pstats(self):
+        """
+        Samples as a marshalled pstats dict. Time in a function is the number of samples it was
+        running, or on the stack for cumulative time, times the interval, and calls are samples.
+        """
+        stats = dict()
+        for stack, count in self.samples.items():
+            seconds = count * self.interval
+            seen = set()
+            for i, key in enumerate(stack):
+                cc, nc, tt, ct, callers = stats.get(key, (0, 0, 0.0, 0.0, {}))
+                leaf = i == len(stack) - 1
+                if key not in seen:  # count recursive functions once
+                    cc, nc, ct = cc + count, nc + count, ct + seconds
+                    seen.add(key)
+                if leaf:
+                    tt += seconds
+                if i > 0:
+                    c = callers.get(stack[i - 1], (0, 0, 0.0, 0.0))
+                    callers[stack[i - 1]] = (c[0] + count, c[1] + count, c[2] + (seconds if leaf else 0.0), c[3] + seconds)
+                stats[key] = (cc, nc, tt, ct, callers)
+        return marshal.dumps(stats)
+
+
+def profile(seconds, interval=0.005, all_threads=False):
+    """
+    Sample the server for a number of seconds, the thread calling this is not sampled.
+    """
+    return SamplingProfiler(interval, all_threads).run(seconds)
@@ -0,0 +1,228 @@
+"""
+Generate a large synthetic alert dataset for query testing, written directly to the database
+with bulk inserts. Distributions are drawn from a seeded random number generator so the same
+options always produce the same alerts, with times relative to when they are generated.
+
+Resources are generated one at a time, each belonging to a single environment and customer
+and raising a few distinct correlated events, so live alerts never clash on the de-duplication
+key. Services, tags, origins and events follow a Zipf distribution, a few very common values and
+a long tail, and history length and duplicate counts are exponentially distributed.
+"""
+
+import bisect
+import datetime
+import sys
+import time
+
+from random import Random
+from uuid import UUID
+
+from alerta.app import app, severity_code, status_code
+
+EVENT_GROUPS = [
+    'cpu', 'memory', 'swap', 'load', 'disk', 'inode', 'ping', 'http', 'https', 'dns', 'ntp', 'smtp',
+    'latency', 'errors', 'queue', 'replication', 'backup', 'certificate', 'process', 'heartbeat'
+]
+ENVIRONMENTS = [('Production', 60), ('Development', 25), ('Staging', 15)]
+SEVERITIES = [
+    (severity_code.CRITICAL, 5), (severity_code.MAJOR, 15), (severity_code.MINOR, 20),
+    (severity_code.WARNING, 30), (severity_code.INFORM, 10), (severity_code.NORMAL, 20)
+]
+STATUSES = [(status_code.OPEN, 70), (status_code.ACK, 20), (status_code.CLOSED, 5), (status_code.EXPIRED, 5)]
+ARCHIVED_STATUSES = [(status_code.CLOSED, 80), (status_code.EXPIRED, 20)]
+REGIONS = [('EU', 40), ('US', 40), ('APAC', 20)]
+
+
+class Weighted(object):
+    """
+    Draw values with the given relative weights.
+    """
+    def __init__(self, rng, values, weights):
+
+        self.rng = rng
+        self.values = values
+        self.totals = list()
+        total = 0
+        for weight in weights:
+            total += weight
+            self.totals.append(total)
+
+    @classmethod
+    def choices(cls, rng, pairs):
+
+        return cls(rng, [value for value, _ in pairs], [weight for _, weight in pairs])
+
+    @classmethod
+    def zipf(cls, rng, values, s=1.1):
+
+        return cls(rng, values, [1.0 / (rank ** s) for rank in range(1, len(values) + 1)])
+
+    def draw(self):
+
+        return self.values[bisect.bisect(self.totals, self.rng.random() * self.totals[-1])]
+
+    def sample(self, count):
+        """
+        Up to count distinct values.
+        """
+        values = list()
+        for _ in range(count * 3):
+            value = self.draw()
+            if value not in values:
+                values.append(value)
+                if len(values) == count:
+                    break
+        return values
+
+
+class Generator(object):
+
+    def __init__(self, seed=42, customers=0, services=50, tags=200, history=5, duplicates=5, days=30, now=None):
+
+        self.rng = rng = Random(seed)
+        self.now = now or datetime.datetime.utcnow().replace(microsecond=0)
+        self.days = days
+        self.history = history
+        self.duplicates = duplicates
+        self.history_limit = app.config['HISTORY_LIMIT']
+
+        self.environments = Weighted.choices(rng, ENVIRONMENTS)
+        self.severities = Weighted.choices(rng, SEVERITIES)
+        self.statuses = Weighted.choices(rng, STATUSES)
+        self.archived = Weighted.choices(rng, ARCHIVED_STATUSES)
+        self.regions = Weighted.choices(rng, REGIONS)
+        self.customers = Weighted.zipf(rng, ['customer%03d' % i for i in range(customers)]) if customers else None
+        self.services = Weighted.zipf(rng, ['Service%03d' % i for i in range(services)])
+        self.tags = Weighted.zipf(rng, ['tag%03d' % i for i in range(tags)])
+        self.events = Weighted.zipf(rng, EVENT_GROUPS)
+        self.origins = Weighted.zipf(rng, ['%s/mon%02d' % (o, i) for i in range(5) for o in ['nagios', 'zabbix', 'prometheus']])
+
+        self.resources = 0
+
+    def uuid(self):
+
+        return str(UUID(int=self.rng.getrandbits(128), version=4))
+
+    def exponential(self, mean, limit=None):
+
+        value = int(self.rng.expovariate(1.0 / mean)) if mean else 0
+        return min(value, limit) if limit is not None else value
+
+    def alerts(self, count, archive=False):
+        """
+        Yield count alert documents, as stored in the alerts (or alerts_archive) collection.
+        """
+        generated = 0
+        while generated < count:
+            resource = 'host%07d' % self.resources
+            self.resources += 1
+            environment = self.environments.draw()
+            customer = self.customers.draw() if self.customers else None
+            service = self.services.sample(1 + self.exponential(0.5, limit=3))
+            region = self.regions.draw()
+
+            for group in self.events.sample(1 + self.exponential(2, limit=5)):
+                yield self.alert(resource, group, environment, customer, service, region, archive)
+                generated += 1
+                if generated == count:
+                    break
+
+    def alert(self, resource, group, environment, customer, service, region, archive=False):
+
+        rng = self.rng
+        id = self.uuid()
+        correlate = ['%s_high' % group, '%s_warning' % group, '%s_ok' % group]
+
+        severity = self.severities.draw()
+        if severity == severity_code.NORMAL:
+            event = correlate[2]
+        elif severity in [severity_code.CRITICAL, severity_code.MAJOR]:
+            event = correlate[0]
+        else:
+            event = correlate[1]
+        previous_severity = self.severities.draw()
+
+        if archive:
+            status = self.archived.draw()
+        elif severity == severity_code.NORMAL:
+            status = status_code.CLOSED
+        else:
+            status = self.statuses.draw()
+
+        last_receive_time = self.now - datetime.timedelta(seconds=rng.random() * self.days * 86400)
+        create_time = last_receive_time - datetime.timedelta(seconds=min(rng.expovariate(1.0 / 21600), 7 * 86400))
+        duplicate_count = self.exponential(self.duplicates)
+        timeout = 86400
+
+        span = (last_receive_time - create_time).total_seconds()
+        history = list()
+        for _ in range(self.exponential(self.history, limit=self.history_limit - 1)):
+            update_time = create_time + datetime.timedelta(seconds=span * rng.random())
+            if rng.random() < 0.7:
+                history.append({
+                    'id': self.uuid(), 'event': rng.choice(correlate), 'severity': self.severities.draw(),
+                    'value': '%d%%' % rng.randint(0, 100), 'type': 'severity', 'text': '%s changed' % group,
+                    'updateTime': update_time
+                })
+            else:
+                history.append({
+                    'id': self.uuid(), 'event': event, 'status': self.statuses.draw(), 'type': 'status',
+                    'text': 'status changed by operator', 'updateTime': update_time
+                })
+        history.sort(key=lambda h: h['updateTime'])
+        history.append({
+            'id': id, 'event': event, 'severity': severity, 'value': '%d%%' % rng.randint(0, 100),
+            'type': 'severity', 'text': '%s is %s' % (group, severity), 'updateTime': last_receive_time
+        })
+
+        return {
+            '_id': id,
+            'resource': resource,
+            'event': event,
+            'environment': environment,
+            'severity': severity,
+            'correlate': correlate,
+            'status': status,
+            'service': service,
+            'group': group.capitalize(),
+            'value': history[-1]['value'],
+            'text': '%s on %s is %s' % (event, resource, severity),
+            'tags': self.tags.sample(self.exponential(1.5, limit=6)),
+            'attributes': {'region': region, 'ip': '10.%d.%d.%d' % (rng.randint(0, 255), rng.randint(0, 255), rng.randint(1, 254))},
+            'origin': self.origins.draw(),
+            'type': 'syntheticAlert',
+            'createTime': create_time,
+            'timeout': timeout,
+            'rawData': None,
+            'customer': customer,
+            'duplicateCount': duplicate_count,
+            'repeat': duplicate_count > 0 and rng.random() < 0.8,
+            'previousSeverity': previous_severity,
+            'trendIndication': severity_code.trend(previous_severity, severity),
+            'receiveTime': last_receive_time,
+            'lastReceiveId': id if not duplicate_count else self.uuid(),
+            'lastReceiveTime': last_receive_time,
+            'expireTime': last_receive_time + datetime.timedelta(seconds=timeout),
+            'history': history
+        }
+
+
+def seed(db, count, archive=0, batch=5000, progress=True, **kwargs):
+    """
+    Bulk insert count live alerts and archive archived alerts and return the number inserted.
+    """
+    generator = Generator(**kwargs)
+    inserted = 0
+    started = time.time()
+    for total, is_archive in [(count, False), (archive, True)]:
+        alerts = list()
+        for alert in generator.alerts(total, archive=is_archive):
+            alerts.append(alert)
+            if len(alerts) == batch:
+                inserted += db.bulk_insert_alerts(alerts, archive=is_archive)
+                alerts = list()
+                if progress:
+                    elapsed = time.time() - started
+                    sys.stderr.write('%d alerts inserted in %.1fs (%.0f/s)\n' % (inserted, elapsed, inserted / elapsed))
+        inserted += db.bulk_insert_alerts(alerts, archive=is_archive)
+    return inserted
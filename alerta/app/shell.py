@@ -1,13 +1,16 @@
 
+import sys
+import time
 import argparse
 
 from alerta.app import app
 from alerta.app import db
+from alerta import loadgen
 from alerta.version import __version__
 
 LOG = app.logger
 
-def main():
+def main(argv=None):
 
     parser = argparse.ArgumentParser(
         prog='alertad',
@@ -34,7 +37,170 @@ def main():
         default=False,
         help='Debug output'
     )
-    args = parser.parse_args()
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    subparsers.add_parser(
+        'run',
+        help='Run the development server (default)'
+    )
+    parser_indexes = subparsers.add_parser(
+        'indexes',
+        help='Sync or verify database indexes',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser_indexes.add_argument(
+        'action',
+        choices=['sync', 'verify'],
+        help='Create missing indexes or only report differences'
+    )
+    parser_indexes.add_argument(
+        '--prune',
+        action='store_true',
+        default=False,
+        help='Drop indexes that are not declared and re-create conflicting indexes'
+    )
+    subparsers.add_parser(
+        'housekeeping',
+        help='Run all housekeeping jobs once and exit (eg. from cron when HOUSEKEEPING_ENABLED is False)'
+    )
+    parser_loadgen = subparsers.add_parser(
+        'loadgen',
+        help='Replay captured alert, webhook and query traffic from NDJSON files against a server',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    loadgen.add_arguments(parser_loadgen)
+    parser_seed = subparsers.add_parser(
+        'seed',
+        help='Bulk insert a large synthetic alert dataset for query testing',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser_seed.add_argument(
+        '-n',
+        '--count',
+        type=int,
+        default=100000,
+        help='Number of live alerts'
+    )
+    parser_seed.add_argument(
+        '--archive',
+        type=int,
+        default=0,
+        help='Number of closed and expired alerts in the archive'
+    )
+    parser_seed.add_argument(
+        '--random-seed',
+        type=int,
+        default=42,
+        help='The same seed and options always generate the same alerts'
+    )
+    parser_seed.add_argument(
+        '--customers',
+        type=int,
+        default=0,
+        help='Number of customers, 0 for none'
+    )
+    parser_seed.add_argument(
+        '--services',
+        type=int,
+        default=50,
+        help='Number of distinct services'
+    )
+    parser_seed.add_argument(
+        '--tags',
+        type=int,
+        default=200,
+        help='Number of distinct tags'
+    )
+    parser_seed.add_argument(
+        '--history',
+        type=float,
+        default=5,
+        help='Mean number of history entries per alert, up to HISTORY_LIMIT'
+    )
+    parser_seed.add_argument(
+        '--duplicates',
+        type=float,
+        default=5,
+        help='Mean duplicate count per alert'
+    )
+    parser_seed.add_argument(
+        '--days',
+        type=float,
+        default=30,
+        help='Alerts were last received over this many days'
+    )
+    parser_seed.add_argument(
+        '--batch',
+        type=int,
+        default=5000,
+        help='Alerts per bulk insert'
+    )
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not any(arg in subparsers.choices for arg in argv):
+        argv.append('run')  # subcommands are mandatory with Python 2.7 argparse
+    args = parser.parse_args(argv)
+
+    if args.command == 'loadgen':
+        sys.exit(loadgen.main(args))
+    if args.command == 'indexes':
+        sys.exit(indexes(args))
+    if args.command == 'housekeeping':
+        sys.exit(housekeeping(args))
+    if args.command == 'seed':
+        sys.exit(seed(args))
 
     LOG.info('Starting alerta version %s ...', __version__)
     app.run(host=args.host, port=args.port, debug=args.debug, threaded=True, use_reloader=False)
+
+
+def indexes(args):
+
+    if args.action == 'sync':
+        report = db.sync_indexes(prune=args.prune)
+    else:
+        report = db.verify_indexes()
+
+    failed = False
+    for index in report:
+        print('{state:10} {collection:12} {name}{error}'.format(
+            state=index['state'],
+            collection=index['collection'],
+            name=index['name'],
+            error=' (%s)' % index['error'] if index.get('error') else ''
+        ))
+        if index['state'] in ['missing', 'conflict', 'failed']:
+            failed = True
+
+    return 1 if failed else 0
+
+
+def housekeeping(args):
+
+    from alerta.app.housekeeping import scheduler
+    if not scheduler.is_leader(renew=True):
+        print('Housekeeping lease is held by another process, only running jobs for this process')
+    scheduler.run_pending(force=True)
+    scheduler.release_lease()
+    return 0
+
+
+def seed(args):
+
+    from alerta.app.seed import seed
+    started = time.time()
+    inserted = seed(
+        db,
+        count=args.count,
+        archive=args.archive,
+        batch=args.batch,
+        seed=args.random_seed,
+        customers=args.customers,
+        services=args.services,
+        tags=args.tags,
+        history=args.history,
+        duplicates=args.duplicates,
+        days=args.days
+    )
+    elapsed = time.time() - started
+    print('Inserted %d alerts in %.1fs (%.0f alerts/s)' % (inserted, elapsed, inserted / elapsed if elapsed else 0))
+    return 0 if inserted == args.count + args.archive else 1
@@ -0,0 +1,77 @@
+"""
+Time the stages of each API request, eg. parsing, authentication, plugins and database writes
+for a received alert. Stage times are returned in a Server-Timing header, so they show in
+browser developer tools, and added to a histogram for each endpoint and stage.
+"""
+
+import re
+import timeit
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context
+
+from alerta.app import app
+from alerta.app.metrics import Histogram
+
+HEADER = 'Server-Timing'
+
+
+@contextmanager
+def stage(name):
+    """
+    Add the time spent in the block to the named stage of the current request.
+    """
+    start = timeit.default_timer()
+    try:
+        yield
+    finally:
+        record(name, timeit.default_timer() - start)
+
+
+def record(name, seconds):
+
+    if has_request_context() and 'stage_times' in g:
+        g.stage_times[name] = g.stage_times.get(name, 0.0) + seconds
+
+
+def server_timing(stages, total, db_time=None):
+    """
+    Server-Timing header value for stage times in seconds.
+    """
+    metrics = ['%s;dur=%.3f' % (name, seconds * 1000) for name, seconds in stages.items()]
+    if db_time is not None:
+        metrics.append('db;desc="database commands";dur=%.3f' % (db_time * 1000))
+    metrics.append('total;dur=%.3f' % (total * 1000))
+    return ', '.join(metrics)
+
+
+@app.before_request
+def start_timing():
+
+    g.stage_times = OrderedDict()
+    g.request_started = timeit.default_timer()
+
+
+@app.after_request
+def end_timing(response):
+
+    if 'stage_times' not in g:
+        return response
+    total = timeit.default_timer() - g.request_started
+
+    if app.debug or app.config['SERVER_TIMING_HEADER']:
+        response.headers[HEADER] = server_timing(g.stage_times, total, g.get('db_time'))
+
+    if g.stage_times:
+        endpoint = '%s %s' % (request.method, request.url_rule.rule if request.url_rule else 'unknown')
+        prefix = re.sub(r'[^a-zA-Z0-9]+', '_', endpoint).strip('_')
+        for name, seconds in list(g.stage_times.items()) + [('total', total)]:
+            Histogram.get('timing', '%s_%s' % (prefix, name), '%s %s' % (endpoint, name),
+                          'Time in %s stage of %s requests' % (name, endpoint)).observe(seconds * 1000)
+
+        if Histogram.is_flush_due(app.config['HISTOGRAM_FLUSH_INTERVAL']):  # housekeeping may not be running
+            Histogram.flush_all()
+
+    return response
@@ -11,13 +11,14 @@ except ImportError:
 
 from functools import wraps
 from flask import request, g, current_app
+from pymongo.errors import DuplicateKeyError
 
 try:
     from urllib.parse import urljoin, urlparse, urlunparse
 except ImportError:
     from urlparse import urljoin, urlparse, urlunparse
 
-from alerta.app import app, db
+from alerta.app import app, db, timing
 from alerta.app.exceptions import RejectException, RateLimit, BlackoutPeriod
 from alerta.app.metrics import Counter, Timer
 from alerta.plugins import Plugins
@@ -71,7 +72,8 @@ PARAMS_EXCLUDE = [
     '_',
     'callback',
     'token',
-    'api-key'
+    'api-key',
+    'archive'
 ]
 
 
@@ -169,6 +171,10 @@ def parse_fields(p):
         query['$or'] = [{'_id': {'$regex': re.compile('|'.join(['^' + i for i in ids]))}}, {'lastReceiveId': {'$regex': re.compile('|'.join(['^' + i for i in ids]))}}]
         del params['id']
 
+    profile = params.get('profile', None) or app.config['DEFAULT_ALERT_PROFILE']
+    if 'profile' in params:
+        del params['profile']
+
     if 'fields' in params:
         fields = dict([(field, True) for field in params.get('fields').split(',')])
         fields.update({'resource': True, 'event': True, 'environment': True, 'createTime': True, 'receiveTime': True, 'lastReceiveTime': True})
@@ -176,6 +182,12 @@ def parse_fields(p):
     elif 'fields!' in params:
         fields = dict([(field, False) for field in params.get('fields!').split(',')])
         del params['fields!']
+    elif profile:
+        if profile not in app.config['ALERT_PROFILES']:
+            raise ValueError("Unknown projection profile '%s'" % profile)
+        fields = dict([(field, True) for field in app.config['ALERT_PROFILES'][profile] or []])
+        if fields:
+            fields.update({'resource': True, 'event': True, 'environment': True, 'lastReceiveTime': True})
     else:
         fields = dict()
 
@@ -219,60 +231,71 @@ def parse_fields(p):
 
 def process_alert(alert):
 
-    for plugin in plugins.routing(alert):
-        started = pre_plugin_timer.start_timer()
-        try:
-            alert = plugin.pre_receive(alert)
-        except (RejectException, RateLimit):
-            reject_counter.inc()
-            pre_plugin_timer.stop_timer(started)
-            raise
-        except Exception as e:
-            error_counter.inc()
-            pre_plugin_timer.stop_timer(started)
-            raise RuntimeError("Error while running pre-receive plug-in '%s': %s" % (plugin.name, str(e)))
-        if not alert:
-            error_counter.inc()
+    with timing.stage('pre_receive'):
+        for plugin in plugins.routing(alert):
+            started = pre_plugin_timer.start_timer()
+            try:
+                alert = plugin.pre_receive(alert)
+            except (RejectException, RateLimit):
+                reject_counter.inc()
+                pre_plugin_timer.stop_timer(started)
+                raise
+            except Exception as e:
+                error_counter.inc()
+                pre_plugin_timer.stop_timer(started)
+                raise RuntimeError("Error while running pre-receive plug-in '%s': %s" % (plugin.name, str(e)))
+            if not alert:
+                error_counter.inc()
+                pre_plugin_timer.stop_timer(started)
+                raise SyntaxError("Plug-in '%s' pre-receive hook did not return modified alert" % plugin.name)
             pre_plugin_timer.stop_timer(started)
-            raise SyntaxError("Plug-in '%s' pre-receive hook did not return modified alert" % plugin.name)
-        pre_plugin_timer.stop_timer(started)
 
-    if db.is_blackout_period(alert):
-        raise BlackoutPeriod("Suppressed alert during blackout period")
+    with timing.stage('blackout'):
+        if db.is_blackout_period(alert):
+            raise BlackoutPeriod("Suppressed alert during blackout period")
 
     try:
-        if db.is_duplicate(alert):
-            started = duplicate_timer.start_timer()
-            alert = db.save_duplicate(alert)
-            duplicate_timer.stop_timer(started)
-        elif db.is_correlated(alert):
-            started = correlate_timer.start_timer()
-            alert = db.save_correlated(alert)
-            correlate_timer.stop_timer(started)
-        else:
-            started = create_timer.start_timer()
-            alert = db.create_alert(alert)
-            create_timer.stop_timer(started)
+        with timing.stage('dedup'):
+            is_duplicate = db.is_duplicate(alert)
+            is_correlated = not is_duplicate and db.is_correlated(alert)
+        with timing.stage('write'):
+            if is_duplicate:
+                started = duplicate_timer.start_timer()
+                alert = db.save_duplicate(alert)
+                duplicate_timer.stop_timer(started)
+            elif is_correlated:
+                started = correlate_timer.start_timer()
+                alert = db.save_correlated(alert)
+                correlate_timer.stop_timer(started)
+            else:
+                started = create_timer.start_timer()
+                try:
+                    alert = db.create_alert(alert)
+                except DuplicateKeyError:  # lost a race to create the same alert, so it is a duplicate
+                    alert = db.save_duplicate(alert)
+                create_timer.stop_timer(started)
     except Exception as e:
         error_counter.inc()
         raise RuntimeError(e)
 
     updated = None
-    for plugin in plugins.routing(alert):
-        started = post_plugin_timer.start_timer()
-        try:
-            updated = plugin.post_receive(alert)
-        except Exception as e:
-            error_counter.inc()
+    with timing.stage('post_receive'):
+        for plugin in plugins.routing(alert):
+            started = post_plugin_timer.start_timer()
+            try:
+                updated = plugin.post_receive(alert)
+            except Exception as e:
+                error_counter.inc()
+                post_plugin_timer.stop_timer(started)
+                raise RuntimeError("Error while running post-receive plug-in '%s': %s" % (plugin.name, str(e)))
+            if updated:
+                alert = updated
             post_plugin_timer.stop_timer(started)
-            raise RuntimeError("Error while running post-receive plug-in '%s': %s" % (plugin.name, str(e)))
-        if updated:
-            alert = updated
-        post_plugin_timer.stop_timer(started)
 
     if updated:
-        db.tag_alert(alert.id, alert.tags)
-        db.update_attributes(alert.id, alert.attributes)
+        with timing.stage('write'):
+            db.tag_alert(alert.id, alert.tags)
+            db.update_attributes(alert.id, alert.attributes)
 
     return alert
 
@@ -4,9 +4,9 @@ from flask import g, request, render_template, jsonify
 from flask_cors import cross_origin
 from uuid import uuid4
 
-from alerta.app import app, db
+from alerta.app import app, db, timing
 from alerta.app.switch import Switch
-from alerta.app.auth import permission, is_in_scope
+from alerta.app.auth import permission, is_in_scope, key_cache
 from alerta.app.utils import absolute_url, jsonp, parse_fields, process_alert, process_status, add_remote_ip
 from alerta.app.metrics import Timer
 from alerta.app.alert import Alert
@@ -20,6 +20,7 @@ plugins = Plugins()
 
 # Set-up metrics
 gets_timer = Timer('alerts', 'queries', 'Alert queries', 'Total time to process number of alert queries')
+search_timer = Timer('alerts', 'searches', 'Alert searches', 'Total time to process number of alert text searches')
 receive_timer = Timer('alerts', 'received', 'Received alerts', 'Total time to process number of received alerts')
 delete_timer = Timer('alerts', 'deleted', 'Deleted alerts', 'Total time to process number of deleted alerts')
 status_timer = Timer('alerts', 'status', 'Alert status change', 'Total time and number of alerts with status changed')
@@ -60,21 +61,25 @@ def index():
 def get_alerts():
 
     gets_started = gets_timer.start_timer()
-    try:
-        query, fields, sort, _, page, limit, query_time = parse_fields(request.args)
-    except Exception as e:
-        gets_timer.stop_timer(gets_started)
-        return jsonify(status="error", message=str(e)), 400
+    with timing.stage('parse'):
+        try:
+            query, fields, sort, _, page, limit, query_time = parse_fields(request.args)
+        except Exception as e:
+            gets_timer.stop_timer(gets_started)
+            return jsonify(status="error", message=str(e)), 400
 
-    try:
-        severity_count = db.get_counts(query=query, fields={"severity": 1}, group="severity")
-    except Exception as e:
-        return jsonify(status="error", message=str(e)), 500
+    archive = request.args.get('archive', 'false') == 'true'  # also search archived alerts
 
-    try:
-        status_count = db.get_counts(query=query, fields={"status": 1}, group="status")
-    except Exception as e:
-        return jsonify(status="error", message=str(e)), 500
+    with timing.stage('query'):
+        try:
+            severity_count = db.get_counts(query=query, fields={"severity": 1}, group="severity", archive=archive)
+        except Exception as e:
+            return jsonify(status="error", message=str(e)), 500
+
+        try:
+            status_count = db.get_counts(query=query, fields={"status": 1}, group="status", archive=archive)
+        except Exception as e:
+            return jsonify(status="error", message=str(e)), 500
 
     if limit < 1:
         return jsonify(status="error", message="page 'limit' of %s is not valid" % limit), 416
@@ -85,93 +90,153 @@ def get_alerts():
     if total and page > pages or page < 0:
         return jsonify(status="error", message="page out of range: 1-%s" % pages), 416
 
-    if 'history' not in fields:
+    if 'history' not in fields and not any(fields.values()):  # only slice history if not an inclusion projection
         fields['history'] = {'$slice': app.config['HISTORY_LIMIT']}
 
-    try:
-        alerts = db.get_alerts(query=query, fields=fields, sort=sort, page=page, limit=limit)
-    except Exception as e:
-        return jsonify(status="error", message=str(e)), 500
+    with timing.stage('query'):
+        try:
+            alerts = db.get_alerts(query=query, fields=fields, sort=sort, page=page, limit=limit, archive=archive)
+        except Exception as e:
+            return jsonify(status="error", message=str(e)), 500
 
-    alert_response = list()
-    if len(alerts) > 0:
+    with timing.stage('serialize'):
+        alert_response = list()
+        if len(alerts) > 0:
+
+            last_time = None
+
+            for alert in alerts:
+                body = alert.get_body(fields=fields)
+                body['href'] = absolute_url('/alert/' + alert.id)
+
+                if not last_time:
+                    last_time = body['lastReceiveTime']
+                elif body['lastReceiveTime'] > last_time:
+                    last_time = body['lastReceiveTime']
+
+                alert_response.append(body)
+
+            gets_timer.stop_timer(gets_started)
+            return jsonify(
+                status="ok",
+                total=total,
+                page=page,
+                pageSize=limit,
+                pages=pages,
+                more=page < pages,
+                alerts=alert_response,
+                severityCounts=severity_count,
+                statusCounts=status_count,
+                lastTime=last_time,
+                autoRefresh=Switch.get('auto-refresh-allow').is_on(),
+            )
+        else:
+            gets_timer.stop_timer(gets_started)
+            return jsonify(
+                status="ok",
+                message="not found",
+                total=total,
+                page=page,
+                pageSize=limit,
+                pages=pages,
+                more=False,
+                alerts=[],
+                severityCounts=severity_count,
+                statusCounts=status_count,
+                lastTime=query_time,
+                autoRefresh=Switch.get('auto-refresh-allow').is_on()
+            )
 
-        last_time = None
 
-        for alert in alerts:
-            body = alert.get_body()
-            body['href'] = absolute_url('/alert/' + alert.id)
+@app.route('/alerts/history', methods=['OPTIONS', 'GET'])
+@cross_origin()
+@permission('read:alerts')
+@jsonp
+def get_history():
 
-            if not last_time:
-                last_time = body['lastReceiveTime']
-            elif body['lastReceiveTime'] > last_time:
-                last_time = body['lastReceiveTime']
+    try:
+        query, _, _, _, _, limit, query_time = parse_fields(request.args)
+    except Exception as e:
+        return jsonify(status="error", message=str(e)), 400
+
+    try:
+        history = db.get_history(query=query, limit=limit, archive=request.args.get('archive', 'false') == 'true')
+    except Exception as e:
+        return jsonify(status="error", message=str(e)), 500
 
-            alert_response.append(body)
+    for alert in history:
+        alert['href'] = absolute_url('/alert/' + alert['id'])
 
-        gets_timer.stop_timer(gets_started)
+    if len(history) > 0:
         return jsonify(
             status="ok",
-            total=total,
-            page=page,
-            pageSize=limit,
-            pages=pages,
-            more=page < pages,
-            alerts=alert_response,
-            severityCounts=severity_count,
-            statusCounts=status_count,
-            lastTime=last_time,
-            autoRefresh=Switch.get('auto-refresh-allow').is_on(),
+            history=history,
+            lastTime=history[-1]['updateTime']
         )
     else:
-        gets_timer.stop_timer(gets_started)
         return jsonify(
             status="ok",
             message="not found",
-            total=total,
-            page=page,
-            pageSize=limit,
-            pages=pages,
-            more=False,
-            alerts=[],
-            severityCounts=severity_count,
-            statusCounts=status_count,
-            lastTime=query_time,
-            autoRefresh=Switch.get('auto-refresh-allow').is_on()
+            history=[],
+            lastTIme=query_time
         )
 
 
-@app.route('/alerts/history', methods=['OPTIONS', 'GET'])
+@app.route('/alerts/search', methods=['OPTIONS', 'GET'])
 @cross_origin()
 @permission('read:alerts')
 @jsonp
-def get_history():
+def search_alerts():
+
+    search_started = search_timer.start_timer()
+    params = request.args.copy()
+    terms = params.pop('search', None)
+    if not terms:
+        search_timer.stop_timer(search_started)
+        return jsonify(status="error", message="must supply 'search' terms as parameter"), 400
 
+    params.setdefault('profile', 'summary')
     try:
-        query, _, _, _, _, limit, query_time = parse_fields(request.args)
+        query, fields, _, _, page, limit, _ = parse_fields(params)
     except Exception as e:
+        search_timer.stop_timer(search_started)
         return jsonify(status="error", message=str(e)), 400
 
+    if limit < 1:
+        search_timer.stop_timer(search_started)
+        return jsonify(status="error", message="page 'limit' of %s is not valid" % limit), 416
+
     try:
-        history = db.get_history(query=query, limit=limit)
+        total = db.get_search_count(terms, query=query)
+        alerts = db.search_alerts(terms, query=query, fields=fields, skip=(page - 1) * limit, limit=limit + 1)
     except Exception as e:
+        search_timer.stop_timer(search_started)
         return jsonify(status="error", message=str(e)), 500
 
-    for alert in history:
+    more = len(alerts) > limit
+    alerts = alerts[:limit]
+    for alert in alerts:
         alert['href'] = absolute_url('/alert/' + alert['id'])
 
-    if len(history) > 0:
+    search_timer.stop_timer(search_started)
+    if alerts:
         return jsonify(
             status="ok",
-            history=history,
-            lastTime=history[-1]['updateTime']
+            total=total,
+            page=page,
+            pageSize=limit,
+            more=more,
+            alerts=alerts
         )
     else:
         return jsonify(
             status="ok",
             message="not found",
-            history=[],
-            lastTIme=query_time
+            total=total,
+            page=page,
+            pageSize=limit,
+            more=False,
+            alerts=[]
         )
 
 
@@ -185,16 +250,17 @@ def receive_alert():
         return jsonify(status="error", message="API not accepting alerts. Try again later."), 503
 
     recv_started = receive_timer.start_timer()
-    try:
-        incomingAlert = Alert.parse_alert(request.data)
-    except ValueError as e:
-        receive_timer.stop_timer(recv_started)
-        return jsonify(status="error", message=str(e)), 400
+    with timing.stage('parse'):
+        try:
+            incomingAlert = Alert.parse_alert(request.data)
+        except ValueError as e:
+            receive_timer.stop_timer(recv_started)
+            return jsonify(status="error", message=str(e)), 400
 
-    if g.get('customer', None):
-        incomingAlert.customer = g.get('customer')
+        if g.get('customer', None):
+            incomingAlert.customer = g.get('customer')
 
-    add_remote_ip(request, incomingAlert)
+        add_remote_ip(request, incomingAlert)
 
     try:
         alert = process_alert(incomingAlert)
@@ -214,9 +280,10 @@ def receive_alert():
     receive_timer.stop_timer(recv_started)
 
     if alert:
-        body = alert.get_body()
-        body['href'] = absolute_url('/alert/' + alert.id)
-        return jsonify(status="ok", id=alert.id, alert=body), 201, {'Location': body['href']}
+        with timing.stage('serialize'):
+            body = alert.get_body()
+            body['href'] = absolute_url('/alert/' + alert.id)
+            return jsonify(status="ok", id=alert.id, alert=body), 201, {'Location': body['href']}
     else:
         return jsonify(status="error", message="insert or update of received alert failed"), 500
 
@@ -432,13 +499,15 @@ def get_counts():
     except Exception as e:
         return jsonify(status="error", message=str(e)), 400
 
+    archive = request.args.get('archive', 'false') == 'true'
+
     try:
-        severity_count = db.get_counts(query=query, fields={"severity": 1}, group="severity")
+        severity_count = db.get_counts(query=query, fields={"severity": 1}, group="severity", archive=archive)
     except Exception as e:
         return jsonify(status="error", message=str(e)), 500
 
     try:
-        status_count = db.get_counts(query=query, fields={"status": 1}, group="status")
+        status_count = db.get_counts(query=query, fields={"status": 1}, group="status", archive=archive)
     except Exception as e:
         return jsonify(status="error", message=str(e)), 500
 
@@ -735,6 +804,40 @@ def create_heartbeat():
     return jsonify(status="ok", id=heartbeat.id, heartbeat=body), 201, {'Location': body['href']}
 
 
+@app.route('/heartbeats/bulk', methods=['OPTIONS', 'POST'])
+@cross_origin()
+@permission('write:heartbeats')
+@jsonp
+def create_heartbeats():
+
+    try:
+        data = request.get_json(force=True)
+    except Exception as e:
+        return jsonify(status="error", message=str(e)), 400
+
+    if not isinstance(data, list):
+        return jsonify(status="error", message="must be a list of heartbeats"), 400
+    if len(data) > app.config['HEARTBEAT_BULK_LIMIT']:
+        return jsonify(status="error", message="too many heartbeats, limit is %s" % app.config['HEARTBEAT_BULK_LIMIT']), 413
+
+    heartbeats = list()
+    for index, hb in enumerate(data):
+        try:
+            heartbeat = Heartbeat.parse_heartbeat(hb)
+        except ValueError as e:
+            return jsonify(status="error", message="heartbeat %s: %s" % (index, e)), 400
+        if g.get('customer', None):
+            heartbeat.customer = g.get('customer')
+        heartbeats.append(heartbeat)
+
+    try:
+        count = db.save_heartbeats(heartbeats)
+    except Exception as e:
+        return jsonify(status="error", message=str(e)), 500
+
+    return jsonify(status="ok", total=count), 201
+
+
 @app.route('/heartbeat/<id>', methods=['OPTIONS', 'GET'])
 @cross_origin()
 @permission('read:heartbeats')
@@ -1123,6 +1226,7 @@ def delete_key(key):
             response = db.delete_key(key)
         except Exception as e:
             return jsonify(status="error", message=str(e)), 500
+        key_cache.delete(key)
 
         if response:
             return jsonify(status="ok")
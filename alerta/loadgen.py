@@ -0,0 +1,383 @@
+"""
+Replay captured alert, webhook and query traffic against an alerta server.
+
+Traffic is read from newline-delimited JSON files, one request per line:
+
+    {"time": "2017-08-03T15:17:37.804Z", "method": "POST", "path": "/alert", "body": {...}}
+    {"time": 1501773458.2, "path": "/webhooks/prometheus", "body": {...}}
+    {"time": 1501773459.0, "method": "GET", "path": "/alerts?status=open"}
+
+"time" is an ISO 8601 date or seconds since the epoch and is only needed to replay the original
+timing. "method" defaults to POST when there is a body, otherwise GET, and "headers" are sent as
+given. A line without a "path" that looks like an alert (has "resource" and "event") is sent
+to POST /alert, so an export of alerts can be replayed as is.
+
+Requests are sent by a pool of worker threads. With --speedup they are scheduled at the recorded
+times compressed by that factor, with --rate they are sent at no more than that many per second,
+and with neither they are sent as fast as the workers allow.
+
+    $ alertad loadgen --url http://staging:8080 --key $API_KEY --speedup 60 incident.ndjson
+
+It does not need the server configuration or a database, so can also be run on its own:
+
+    $ python -m alerta.loadgen --url http://staging:8080 --rate 200 -c 20 alerts.ndjson
+"""
+
+import datetime
+import argparse
+import json
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+
+import requests
+
+from dateutil import parser as date_parser, tz
+from six.moves import queue
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+EPOCH = datetime.datetime(1970, 1, 1)
+DONE = object()
+
+
+class Replay(object):
+
+    def __init__(self, method, path, body=None, headers=None, timestamp=None):
+
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers or dict()
+        self.timestamp = timestamp
+
+    @property
+    def endpoint(self):
+        """
+        Name the request is reported under, the method and path without the query string.
+        """
+        return '%s %s' % (self.method, urlsplit(self.path).path)
+
+    @staticmethod
+    def parse(line):
+
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError('request must be a JSON object')
+
+        if 'path' not in record:
+            if 'resource' in record and 'event' in record:
+                record = {'path': '/alert', 'body': record, 'time': record.get('receiveTime') or record.get('createTime')}
+            else:
+                raise ValueError('request must have a "path"')
+
+        body = record.get('body')
+        timestamp = record.get('time')
+        if isinstance(timestamp, (int, float)):
+            timestamp = float(timestamp)
+        elif timestamp:
+            timestamp = date_parser.parse(timestamp)
+            if timestamp.tzinfo:
+                timestamp = timestamp.astimezone(tz.tzutc()).replace(tzinfo=None)  # naive dates are UTC
+            timestamp = (timestamp - EPOCH).total_seconds()
+
+        return Replay(
+            method=record.get('method', 'POST' if body is not None else 'GET').upper(),
+            path=record['path'] if record['path'].startswith('/') else '/' + record['path'],
+            body=body,
+            headers=record.get('headers'),
+            timestamp=timestamp
+        )
+
+
+def read_traffic(files, limit=None):
+    """
+    Yield requests from NDJSON files in order. Blank lines and lines that fail to parse are skipped.
+    """
+    count = 0
+    for filename in files:
+        f = sys.stdin if filename == '-' else open(filename)
+        try:
+            for lineno, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    replay = Replay.parse(line)
+                except ValueError as e:
+                    sys.stderr.write('%s:%s: skipped, %s\n' % (filename, lineno, e))
+                    continue
+                yield replay
+                count += 1
+                if limit and count >= limit:
+                    return
+        finally:
+            if f is not sys.stdin:  # only close files opened here
+                f.close()
+
+
+def schedule(traffic, rate=0, speedup=0):
+    """
+    Yield (delay, request) where delay is seconds from the start of the replay that the request is due.
+    """
+    gap = 1.0 / rate if rate else 0.0
+    first = None
+    due = None
+    for replay in traffic:
+        recorded = 0.0
+        if speedup and replay.timestamp is not None:
+            if first is None:
+                first = replay.timestamp
+            recorded = max(replay.timestamp - first, 0) / speedup
+        due = recorded if due is None else max(due + gap, recorded)
+        yield due, replay
+
+
+def repeat(replays, times):
+    """
+    Yield the requests the given number of times, moving the timestamps of each pass to follow the last.
+    """
+    timestamps = [r.timestamp for r in replays if r.timestamp is not None]
+    span = max(timestamps) - min(timestamps) + 1.0 if timestamps else 0.0
+    for n in range(times):
+        for r in replays:
+            timestamp = r.timestamp + n * span if r.timestamp is not None else None
+            yield Replay(r.method, r.path, r.body, r.headers, timestamp)
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if not values:
+        return 0.0
+    rank = int(round(p / 100.0 * len(values) + 0.5)) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+class Stats(object):
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.latencies = OrderedDict()
+        self.errors = dict()
+        self.status = dict()
+        self.late = 0.0
+
+    def record(self, endpoint, status, latency, late=0.0):
+
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            codes = self.status.setdefault(endpoint, dict())
+            codes[str(status)] = codes.get(str(status), 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            self.late = max(self.late, late)
+
+    @staticmethod
+    def summarize(latencies, errors, status, elapsed):
+
+        latencies = sorted(latencies)
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'status': status,
+            'throughput': len(latencies) / elapsed if elapsed else 0.0,
+            'mean': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': latencies[-1] * 1000 if latencies else 0.0
+        }
+
+    def report(self, elapsed):
+
+        results = OrderedDict()
+        total_status = dict()
+        for endpoint, latencies in self.latencies.items():
+            results[endpoint] = self.summarize(latencies, self.errors.get(endpoint, 0), self.status[endpoint], elapsed)
+            for code, count in self.status[endpoint].items():
+                total_status[code] = total_status.get(code, 0) + count
+        results['total'] = self.summarize(
+            [v for values in self.latencies.values() for v in values], sum(self.errors.values()), total_status, elapsed
+        )
+        return results
+
+
+class LoadGenerator(object):
+
+    def __init__(self, url, key=None, concurrency=10, timeout=10.0):
+
+        self.url = url.rstrip('/')
+        self.headers = {'Content-type': 'application/json'}
+        if key:
+            self.headers['Authorization'] = 'Key %s' % key
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.stats = Stats()
+        self.start = None
+
+    def worker(self, work):
+
+        session = requests.Session()
+        while True:
+            item = work.get()
+            if item is DONE:
+                return
+            due, replay = item
+
+            wait = self.start + due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            late = max(-wait, 0.0)
+
+            t = time.time()
+            try:
+                headers = dict(self.headers)
+                headers.update(replay.headers)
+                data = json.dumps(replay.body) if replay.body is not None else None
+                response = session.request(replay.method, self.url + replay.path, data=data, headers=headers, timeout=self.timeout)
+                status = response.status_code
+            except Exception as e:  # counted as an error, a worker that stops would hang the replay
+                status = type(e).__name__
+            self.stats.record(replay.endpoint, status, time.time() - t, late)
+
+    def run(self, scheduled, progress=None):
+        """
+        Send the scheduled requests and return the results for each endpoint and in total.
+        """
+        work = queue.Queue(maxsize=self.concurrency * 2)  # bounded, so large files are not read up front
+        workers = [threading.Thread(target=self.worker, args=(work,)) for _ in range(self.concurrency)]
+        for w in workers:
+            w.daemon = True
+            w.start()
+
+        self.start = time.time()
+        sent = 0
+        for item in scheduled:
+            work.put(item)
+            sent += 1
+            if progress and sent % progress == 0:
+                sys.stderr.write('%d requests sent in %.1fs\n' % (sent, time.time() - self.start))
+        for _ in workers:
+            work.put(DONE)
+        for w in workers:
+            w.join()
+
+        elapsed = time.time() - self.start
+        return {
+            'url': self.url,
+            'elapsed': elapsed,
+            'concurrency': self.concurrency,
+            'late': self.stats.late,
+            'results': self.stats.report(elapsed)
+        }
+
+
+def print_report(report):
+
+    print('%-36s %8s %6s %10s %9s %9s %9s %9s' % ('endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for endpoint, r in report['results'].items():
+        print('%-36s %8d %6d %10.1f %9.2f %9.2f %9.2f %9.2f' % (
+            endpoint, r['requests'], r['errors'], r['throughput'], r['p50'], r['p90'], r['p99'], r['max']))
+    print('elapsed %.1fs, requests started up to %.2fs behind schedule' % (report['elapsed'], report['late']))
+
+
+def add_arguments(parser):
+
+    parser.add_argument(
+        'files',
+        nargs='+',
+        metavar='FILE',
+        help='NDJSON file with one request per line, "-" for stdin'
+    )
+    parser.add_argument(
+        '--url',
+        default='http://localhost:8080',
+        help='API endpoint of the server under test'
+    )
+    parser.add_argument(
+        '--key',
+        help='API key, if authentication is enabled'
+    )
+    parser.add_argument(
+        '-c',
+        '--concurrency',
+        type=int,
+        default=10,
+        help='Number of requests in flight'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=0,
+        help='Maximum requests per second, 0 for no limit'
+    )
+    parser.add_argument(
+        '--speedup',
+        type=float,
+        default=0,
+        help='Replay at the recorded times compressed by this factor, eg. 60 replays an hour in a minute, 0 to ignore them'
+    )
+    parser.add_argument(
+        '-n',
+        '--limit',
+        type=int,
+        default=0,
+        help='Stop after this many requests from the files, 0 for all'
+    )
+    parser.add_argument(
+        '--loop',
+        type=int,
+        default=0,
+        help='Replay the files this many times'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=10.0,
+        help='Request timeout in seconds'
+    )
+    parser.add_argument(
+        '--progress',
+        type=int,
+        default=1000,
+        help='Report progress every this many requests, 0 for none'
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='Write results to a JSON file'
+    )
+
+
+def main(args):
+
+    traffic = read_traffic(args.files, limit=args.limit)
+    if args.loop:
+        traffic = repeat(list(traffic), args.loop)
+
+    generator = LoadGenerator(args.url, key=args.key, concurrency=args.concurrency, timeout=args.timeout)
+    report = generator.run(schedule(traffic, rate=args.rate, speedup=args.speedup), progress=args.progress)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    return 1 if report['results']['total']['requests'] == 0 else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='loadgen',
+        description='Replay captured alerta traffic',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    add_arguments(parser)
+    sys.exit(main(parser.parse_args()))
@@ -16,12 +16,95 @@ SECRET_KEY = 'changeme'
 
 QUERY_LIMIT = 10000  # maximum number of alerts returned by a single query
 HISTORY_LIMIT = 100  # cap the number of alert history entries
+HEARTBEAT_BULK_LIMIT = 10000  # maximum number of heartbeats accepted by POST /heartbeats/bulk
+
+# Named field projections for alert lists eg. GET /alerts?profile=console
+ALERT_PROFILES = {
+    'summary': ['resource', 'event', 'environment', 'severity', 'status', 'service', 'group', 'value', 'text',
+                'customer', 'lastReceiveTime'],
+    'console': ['resource', 'event', 'environment', 'severity', 'correlate', 'status', 'service', 'group', 'value',
+                'text', 'tags', 'attributes', 'origin', 'type', 'createTime', 'timeout', 'customer', 'duplicateCount',
+                'repeat', 'previousSeverity', 'trendIndication', 'receiveTime', 'lastReceiveId', 'lastReceiveTime'],
+    'full': None  # all fields, including rawData and history
+}
+DEFAULT_ALERT_PROFILE = 'full'
 
 # MongoDB
-DATABASE_ENGINE = 'mongo'
+DATABASE_ENGINE = 'mongo'  # 'sqlite' for a single node, or 'memory' to keep everything in this process, for tests and benchmarks only
 MONGO_URI = 'mongodb://localhost:27017/monitoring'
 MONGO_DATABASE = None  # can be used to override default database, above
 
+# MongoDB connection pool, None to use driver defaults
+MONGO_MAX_POOL_SIZE = 100  # maximum connections to each server from each process
+MONGO_MIN_POOL_SIZE = 0  # connections kept open when idle
+MONGO_WAIT_QUEUE_TIMEOUT_MS = None  # fail if no connection is free within this time, default is wait forever
+MONGO_CONNECT_TIMEOUT_MS = 20000
+MONGO_SOCKET_TIMEOUT_MS = None  # fail queries that take longer than this, default is no timeout
+
+# Read preference for read-only API queries eg. GET /alerts, counts and top10. Set to 'secondaryPreferred'
+# to move them off the primary of a replica set. Clients can send "X-Read-Your-Writes: true" to read from
+# the primary, eg. to refresh a view immediately after a change, if MONGO_READ_YOUR_WRITES is enabled.
+MONGO_READ_PREFERENCE = 'primary'
+MONGO_READ_YOUR_WRITES = True
+
+# Write concern per collection, empty to use the default from MONGO_URI
+MONGO_WRITE_CONCERN = {}
+#MONGO_WRITE_CONCERN = {
+#    'alerts': {'w': 'majority', 'j': True},  # durable
+#    'metrics': {'w': 1, 'j': False}  # fast
+#}
+
+# MongoDB indexes (use "alertad indexes verify" to compare against the database)
+MONGO_SYNC_INDEXES = True  # create missing indexes in a background thread at startup
+MONGO_INDEX_BACKGROUND = True  # build indexes without blocking other database operations
+MONGO_INDEXES = [
+    # default console query ie. status != expired, sort by lastReceiveTime, filter by environment or customer
+    {'collection': 'alerts', 'key': [('status', 1), ('lastReceiveTime', -1)]},
+    {'collection': 'alerts', 'key': [('environment', 1), ('status', 1), ('lastReceiveTime', -1)]},
+    {'collection': 'alerts', 'key': [('customer', 1), ('status', 1), ('lastReceiveTime', -1)]},
+    {'collection': 'alerts', 'key': [('lastReceiveId', 1)]},
+    {'collection': 'alerts', 'key': [('tags', 1)]},
+    {'collection': 'alerts', 'key': [('service', 1)]},
+    {'collection': 'alerts', 'key': [('attributes.$**', 1)]},  # wildcard index, requires MongoDB 4.2+
+    {'collection': 'alerts', 'key': [('expireTime', 1)]},  # housekeeping, see ALERT_EXPIRE_INTERVAL
+    {'collection': 'alerts', 'key': [('severity', 1), ('lastReceiveTime', -1)]},  # retention by severity
+    {'collection': 'alerts_archive', 'key': [('lastReceiveTime', -1)]},
+    {'collection': 'alerts_archive', 'key': [('environment', 1), ('lastReceiveTime', -1)]},
+    {'collection': 'alerts_archive', 'key': [('resource', 1), ('event', 1)]},
+    {'collection': 'blackouts', 'key': [('environment', 1), ('endTime', 1)]},
+    {'collection': 'heartbeats', 'key': [('origin', 1), ('customer', 1)], 'unique': True},
+    {'collection': 'heartbeats', 'key': [('status', 1), ('expireTime', 1)]},  # stale heartbeat checks
+    {'collection': 'users', 'key': [('login', 1)]},
+    {'collection': 'perms', 'key': [('match', 1)]},
+    {'collection': 'customers', 'key': [('match', 1)]},
+    {'collection': 'keys', 'key': [('key', 1)], 'unique': True}
+]
+MONGO_TEXT_INDEX = {  # alert fields used by /alerts/search and their relative weights
+    'resource': 10,
+    'event': 10,
+    'text': 5,
+    'service': 2
+}
+MONGO_TEXT_LANGUAGE = 'english'  # text search stemming and stop words, use 'none' to disable
+
+# SQLite (DATABASE_ENGINE = 'sqlite'), text search uses the weights in MONGO_TEXT_INDEX
+SQLITE_DATABASE = 'alerta.sqlite'  # path to database file, created if it doesn't exist
+SQLITE_TIMEOUT = 5  # seconds to wait for a lock held by another thread or process
+SQLITE_SYNCHRONOUS = 'NORMAL'  # 'FULL' to also survive power loss, at the cost of slower writes
+
+# Database commands made by each API request, counted for all engines
+DATABASE_COMMANDS_HEADER = False  # add "X-Database-Commands: <count>; time=<ms>" to responses, always on if DEBUG
+DATABASE_COMMANDS_BUDGET = 50  # log requests that make more database commands than this, 0 to disable
+DATABASE_COMMANDS_REPEAT_LIMIT = 25  # log requests that repeat one command on one collection this often, a likely N+1 query
+DATABASE_METRICS_FLUSH_INTERVAL = 10  # seconds between writing commands and time per endpoint to metrics, 0 for every request
+SLOW_QUERY_THRESHOLD = 100  # milliseconds, add database commands slower than this to /management/queries, 0 to disable
+SLOW_QUERY_MAX_SHAPES = 200  # number of distinct query shapes kept in the slow query log
+SERVER_TIMING_HEADER = False  # add "Server-Timing" with the time of each stage, eg. parse, auth, plugins and db, always on if DEBUG
+HISTOGRAM_BUCKETS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]  # upper bounds in milliseconds of stage timing histograms
+HISTOGRAM_FLUSH_INTERVAL = 10  # seconds between adding stage timings to the histograms in metrics, 0 for every request
+PROFILE_MAX_SECONDS = 60  # longest profile allowed by /management/profile
+PROFILE_SAMPLE_INTERVAL = 5  # milliseconds between stack samples when profiling
+
 AUTH_REQUIRED = False
 ADMIN_USERS = []
 USER_DEFAULT_SCOPES = ['read', 'write']  # Note: 'write' scope implicitly includes 'read'
@@ -44,13 +127,18 @@ ALLOWED_KEYCLOAK_ROLES = ['*']
 # TODO: Add SAML default config
 
 TOKEN_EXPIRE_DAYS = 14
+TOKEN_CACHE_TTL = 300  # seconds decoded bearer tokens are cached, 0 to verify every request
+TOKEN_CACHE_SIZE = 10000  # maximum number of tokens cached by each process
 API_KEY_EXPIRE_DAYS = 365  # 1 year
+API_KEY_CACHE_TTL = 30  # seconds a verified key is trusted before it is looked up again, 0 to disable
+API_KEY_CACHE_SIZE = 10000  # maximum number of keys cached by each process
+API_KEY_USAGE_FLUSH_INTERVAL = 10  # seconds between writing key usage counts, 0 to write on every request
 
 # switches
 AUTO_REFRESH_ALLOW = 'ON'  # set to 'OFF' to reduce load on API server by forcing clients to manually refresh
 SENDER_API_ALLOW = 'ON'    # set to 'OFF' to block clients from sending new alerts to API server
 
-CORS_ALLOW_HEADERS = ['Content-Type', 'Authorization', 'Access-Control-Allow-Origin']
+CORS_ALLOW_HEADERS = ['Content-Type', 'Authorization', 'Access-Control-Allow-Origin', 'X-Read-Your-Writes']
 CORS_ORIGINS = [
     'http://try.alerta.io',
     'http://explorer.alerta.io',
@@ -83,6 +171,49 @@ SMTP_PORT = 587
 MAIL_FROM = 'your@gmail.com'  # replace with valid sender address
 SMTP_PASSWORD = ''  # password for MAIL_FROM account, Gmail uses application-specific passwords
 
+# Housekeeping
+HOUSEKEEPING_ENABLED = True  # run background jobs in each API server process
+HOUSEKEEPING_LEASE_TTL = 30  # seconds before another process takes over cluster-wide jobs if leader stops
+ALERT_EXPIRE_INTERVAL = 60  # seconds between checks for timed out alerts, 0 to disable
+ALERT_EXPIRE_BATCH_SIZE = 500  # maximum number of alerts expired per query
+ALERT_EXPIRE_CONCURRENCY = 4  # number of alerts sent through plugins at the same time by housekeeping jobs
+
+# Delete old alerts matching any policy, eg. {'status': ['closed', 'expired'], 'age': 7200} removes
+# closed or expired alerts not received for 2 hours. Policies can match on severity, status
+# and environment and all match on age in seconds since lastReceiveTime.
+RETENTION_POLICIES = []
+#RETENTION_POLICIES = [
+#    {'status': ['closed', 'expired'], 'age': 7200},
+#    {'severity': ['informational', 'debug'], 'age': 43200},
+#    {'environment': 'Development', 'status': 'ack', 'age': 86400}
+#]
+RETENTION_INTERVAL = 300  # seconds between runs, 0 to disable
+RETENTION_BATCH_SIZE = 1000  # maximum number of alerts deleted at once
+RETENTION_BATCH_DELAY = 0.5  # seconds to pause between batches to limit load on the database
+RETENTION_MAX_BATCHES = 100  # stop and continue on the next run after this many batches
+RETENTION_TTL = None  # if set, MongoDB removes expired alerts this many seconds after lastReceiveTime
+
+# Move closed and expired alerts to the "alerts_archive" collection, use ?archive=true to include them
+ARCHIVE_AFTER = None  # seconds since lastReceiveTime before moving to archive, None to disable
+ARCHIVE_STATUS = ['closed', 'expired']
+ARCHIVE_INTERVAL = 300  # seconds between runs
+ARCHIVE_BATCH_SIZE = 500  # maximum number of alerts moved at once
+ARCHIVE_TTL = None  # if set, MongoDB removes archived alerts this many seconds after lastReceiveTime
+
+HEARTBEAT_CHECK_INTERVAL = 60  # seconds between checks for stale heartbeats, 0 to disable
+HEARTBEAT_CHECK_BATCH_SIZE = 500  # maximum number of heartbeats checked per query
+HEARTBEAT_CHECK_CONCURRENCY = 4  # number of heartbeat alerts sent through plugins at the same time
+HEARTBEAT_ALERT_ENVIRONMENT = 'Production'  # heartbeat alerts must pass the same plugins as any other alert
+HEARTBEAT_ALERT_SEVERITY = 'major'
+HEARTBEAT_ALERT_SERVICE = ['Alerta']
+
+# Outbound HTTP requests by auth providers and plugins (see alerta.app.httpclient)
+HTTP_CLIENT_CONNECT_TIMEOUT = 3.05  # seconds
+HTTP_CLIENT_READ_TIMEOUT = 10  # seconds
+HTTP_CLIENT_RETRIES = 2  # retries for connection errors and 502, 503, 504 responses to idempotent requests
+HTTP_CLIENT_POOL_SIZE = 10  # connections kept open to each host
+HTTP_CLIENT_CONCURRENCY = 4  # number of independent requests run at the same time
+
 # Plug-ins
 PLUGINS = ['reject']
 
@@ -0,0 +1,3 @@
+"""
+Benchmarks for the alerta server. See benchmarks/README.md for how to run them.
+"""
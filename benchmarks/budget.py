@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Performance budgets. The benchmark scenarios are run against the in-process app and compared
+with a stored baseline: the number of database operations for each request of each endpoint,
+and the throughput and median latency of each scenario.
+
+Database operations are the commands counted by the server for each request and returned in
+the X-Database-Commands header. They are the same for every engine and don't depend on the
+speed of the machine. Timings are only compared against a baseline for the same engine.
+
+    $ python -m benchmarks.budget                   # check against benchmarks/baseline.json
+    $ python -m benchmarks.budget --update          # accept the current numbers as the baseline
+
+The same checks run as part of the test suite in tests/test_performance.py.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Defaults for budget checks, the number of requests are small so that they are quick enough for the test suite
+REQUESTS = 200
+SEED = 200
+TOLERANCE = 0.25  # fail if throughput falls or median latency rises by more than this fraction
+RUNS = 3  # timings are the best of this many runs when checked, and the median when saved as the baseline
+
+
+def configure(app):
+    """
+    Settings that change the database operations made by a request, fixed so that the counts
+    don't depend on the server configuration or on settings left by another test.
+    """
+    app.config['TESTING'] = True
+    app.config['AUTH_REQUIRED'] = False
+    app.config['CUSTOMER_VIEWS'] = False
+    app.config['DATABASE_COMMANDS_HEADER'] = True
+
+
+def measure(scenarios=None, requests=REQUESTS, seed=SEED, random_seed=42):
+    """
+    Run the scenarios once and return the results with the maximum operations for a request of each endpoint.
+    """
+    from alerta.app import app, db
+    from benchmarks.run import run_scenario
+    from benchmarks.scenarios import SCENARIOS
+
+    configure(app)
+    client = app.test_client()
+    headers = {'Content-type': 'application/json'}
+
+    results = dict()
+    for cls in SCENARIOS:
+        if scenarios and cls.name not in scenarios:
+            continue
+        random.seed(random_seed)
+        results[cls.name] = run_scenario(cls(requests, seed), client, db, headers)
+    db.destroy_db()
+    return results
+
+
+def combine(runs, pick):
+    """
+    Combine the results of several runs of the same scenarios, eg. pick='best' or 'median' for timings.
+    Operations per request are the maximum of any run.
+    """
+    def median(values):
+        return sorted(values)[len(values) // 2]
+
+    results = dict()
+    for scenario, endpoints in runs[0].items():
+        results[scenario] = dict()
+        for endpoint in endpoints:
+            values = [run[scenario][endpoint] for run in runs]
+            combined = dict(values[0])
+            combined['ops'] = max(v.get('ops', 0) for v in values)
+            throughput = [v['throughput'] for v in values]
+            p50 = [v['p50'] for v in values]
+            combined['throughput'] = max(throughput) if pick == 'best' else median(throughput)
+            combined['p50'] = min(p50) if pick == 'best' else median(p50)
+            results[scenario][endpoint] = combined
+    return results
+
+
+def baseline_from(results, database, requests=REQUESTS, seed=SEED):
+
+    return {
+        'requests': requests,
+        'seed': seed,
+        'operations': dict(
+            (scenario, dict((endpoint, r['ops']) for endpoint, r in endpoints.items() if endpoint != 'total'))
+            for scenario, endpoints in results.items()
+        ),
+        'timings': {
+            database: dict(
+                (scenario, dict((endpoint, {'throughput': round(r['throughput'], 1), 'p50': round(r['p50'], 3)}) for endpoint, r in endpoints.items()))
+                for scenario, endpoints in results.items()
+            )
+        }
+    }
+
+
+def check_operations(results, baseline):
+    """
+    Return a list of endpoints that make more database operations per request than the baseline.
+    """
+    failures = list()
+    for scenario, endpoints in sorted(results.items()):
+        for endpoint, r in sorted(endpoints.items()):
+            budget = baseline['operations'].get(scenario, {}).get(endpoint)
+            if budget is not None and r['ops'] > budget:
+                failures.append('%s %s: %d database operations per request, budget is %d' % (scenario, endpoint, r['ops'], budget))
+    return failures
+
+
+def check_timings(results, baseline, database, tolerance=TOLERANCE):
+    """
+    Return a list of scenarios with throughput or median latency worse than the baseline by more than the tolerance.
+    """
+    failures = list()
+    timings = baseline.get('timings', {}).get(database, {})
+    for scenario, endpoints in sorted(results.items()):
+        before = timings.get(scenario, {}).get('total')
+        if not before:
+            continue
+        after = endpoints['total']
+        if after['throughput'] < before['throughput'] * (1 - tolerance):
+            failures.append('%s: throughput %.1f req/s, baseline is %.1f req/s' % (scenario, after['throughput'], before['throughput']))
+        if after['p50'] > before['p50'] * (1 + tolerance):
+            failures.append('%s: median latency %.2f ms, baseline is %.2f ms' % (scenario, after['p50'], before['p50']))
+    return failures
+
+
+def load_baseline(filename=BASELINE):
+
+    with open(filename) as f:
+        return json.load(f)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Alerta performance budgets')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_ENGINE', 'memory'),
+                        help='database engine, "mongo" uses MONGO_URI (default: memory)')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--update', action='store_true', help='write the current numbers to the baseline')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_ENGINE'] = args.database  # the database is connected when alerta.app is imported
+
+    if args.update:
+        previous = load_baseline(args.baseline) if os.path.exists(args.baseline) else {}
+        results = combine([measure() for _ in range(RUNS)], pick='median')
+        baseline = baseline_from(results, args.database)
+        timings = previous.get('timings', {})
+        timings.update(baseline['timings'])  # keep timings for other engines
+        baseline['timings'] = timings
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Baseline written to %s' % args.baseline)
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    results = combine([measure(requests=baseline['requests'], seed=baseline['seed']) for _ in range(RUNS)], pick='best')
+    failures = check_operations(results, baseline) + check_timings(results, baseline, args.database, args.tolerance)
+    for failure in failures:
+        print(failure)
+    print('%d budget(s) exceeded' % len(failures) if failures else 'All budgets met')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
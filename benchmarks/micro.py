@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for pure-Python functions that run on every request. Results are written as
+JSON so that runs can be compared, eg. before and after a change.
+
+    $ python -m benchmarks.micro -o before.json
+    $ python -m benchmarks.micro -o after.json --compare before.json
+    $ python -m benchmarks.micro -k webhook
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import timeit
+
+from uuid import uuid4
+
+ALERT = {
+    'resource': 'web01',
+    'event': 'node_down',
+    'environment': 'Production',
+    'severity': 'major',
+    'correlate': ['node_down', 'node_marginal', 'node_up'],
+    'service': ['Web', 'Network'],
+    'group': 'Network',
+    'value': 'DOWN',
+    'text': 'web01 is not responding to ping',
+    'tags': ['dc1', 'rack12', 'london'],
+    'attributes': {'region': 'EU', 'ip': '10.1.2.3', 'runBook': 'http://wiki/runbook/node_down'},
+    'origin': 'nagios/mon01',
+    'type': 'nagiosAlert',
+    'timeout': 3600,
+    'rawData': 'PING CRITICAL - Packet loss = 100%'
+}
+
+CLOUDWATCH = json.dumps({
+    'Type': 'Notification',
+    'TopicArn': 'arn:aws:sns:eu-west-1:123456789012:alerta',
+    'Timestamp': '2017-08-03T15:17:37.804Z',
+    'Message': json.dumps({
+        'AlarmName': 'HighCPU',
+        'AlarmDescription': 'CPU above 90%',
+        'AWSAccountId': '123456789012',
+        'NewStateValue': 'ALARM',
+        'Region': 'EU - Ireland',
+        'Trigger': {'Namespace': 'AWS/EC2', 'Dimensions': [{'name': 'InstanceId', 'value': 'i-0123456789'}]}
+    })
+})
+
+PINGDOM = {
+    'check_id': 12345, 'check_name': 'www.example.com', 'check_type': 'HTTP', 'current_state': 'DOWN',
+    'importance_level': 'HIGH', 'description': 'Timeout', 'long_description': 'Timeout (> 30s)', 'tags': ['web']
+}
+
+PAGERDUTY = {
+    'type': 'incident.acknowledge',
+    'data': {'incident': {'incident_key': str(uuid4()), 'incident_number': 42, 'html_url': 'https://pd/incidents/42',
+                          'assigned_to_user': {'name': 'Alice'}}}
+}
+
+PROMETHEUS = {
+    'status': 'firing',
+    'labels': {'alertname': 'HighLatency', 'instance': 'host01:9100', 'job': 'node', 'severity': 'critical',
+               'service': 'Web', 'dc': 'dc1'},
+    'annotations': {'summary': 'Request latency is above threshold', 'description': 'p99 latency is 2.1s'},
+    'startsAt': '2017-08-03T15:17:37.804-04:00',
+    'endsAt': '0001-01-01T00:00:00Z',
+    'generatorURL': 'http://prometheus:9090/graph'
+}
+
+STACKDRIVER = {
+    'incident': {
+        'incident_id': 'f2e08c333dc64cb09f75eaab355393bz', 'resource_id': 'i-4a266a2d', 'resource_name': 'webserver-85',
+        'state': 'open', 'started_at': 1385085727, 'ended_at': None, 'policy_name': 'Webserver Health',
+        'condition_name': 'CPU usage', 'url': 'https://app.stackdriver.com/incidents/f333dc64z',
+        'summary': 'CPU for webserver-85 is above the threshold of 1% with a value of 28.5%'
+    }
+}
+
+SERVERDENSITY = {
+    'fixed': False, 'item_name': 'web01', 'alert_type': 'diskUsage', 'item_type': 'device', 'alert_section': 'system',
+    'configured_trigger_value': '90', 'item_cloud': True, 'alert_id': 'abc123', 'item_id': 'def456'
+}
+
+NEWRELIC = {
+    'version': '1.0', 'current_state': 'open', 'severity': 'CRITICAL', 'condition_name': 'High error rate',
+    'account_name': 'Example', 'details': 'Error rate above 5%', 'event_type': 'INCIDENT',
+    'incident_url': 'https://alerts.newrelic.com/incidents/1', 'runbook_url': 'http://wiki/runbook',
+    'targets': [{'name': 'web-app', 'type': 'Application', 'labels': {'team': 'web', 'env': 'prod'}}]
+}
+
+GRAFANA = {
+    'evalMatches': [{'value': 100, 'metric': 'High value', 'tags': None}],
+    'message': 'CPU usage is high', 'ruleId': 1, 'ruleName': 'High CPU', 'ruleUrl': 'http://grafana:3000/',
+    'imageUrl': 'http://grafana/img.png', 'state': 'alerting', 'title': '[Alerting] High CPU'
+}
+
+RIEMANN = {
+    'host': 'web01', 'service': 'cpu', 'state': 'critical', 'metric': 0.95, 'description': 'CPU is 95%',
+    'tags': ['web']
+}
+
+
+def benchmarks():
+    """
+    Return a list of (name, function) to be timed. Imports are done here because alerta.app
+    connects to the database when it is imported.
+    """
+    from alerta.app import app, severity_code, status_code
+    from alerta.app.alert import Alert, AlertDocument, DateEncoder
+    from alerta.app.utils import parse_fields, deepmerge
+    from alerta.app.webhooks import views as webhooks
+
+    alert_json = json.dumps(ALERT)
+    now = datetime.datetime.utcnow()
+    history = [
+        {'id': str(uuid4()), 'event': 'node_down', 'severity': s, 'value': 'DOWN', 'type': 'severity',
+         'text': 'changed', 'updateTime': now}
+        for s in ['minor', 'major', 'critical', 'major'] * 5
+    ]
+    document = AlertDocument(
+        id=str(uuid4()), resource='web01', event='node_down', environment='Production', severity='major',
+        correlate=ALERT['correlate'], status='open', service=ALERT['service'], group='Network', value='DOWN',
+        text=ALERT['text'], tags=ALERT['tags'], attributes=ALERT['attributes'], origin='nagios/mon01',
+        event_type='nagiosAlert', create_time=now, timeout=3600, raw_data=ALERT['rawData'], duplicate_count=5,
+        repeat=True, previous_severity='minor', trend_indication='moreSevere', receive_time=now,
+        last_receive_id=str(uuid4()), last_receive_time=now, history=history, customer=None
+    )
+    body = document.get_body()
+    encoder = DateEncoder()
+
+    query_context = app.test_request_context(
+        '/alerts?status=open&status=ack&environment=Production&service=Web&sort-by=severity&limit=50&profile=console'
+    )
+    with query_context:
+        from flask import request
+        args = request.args
+
+    config = {'a': 1, 'b': {'c': 2, 'd': {'e': 3, 'f': [1, 2, 3]}}, 'g': 'h'}
+    override = {'b': {'d': {'e': 4}, 'x': 5}, 'g': 'i', 'y': {'z': 1}}
+
+    def in_request(func):
+        def wrapper():
+            with query_context:
+                return func()
+        return wrapper
+
+    return [
+        ('Alert.parse_alert', lambda: Alert.parse_alert(alert_json)),
+        ('parse_fields', in_request(lambda: parse_fields(args))),
+        ('AlertDocument.get_body', lambda: document.get_body()),
+        ('AlertDocument.get_body(history=False)', lambda: document.get_body(history=False)),
+        ('DateEncoder', lambda: encoder.encode(body)),
+        ('severity_code.trend', lambda: severity_code.trend('minor', 'critical')),
+        ('status_code.status_from_severity', lambda: status_code.status_from_severity('critical', 'normal', 'ack')),
+        ('deepmerge', lambda: deepmerge(config, override)),
+        ('webhook parse_notification (cloudwatch)', lambda: webhooks.parse_notification(CLOUDWATCH)),
+        ('webhook parse_pingdom', lambda: webhooks.parse_pingdom(PINGDOM)),
+        ('webhook parse_pagerduty', lambda: webhooks.parse_pagerduty(PAGERDUTY)),
+        ('webhook parse_prometheus', lambda: webhooks.parse_prometheus(PROMETHEUS, 'http://alertmanager:9093')),
+        ('webhook parse_stackdriver', lambda: webhooks.parse_stackdriver(STACKDRIVER)),
+        ('webhook parse_serverdensity', lambda: webhooks.parse_serverdensity(SERVERDENSITY)),
+        ('webhook parse_newrelic', lambda: webhooks.parse_newrelic(NEWRELIC)),
+        ('webhook parse_grafana', lambda: webhooks.parse_grafana(GRAFANA, GRAFANA['evalMatches'][0])),
+        ('webhook parse_riemann', lambda: webhooks.parse_riemann(RIEMANN))
+    ]
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """
+    Return the best time per call in microseconds, over repeat runs of enough calls to take min_time.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 10
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return {'loops': number, 'usec': best / number * 1e6}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Alerta microbenchmarks')
+    parser.add_argument('-k', '--filter', help='only run benchmarks with names containing this')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds for each timing run')
+    parser.add_argument('-o', '--output', help='write results to a JSON file')
+    parser.add_argument('--compare', help='show change against an earlier JSON file')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_ENGINE', 'memory')  # nothing here uses the database
+
+    baseline = dict()
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    report = {'python': sys.version.split()[0], 'results': dict()}
+    for name, func in benchmarks():
+        if args.filter and args.filter not in name:
+            continue
+        result = measure(func, args.repeat, args.min_time)
+        report['results'][name] = result
+
+        line = '%-45s %10.2f usec' % (name, result['usec'])
+        if name in baseline:
+            line += '   %+.1f%%' % ((result['usec'] / baseline[name]['usec'] - 1) * 100)
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Drive the alerta API in-process with the Flask test client and report throughput and latency
+percentiles for each endpoint of each scenario.
+
+    $ python -m benchmarks.run                                 # all scenarios, in-memory database
+    $ python -m benchmarks.run --database mongo -s console     # against MONGO_URI
+    $ python -m benchmarks.run -o after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+from alerta.loadgen import percentile
+
+HEADER = 'X-Database-Commands'
+
+
+def summarize(latencies, errors, elapsed, ops=None):
+
+    latencies = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'mean': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'p50': percentile(latencies, 50) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'max': latencies[-1] * 1000 if latencies else 0.0
+    }
+    if ops:
+        result['ops'] = max(ops)
+        result['ops_mean'] = float(sum(ops)) / len(ops)
+    return result
+
+
+def run_scenario(scenario, client, db, headers):
+    """
+    Run the scenario requests, recording database operations per request if the server returns them.
+    """
+    db.destroy_db()
+    scenario.setup(client, headers)
+
+    latencies = dict()
+    errors = dict()
+    ops = dict()
+    started = timeit.default_timer()
+    for endpoint, method, url, body in scenario.requests():
+        data = json.dumps(body) if body is not None else None
+        t = timeit.default_timer()
+        response = client.open(url, method=method, data=data, headers=headers)
+        latencies.setdefault(endpoint, []).append(timeit.default_timer() - t)
+        if HEADER in response.headers:
+            ops.setdefault(endpoint, []).append(int(response.headers[HEADER].split(';')[0]))
+        if response.status_code >= 400:
+            errors[endpoint] = errors.get(endpoint, 0) + 1
+    elapsed = timeit.default_timer() - started
+
+    results = dict()
+    for endpoint, values in latencies.items():
+        results[endpoint] = summarize(values, errors.get(endpoint, 0), sum(values), ops.get(endpoint))
+    results['total'] = summarize([v for values in latencies.values() for v in values], sum(errors.values()), elapsed,
+                                 [n for values in ops.values() for n in values])
+    return results
+
+
+def print_report(report, baseline=None):
+
+    print('%-12s %-28s %8s %6s %10s %9s %9s %9s %7s' % ('scenario', 'endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p99 ms', 'max ms', 'db ops'))
+    for scenario, endpoints in report['results'].items():
+        for endpoint in sorted(endpoints, key=lambda e: (e == 'total', e)):
+            r = endpoints[endpoint]
+            line = '%-12s %-28s %8d %6d %10.1f %9.2f %9.2f %9.2f %7.1f' % (
+                scenario, endpoint, r['requests'], r['errors'], r['throughput'], r['p50'], r['p99'], r['max'], r.get('ops_mean', 0))
+            before = (baseline or {}).get('results', {}).get(scenario, {}).get(endpoint)
+            if before and before['p50']:
+                line += '   p50 %+.0f%% p99 %+.0f%%' % (
+                    (r['p50'] / before['p50'] - 1) * 100, (r['p99'] / before['p99'] - 1) * 100 if before['p99'] else 0)
+            print(line)
+
+
+def main():
+
+    from benchmarks.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description='Alerta API benchmarks')
+    parser.add_argument('-s', '--scenario', action='append', choices=[s.name for s in SCENARIOS],
+                        help='scenario to run, can be repeated (default: all)')
+    parser.add_argument('-n', '--requests', type=int, default=1000, help='timed requests per scenario')
+    parser.add_argument('--seed', type=int, default=1000, help='alerts created before read-only scenarios')
+    parser.add_argument('--database', default=os.environ.get('DATABASE_ENGINE', 'memory'),
+                        help='database engine, "mongo" uses MONGO_URI (default: memory)')
+    parser.add_argument('--random-seed', type=int, default=42)
+    parser.add_argument('-o', '--output', help='write results to a JSON file')
+    parser.add_argument('--compare', help='show change in latency against an earlier JSON file')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_ENGINE'] = args.database  # the database is connected when alerta.app is imported
+    from alerta.app import app, db
+
+    app.config['TESTING'] = True  # don't start housekeeping jobs
+    app.config['AUTH_REQUIRED'] = False
+    app.config['DATABASE_COMMANDS_HEADER'] = True  # database operations per request
+    client = app.test_client()
+    headers = {'Content-type': 'application/json'}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = {
+        'database': args.database,
+        'python': sys.version.split()[0],
+        'requests': args.requests,
+        'seed': args.seed,
+        'results': dict()
+    }
+    for cls in SCENARIOS:
+        if args.scenario and cls.name not in args.scenario:
+            continue
+        random.seed(args.random_seed)
+        sys.stderr.write('Running %s: %s\n' % (cls.name, cls.description))
+        report['results'][cls.name] = run_scenario(cls(args.requests, args.seed), client, db, headers)
+    db.destroy_db()
+
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Workloads for the HTTP benchmark. Each scenario seeds the database it needs and then yields
+requests as (endpoint, method, url, body) where endpoint is the name used in the report.
+"""
+
+import json
+import random
+
+SEVERITIES = ['critical', 'major', 'minor', 'warning']
+ENVIRONMENTS = ['Production', 'Development']
+SERVICES = ['Web', 'Database', 'Network', 'Storage', 'Queue']
+EVENTS = ['node_down', 'node_marginal', 'node_up']
+
+
+def make_alert(resource, event='node_down', severity='major', **kwargs):
+
+    alert = {
+        'resource': resource,
+        'event': event,
+        'environment': random.choice(ENVIRONMENTS),
+        'severity': severity,
+        'correlate': EVENTS,
+        'service': [random.choice(SERVICES)],
+        'group': 'Benchmark',
+        'value': str(random.randint(0, 100)),
+        'text': 'benchmark alert for %s' % resource,
+        'tags': ['benchmark', 'rack%d' % random.randint(1, 20)],
+        'attributes': {'region': random.choice(['EU', 'US', 'APAC'])},
+        'origin': 'benchmark',
+        'type': 'benchmarkAlert',
+        'timeout': 86400
+    }
+    alert.update(kwargs)
+    return alert
+
+
+class Scenario(object):
+
+    name = None
+    description = None
+
+    def __init__(self, requests=1000, seed=1000):
+
+        self.count = requests
+        self.seed_count = seed
+
+    def setup(self, client, headers):
+        """
+        Seed the database before the timed requests, not measured.
+        """
+        pass
+
+    def requests(self):
+
+        raise NotImplementedError
+
+    def seed_alerts(self, client, headers, count, history=1):
+
+        for i in range(count):
+            resource = 'seed%05d' % i
+            for severity in random.sample(SEVERITIES, history):
+                client.post('/alert', data=json.dumps(make_alert(resource, severity=severity)), headers=headers)
+
+
+class AlertStorm(Scenario):
+
+    name = 'alert-storm'
+    description = 'new alerts, every one for a different resource'
+
+    def requests(self):
+
+        for i in range(self.count):
+            alert = make_alert('storm%06d' % i, severity=random.choice(SEVERITIES))
+            yield 'POST /alert', 'POST', '/alert', alert
+
+
+class Duplicates(Scenario):
+
+    name = 'duplicates'
+    description = 'the same 20 alerts sent again and again'
+
+    def requests(self):
+
+        alerts = [make_alert('dup%02d' % i) for i in range(20)]
+        for i in range(self.count):
+            yield 'POST /alert', 'POST', '/alert', alerts[i % len(alerts)]
+
+
+class Correlated(Scenario):
+
+    name = 'correlate'
+    description = '50 resources changing between correlated events and severities'
+
+    def requests(self):
+
+        for i in range(self.count):
+            event = random.choice(EVENTS)
+            severity = 'normal' if event == 'node_up' else random.choice(SEVERITIES)
+            yield 'POST /alert', 'POST', '/alert', make_alert('corr%02d' % random.randint(0, 49), event=event, severity=severity)
+
+
+class ConsolePolling(Scenario):
+
+    name = 'console'
+    description = 'web console refreshing alert lists and counts'
+
+    def setup(self, client, headers):
+
+        self.seed_alerts(client, headers, self.seed_count)
+
+    def requests(self):
+
+        urls = [
+            ('GET /alerts', '/alerts?status=open&status=ack&profile=console'),
+            ('GET /alerts', '/alerts?environment=Production&sort-by=severity&limit=20&page=2'),
+            ('GET /alerts', '/alerts?service=Web&q=%7B%22attributes.region%22%3A%22EU%22%7D'),
+            ('GET /alerts/count', '/alerts/count?status=open&status=ack'),
+            ('GET /environments', '/environments'),
+            ('GET /services', '/services')
+        ]
+        for i in range(self.count):
+            endpoint, url = urls[i % len(urls)]
+            yield endpoint, 'GET', url, None
+
+
+class Top10(Scenario):
+
+    name = 'top10'
+    description = 'dashboards showing the most frequent and flapping alerts'
+
+    def setup(self, client, headers):
+
+        self.seed_alerts(client, headers, self.seed_count, history=3)
+
+    def requests(self):
+
+        urls = [
+            ('GET /alerts/top10/count', '/alerts/top10/count'),
+            ('GET /alerts/top10/count', '/alerts/top10/count?group-by=resource&environment=Production'),
+            ('GET /alerts/top10/flapping', '/alerts/top10/flapping')
+        ]
+        for i in range(self.count):
+            endpoint, url = urls[i % len(urls)]
+            yield endpoint, 'GET', url, None
+
+
+class Webhooks(Scenario):
+
+    name = 'webhooks'
+    description = 'Prometheus and Grafana notifications with 10 alerts each'
+
+    @staticmethod
+    def prometheus(i):
+
+        return {
+            'receiver': 'alerta',
+            'status': 'firing',
+            'alerts': [
+                {
+                    'status': 'firing',
+                    'labels': {
+                        'alertname': 'HighLatency',
+                        'instance': 'host%03d:9100' % ((i * 10 + n) % 500),
+                        'job': 'node',
+                        'severity': random.choice(SEVERITIES),
+                        'service': random.choice(SERVICES)
+                    },
+                    'annotations': {
+                        'summary': 'Request latency is above threshold'
+                    },
+                    'startsAt': '2017-08-03T15:17:37.804-04:00',
+                    'endsAt': '0001-01-01T00:00:00Z',
+                    'generatorURL': 'http://prometheus:9090/graph'
+                } for n in range(10)
+            ],
+            'externalURL': 'http://alertmanager:9093',
+            'version': '4'
+        }
+
+    @staticmethod
+    def grafana(i):
+
+        return {
+            'evalMatches': [
+                {'value': random.randint(80, 100), 'metric': 'server%03d.cpu' % ((i * 10 + n) % 500), 'tags': None}
+                for n in range(10)
+            ],
+            'message': 'CPU usage is high',
+            'ruleId': i % 20,
+            'ruleName': 'High CPU',
+            'ruleUrl': 'http://grafana:3000/',
+            'state': 'alerting',
+            'title': '[Alerting] High CPU'
+        }
+
+    def requests(self):
+
+        for i in range(self.count):
+            if i % 2:
+                yield 'POST /webhooks/grafana', 'POST', '/webhooks/grafana', self.grafana(i)
+            else:
+                yield 'POST /webhooks/prometheus', 'POST', '/webhooks/prometheus', self.prometheus(i)
+
+
+SCENARIOS = [AlertStorm, Duplicates, Correlated, ConsolePolling, Top10, Webhooks]
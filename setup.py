@@ -17,7 +17,7 @@ setuptools.setup(
     license='Apache License 2.0',
     author='Nick Satterly',
     author_email='nick.satterly@theguardian.com',
-    packages=setuptools.find_packages(exclude=['bin', 'tests']),
+    packages=setuptools.find_packages(exclude=['bin', 'tests', 'benchmarks', 'benchmarks.*']),
     install_requires=[
         'Flask>=0.10.1',
         'Flask-Cors>=3.0.2',
@@ -1,6 +1,11 @@
 
 import unittest
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 try:
     import simplejson as json
 except ImportError:
@@ -180,6 +185,37 @@ class AlertTestCase(unittest.TestCase):
         response = self.app.delete('/alert/' + alert_id)
         self.assertEqual(response.status_code, 200)
 
+    def test_alert_profiles(self):
+
+        # create alert
+        response = self.app.post('/alert', data=json.dumps(self.fatal_alert), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+        response = self.app.get('/alerts?profile=summary')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['alerts'][0]['resource'], self.resource)
+        self.assertEqual(data['alerts'][0]['severity'], 'critical')
+        self.assertNotIn('rawData', data['alerts'][0])
+        self.assertNotIn('attributes', data['alerts'][0])
+        self.assertNotIn('history', data['alerts'][0])
+
+        response = self.app.get('/alerts?profile=console')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['alerts'][0]['attributes']['foo'], 'abc def')
+        self.assertNotIn('rawData', data['alerts'][0])
+        self.assertNotIn('history', data['alerts'][0])
+
+        response = self.app.get('/alerts?profile=full')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertIn('rawData', data['alerts'][0])
+        self.assertIn('history', data['alerts'][0])
+
+        response = self.app.get('/alerts?profile=doesnotexist')
+        self.assertEqual(response.status_code, 400)
+
     def test_alert_status(self):
 
         # create alert (status=open)
@@ -314,6 +350,26 @@ class AlertTestCase(unittest.TestCase):
         data = json.loads(response.data.decode('utf-8'))
         self.assertEqual(data['alert']['status'], 'open')
 
+    def test_duplicate_race(self):
+
+        if app.config['DATABASE_ENGINE'] == 'memory':
+            self.skipTest('the memory database has no unique indexes')
+
+        response = self.app.post('/alert', data=json.dumps(self.fatal_alert), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        alert_id = json.loads(response.data.decode('utf-8'))['id']
+
+        # another request created the same alert after this one checked for duplicates
+        with mock.patch.object(db, 'is_duplicate', return_value=False), mock.patch.object(db, 'is_correlated', return_value=False):
+            response = self.app.post('/alert', data=json.dumps(self.fatal_alert), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['id'], alert_id)
+        self.assertEqual(data['alert']['duplicateCount'], 1)
+
+        response = self.app.get('/alerts?resource=' + self.resource)
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['total'], 1)
+
     def test_alert_tagging(self):
 
         # create alert
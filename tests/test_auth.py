@@ -1,12 +1,23 @@
 
+import time
 import unittest
 
+from datetime import datetime, timedelta
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 try:
     import simplejson as json
 except ImportError:
     import json
 
+import jwt
+
 from alerta.app import app, db
+from alerta.app.auth import flush_key_usage, scopes, customer_match
 
 
 class AuthTestCase(unittest.TestCase):
@@ -67,6 +78,51 @@ class AuthTestCase(unittest.TestCase):
         response = self.app.delete('/key/' + rw_api_key, headers=self.headers)
         self.assertEqual(response.status_code, 200)
 
+    def test_key_cache(self):
+
+        payload = {
+            'user': 'rw-demo-key',
+            'type': 'read-write'
+        }
+
+        response = self.app.post('/key', data=json.dumps(payload), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        rw_api_key = json.loads(response.data.decode('utf-8'))['key']
+
+        for _ in range(3):
+            response = self.app.get('/alerts', headers={'Authorization': 'Key ' + rw_api_key})
+            self.assertEqual(response.status_code, 200)
+
+        # usage is counted in memory until flushed
+        flush_key_usage()
+        key_info = db.get_keys({'key': rw_api_key})[0]
+        self.assertEqual(key_info['count'], 3)
+        self.assertIsNotNone(key_info['lastUsedTime'])
+
+        # deleted key is removed from cache immediately
+        response = self.app.delete('/key/' + rw_api_key, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.app.get('/alerts', headers={'Authorization': 'Key ' + rw_api_key})
+        self.assertEqual(response.status_code, 401)
+
+    def test_key_usage_flushed_by_requests(self):
+
+        interval = app.config['API_KEY_USAGE_FLUSH_INTERVAL']
+        app.config['API_KEY_USAGE_FLUSH_INTERVAL'] = 1
+        try:
+            flush_key_usage()
+            response = self.app.get('/alerts', headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(db.get_keys({'key': self.api_key})[0]['count'], 0)
+
+            # without housekeeping, the next request after the interval writes usage
+            time.sleep(1.1)
+            response = self.app.get('/alerts', headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(db.get_keys({'key': self.api_key})[0]['count'], 2)
+        finally:
+            app.config['API_KEY_USAGE_FLUSH_INTERVAL'] = interval
+
     def test_readonly_key(self):
 
         payload = {
@@ -208,3 +264,42 @@ class AuthTestCase(unittest.TestCase):
         # delete customer mapping
         response = self.app.delete('/customer/' + customer_id, headers=self.headers)
         self.assertEqual(response.status_code, 200)
+
+    def test_authz_snapshot(self):
+
+        db.create_perm(['read'], 'readers')
+        db.create_perm(['write:alerts'], 'ops')
+        db.create_customer('Foo Corp', 'foo')
+        db.create_customer('Bar Corp', 'bar')
+
+        self.assertEqual(scopes('jane', ['readers', 'ops', 'other']), set(['read', 'write:alerts']))
+        self.assertEqual(customer_match('jane', ['other', 'bar', 'foo']), 'Bar Corp')
+
+        # changes are picked up without restart
+        db.create_customer('Jane Corp', 'jane')
+        self.assertEqual(customer_match('jane', ['bar']), 'Jane Corp')
+
+    def test_token_cache(self):
+
+        payload = {
+            'iss': 'http://localhost/',
+            'sub': 'jane',
+            'aud': 'http://localhost/',
+            'exp': datetime.utcnow() + timedelta(seconds=2),
+            'login': 'jane@debeauharnais.fr',
+            'scope': 'read write'
+        }
+        token = jwt.encode(payload, key=app.config['SECRET_KEY']).decode('unicode_escape')
+        headers = {'Authorization': 'Bearer ' + token}
+
+        with mock.patch.object(jwt, 'decode', wraps=jwt.decode) as decode:
+            for _ in range(3):
+                response = self.app.get('/alerts', headers=headers)
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(decode.call_count, 1, 'token is decoded once and its claims are cached')
+
+            # cached claims do not outlive the token
+            time.sleep(3)
+            response = self.app.get('/alerts', headers=headers)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(decode.call_count, 2)
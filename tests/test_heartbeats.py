@@ -60,6 +60,17 @@ class HeartbeatTestCase(unittest.TestCase):
         response = self.app.delete('/heartbeat/' + heartbeat_id)
         self.assertEqual(response.status_code, 200)
 
+    def test_heartbeat_timeout(self):
+
+        response = self.app.post('/heartbeat', data=json.dumps(dict(self.heartbeat, timeout='300')), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['heartbeat']['timeout'], 300)
+
+        for timeout in [True, 'bar', [300]]:
+            response = self.app.post('/heartbeat', data=json.dumps(dict(self.heartbeat, timeout=timeout)), headers=self.headers)
+            self.assertEqual(response.status_code, 400, timeout)
+
     def test_heartbeat_not_found(self):
 
         response = self.app.get('/heartbeat/doesnotexist')
@@ -75,3 +86,27 @@ class HeartbeatTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.data.decode('utf-8'))
         self.assertGreater(data['total'], 0, "total heartbeats > 0")
+
+    def test_bulk_heartbeats(self):
+
+        heartbeats = [{'origin': '%s/%s' % (self.origin, i), 'timeout': 120} for i in range(100)]
+        heartbeats.append(heartbeats[0])  # repeated origin is saved once
+
+        response = self.app.post('/heartbeats/bulk', data=json.dumps(heartbeats), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 100)
+
+        # resend updates existing heartbeats
+        response = self.app.post('/heartbeats/bulk', data=json.dumps(heartbeats), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+        response = self.app.get('/heartbeats')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 100)
+
+        # invalid heartbeat rejects whole request
+        response = self.app.post('/heartbeats/bulk', data=json.dumps([{'origin': 'foo', 'timeout': 'bar'}]), headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/heartbeats/bulk', data=json.dumps([{'origin': 'foo', 'timeout': True}]), headers=self.headers)
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,282 @@
+import time
+import unittest
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from alerta.app import app, db
+from alerta.app.exceptions import RejectException
+from alerta.app.housekeeping import Scheduler, expire_alert, expire_alerts, check_heartbeats, apply_retention_policies, archive_alerts
+from alerta.app.utils import plugins
+from alerta.plugins import PluginBase
+
+
+class HousekeepingTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        app.config['TESTING'] = True
+        app.config['AUTH_REQUIRED'] = False
+        self.app = app.test_client()
+
+        self.headers = {
+            'Content-type': 'application/json'
+        }
+
+    def tearDown(self):
+
+        db.destroy_db()
+
+    def _create_alert(self, resource, timeout):
+
+        alert = {
+            'event': 'node_down',
+            'resource': resource,
+            'environment': 'Production',
+            'service': ['Network'],
+            'severity': 'major',
+            'timeout': timeout
+        }
+        response = self.app.post('/alert', data=json.dumps(alert), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        return json.loads(response.data.decode('utf-8'))['id']
+
+    def test_expire_alerts(self):
+
+        timed_out_id = self._create_alert('net01', timeout=1)
+        no_timeout_id = self._create_alert('net02', timeout=0)
+        active_id = self._create_alert('net03', timeout=3600)
+
+        time.sleep(2)
+        self.assertEqual(expire_alerts(), 1)
+        self.assertEqual(expire_alerts(), 0)
+
+        response = self.app.get('/alert/' + timed_out_id)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['alert']['status'], 'expired')
+        self.assertEqual(data['alert']['history'][-1]['text'], 'alert timeout status change')
+
+        for alert_id in [no_timeout_id, active_id]:
+            response = self.app.get('/alert/' + alert_id)
+            data = json.loads(response.data.decode('utf-8'))
+            self.assertEqual(data['alert']['status'], 'open')
+
+    def test_expire_alert_received_again(self):
+
+        alert_id = self._create_alert('net01', timeout=1)
+        time.sleep(2)
+        alerts = db.get_expired_alerts()
+        self.assertEqual([a.id for a in alerts], [alert_id])
+
+        self._create_alert('net01', timeout=3600)  # received again after the expired alerts were fetched
+        self.assertFalse(expire_alert(alerts[0]))
+
+        response = self.app.get('/alert/' + alert_id)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['alert']['status'], 'open')
+        self.assertNotIn('expired', [h.get('status') for h in data['alert']['history']])
+
+    def test_expire_alerts_in_batches(self):
+
+        batch_size = app.config['ALERT_EXPIRE_BATCH_SIZE']
+        app.config['ALERT_EXPIRE_BATCH_SIZE'] = 2
+
+        for i in range(5):
+            self._create_alert('net%02d' % i, timeout=1)
+
+        time.sleep(2)
+        try:
+            self.assertEqual(expire_alerts(), 5)
+        finally:
+            app.config['ALERT_EXPIRE_BATCH_SIZE'] = batch_size
+
+    def test_expire_alerts_rejected(self):
+
+        batch_size = app.config['ALERT_EXPIRE_BATCH_SIZE']
+        app.config['ALERT_EXPIRE_BATCH_SIZE'] = 2
+        plugins.plugins['reject_expiry'] = RejectExpiry(['net00', 'net01', 'net02', 'net03'])
+
+        ids = [self._create_alert('net%02d' % i, timeout=1) for i in range(5)]
+
+        time.sleep(2)
+        try:
+            self.assertEqual(expire_alerts(), 1)
+            self.assertEqual(expire_alerts(), 0)
+        finally:
+            app.config['ALERT_EXPIRE_BATCH_SIZE'] = batch_size
+            del plugins.plugins['reject_expiry']
+
+        response = self.app.get('/alert/' + ids[4])
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['alert']['status'], 'expired')
+        response = self.app.get('/alert/' + ids[0])
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['alert']['status'], 'open')
+
+    def test_stale_heartbeats(self):
+
+        heartbeat = {
+            'origin': 'net01/agent',
+            'tags': ['foo'],
+            'timeout': 1
+        }
+        response = self.app.post('/heartbeat', data=json.dumps(heartbeat), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+        time.sleep(2)
+        self.assertEqual(check_heartbeats(), (1, 0))
+        self.assertEqual(check_heartbeats(), (0, 0))
+
+        response = self.app.get('/alerts?resource=net01/agent')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['alerts'][0]['event'], 'HeartbeatFail')
+        self.assertEqual(data['alerts'][0]['severity'], app.config['HEARTBEAT_ALERT_SEVERITY'])
+
+        heartbeat['timeout'] = 3600
+        response = self.app.post('/heartbeat', data=json.dumps(heartbeat), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(check_heartbeats(), (0, 1))
+
+        response = self.app.get('/alerts?resource=net01/agent')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['alerts'][0]['event'], 'HeartbeatOK')
+        self.assertEqual(data['alerts'][0]['severity'], 'normal')
+
+    def test_heartbeats_without_expire_time(self):
+
+        for origin, timeout in [('net01/agent', 1), ('net02/agent', 3600)]:
+            response = self.app.post('/heartbeat', data=json.dumps({'origin': origin, 'timeout': timeout}), headers=self.headers)
+            self.assertEqual(response.status_code, 201)
+        db.get_db().heartbeats.update_many({}, {'$unset': {'expireTime': '', 'status': ''}})  # saved by an earlier release
+
+        time.sleep(2)
+        self.assertEqual(check_heartbeats(), (1, 0))
+        self.assertEqual(db.backfill_heartbeat_expiry(), 0)
+
+        response = self.app.get('/alerts?event=HeartbeatFail')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual([a['resource'] for a in data['alerts']], ['net01/agent'])
+
+    def test_retention_policies(self):
+
+        closed_id = self._create_alert('net01', timeout=3600)
+        open_id = self._create_alert('net02', timeout=3600)
+
+        response = self.app.post('/alert/' + closed_id + '/status', data=json.dumps({'status': 'closed'}), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        retention_policies = app.config['RETENTION_POLICIES']
+        app.config['RETENTION_POLICIES'] = [{'status': ['closed', 'expired'], 'age': 1}]
+
+        time.sleep(2)
+        try:
+            self.assertEqual(apply_retention_policies(), 1)
+        finally:
+            app.config['RETENTION_POLICIES'] = retention_policies
+
+        response = self.app.get('/alert/' + closed_id)
+        self.assertEqual(response.status_code, 404)
+        response = self.app.get('/alert/' + open_id)
+        self.assertEqual(response.status_code, 200)
+
+    def test_retention_rechecks_policy(self):
+
+        closed_id = self._create_alert('net01', timeout=3600)
+        reopened_id = self._create_alert('net02', timeout=3600)
+        for alert_id in [closed_id, reopened_id]:
+            response = self.app.post('/alert/' + alert_id + '/status', data=json.dumps({'status': 'closed'}), headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+
+        query = {'status': {'$in': ['closed']}}
+        ids = db.get_alert_ids(query, limit=10)
+        self.assertEqual(sorted(ids), sorted([closed_id, reopened_id]))
+
+        # reopened between finding and deleting the batch
+        response = self.app.post('/alert/' + reopened_id + '/status', data=json.dumps({'status': 'open'}), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(db.delete_alerts(ids, query), 1)
+        response = self.app.get('/alert/' + reopened_id)
+        self.assertEqual(response.status_code, 200)
+
+    def test_archive_alerts(self):
+
+        closed_id = self._create_alert('net01', timeout=3600)
+        self._create_alert('net02', timeout=3600)
+
+        response = self.app.put('/alert/' + closed_id + '/status', data=json.dumps({'status': 'closed'}), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        archive_after = app.config['ARCHIVE_AFTER']
+        app.config['ARCHIVE_AFTER'] = 1
+
+        time.sleep(2)
+        try:
+            self.assertEqual(archive_alerts(), 1)
+        finally:
+            app.config['ARCHIVE_AFTER'] = archive_after
+
+        response = self.app.get('/alerts?status=closed')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 0)
+
+        response = self.app.get('/alerts?status=closed&archive=true')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['alerts'][0]['id'], closed_id)
+
+        response = self.app.get('/alerts/history?resource=net01&archive=true')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertIn('closed', [h.get('status') for h in data['history']])
+
+    def test_leases(self):
+
+        token = db.acquire_lease('test', 'node1', ttl=30)
+        self.assertIsNotNone(token)
+        self.assertIsNone(db.acquire_lease('test', 'node2', ttl=30))
+        self.assertEqual(db.acquire_lease('test', 'node1', ttl=30), token)  # renewal keeps token
+
+        self.assertTrue(db.release_lease('test', 'node1'))
+        self.assertGreater(db.acquire_lease('test', 'node2', ttl=30), token)
+
+    def test_leader_only_jobs(self):
+
+        runs = list()
+
+        leader = Scheduler(lease='test')
+        leader.add_job(lambda: runs.append('leader'), interval=60)
+        other = Scheduler(lease='test')
+        other.add_job(lambda: runs.append('other'), interval=60)
+        other.add_job(lambda: runs.append('every'), interval=60, leader_only=False)
+
+        leader.run_pending(force=True)
+        other.run_pending(force=True)
+        self.assertEqual(runs, ['leader', 'every'])
+
+        leader.release_lease()
+        other.run_pending(force=True)
+        self.assertEqual(runs, ['leader', 'every', 'other', 'every'])
+
+
+class RejectExpiry(PluginBase):
+
+    def __init__(self, resources):
+
+        super(RejectExpiry, self).__init__()
+        self.resources = resources
+
+    def pre_receive(self, alert):
+        return alert
+
+    def post_receive(self, alert):
+        return
+
+    def status_change(self, alert, status, text):
+        if alert.resource in self.resources:
+            raise RejectException('expiry of %s not allowed' % alert.resource)
+        return alert, status, text
@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import requests
+
+from alerta.app import app
+from alerta.app.httpclient import HTTPClient
+from alerta.app.metrics import Timer
+
+
+class HTTPClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        app.config['TESTING'] = True
+        self.http = HTTPClient()
+
+    def test_default_timeouts(self):
+
+        with mock.patch.object(requests.Session, 'request', return_value='ok') as request:
+            self.assertEqual(self.http.get('http://example.com/a'), 'ok')
+            self.http.post('http://example.com/b', json={}, timeout=1)
+
+        args, kwargs = request.call_args_list[0]
+        self.assertEqual(args, ('GET', 'http://example.com/a'))
+        self.assertEqual(kwargs['timeout'], (app.config['HTTP_CLIENT_CONNECT_TIMEOUT'], app.config['HTTP_CLIENT_READ_TIMEOUT']))
+
+        args, kwargs = request.call_args_list[1]
+        self.assertEqual(args, ('POST', 'http://example.com/b'))
+        self.assertEqual(kwargs['timeout'], 1)
+        self.assertEqual(kwargs['json'], {})
+
+    def test_retries_mounted(self):
+
+        session = self.http.session
+        for prefix in ['http://', 'https://']:
+            adapter = session.get_adapter(prefix + 'example.com')
+            self.assertEqual(adapter.max_retries.total, app.config['HTTP_CLIENT_RETRIES'])
+            self.assertIn(503, adapter.max_retries.status_forcelist)
+
+    def test_reinit_after_fork(self):
+
+        session = self.http.session
+        self.assertIs(self.http.session, session)
+
+        with mock.patch('os.getpid', return_value=self.http.pid + 1):
+            forked = self.http.session
+            self.assertIsNot(forked, session)
+            self.assertIs(self.http.session, forked)
+        self.assertIsNot(self.http.session, forked)
+
+    def test_host_timers(self):
+
+        with mock.patch.object(requests.Session, 'request', return_value='ok'):
+            self.http.get('http://api.example.com:8080/one')
+            self.http.get('https://api.example.com/two')
+            self.http.get('http://other.example.com/')
+
+        self.assertEqual(sorted(self.http.timers), ['api.example.com', 'other.example.com'])
+        timer = [t for t in Timer.get_timers() if t.group == 'http' and t.name == 'api_example_com'][0]
+        self.assertGreaterEqual(timer.count, 2)
+
+        count = timer.count
+        with mock.patch.object(requests.Session, 'request', side_effect=requests.ConnectionError('refused')):
+            with self.assertRaises(requests.ConnectionError):
+                self.http.get('http://api.example.com/three')
+        timer = [t for t in Timer.get_timers() if t.group == 'http' and t.name == 'api_example_com'][0]
+        self.assertEqual(timer.count, count + 1)  # failed requests are timed too
+
+    def test_gather(self):
+
+        started = threading.Event()
+
+        def slow():
+            started.wait(5)
+            return 'slow'
+
+        def fast():
+            started.set()
+            return 'fast'
+
+        self.assertEqual(self.http.gather(slow, fast, lambda: 3), ['slow', 'fast', 3])
+
+        def fail():
+            time.sleep(0.1)
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            self.http.gather(lambda: 1, fail, lambda: 3)
@@ -0,0 +1,84 @@
+
+import io
+import sys
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import requests
+
+from alerta.loadgen import LoadGenerator, Replay, read_traffic, schedule, repeat
+
+
+class LoadGeneratorTestCase(unittest.TestCase):
+
+    def test_parse_request(self):
+
+        replay = Replay.parse(json.dumps({
+            'time': '2017-08-03T15:17:37.500Z',
+            'path': '/webhooks/prometheus',
+            'body': {'alerts': []}
+        }))
+        self.assertEqual(replay.method, 'POST')
+        self.assertEqual(replay.endpoint, 'POST /webhooks/prometheus')
+        self.assertEqual(replay.timestamp, 1501773457.5)
+
+        replay = Replay.parse(json.dumps({'time': 1501773459, 'path': 'alerts?status=open'}))
+        self.assertEqual(replay.method, 'GET')
+        self.assertEqual(replay.path, '/alerts?status=open')
+        self.assertEqual(replay.endpoint, 'GET /alerts')
+
+    def test_parse_alert(self):
+
+        replay = Replay.parse(json.dumps({'resource': 'web01', 'event': 'node_down'}))
+        self.assertEqual(replay.endpoint, 'POST /alert')
+        self.assertEqual(replay.body['resource'], 'web01')
+
+        with self.assertRaises(ValueError):
+            Replay.parse(json.dumps({'foo': 'bar'}))
+
+    def test_schedule(self):
+
+        traffic = [Replay('GET', '/alerts', timestamp=t) for t in [100.0, 101.0, 101.0, 110.0]]
+
+        self.assertEqual([d for d, _ in schedule(traffic)], [0.0, 0.0, 0.0, 0.0])
+        self.assertEqual([d for d, _ in schedule(traffic, speedup=10)], [0.0, 0.1, 0.1, 1.0])
+        self.assertEqual([d for d, _ in schedule(traffic, rate=2)], [0.0, 0.5, 1.0, 1.5])
+        self.assertEqual([round(d, 2) for d, _ in schedule(traffic, rate=20, speedup=10)], [0.0, 0.1, 0.15, 1.0])
+
+        looped = [d for d, _ in schedule(repeat(traffic, 2), speedup=1)]
+        self.assertEqual(looped, [0.0, 1.0, 1.0, 10.0, 11.0, 12.0, 12.0, 21.0])
+
+    def test_read_stdin(self):
+
+        stdin = io.StringIO(u'{"path": "/alerts"}\n\n{"path": "/heartbeats"}\n')
+        with mock.patch.object(sys, 'stdin', stdin):
+            self.assertEqual([r.path for r in read_traffic(['-'])], ['/alerts', '/heartbeats'])
+        self.assertFalse(stdin.closed)
+
+    def test_request_errors(self):
+
+        response = mock.Mock(status_code=201)
+        traffic = [
+            Replay('POST', '/alert', body={'resource': 'web01'}),
+            Replay('POST', '/alert', headers=['not', 'a', 'dict']),
+            Replay('POST', '/alert', body=set(['not serialisable'])),
+            Replay('GET', '/alerts')
+        ] * 3
+
+        generator = LoadGenerator('http://localhost:8080', concurrency=2)
+        with mock.patch.object(requests.Session, 'request', return_value=response):
+            report = generator.run(schedule(traffic))
+
+        total = report['results']['total']
+        self.assertEqual(total['requests'], 12, 'workers carry on after a bad request')
+        self.assertEqual(total['errors'], 6)
+        self.assertEqual(total['status'], {'201': 6, 'ValueError': 3, 'TypeError': 3})
@@ -52,3 +52,141 @@ class AlertTestCase(unittest.TestCase):
             if metric['name'] == 'total':
                 self.assertEqual(metric['value'], 1)
 
+    def test_slow_queries(self):
+
+        threshold = app.config['SLOW_QUERY_THRESHOLD']
+        app.config['SLOW_QUERY_THRESHOLD'] = 0.000001  # every command
+        try:
+            response = self.app.delete('/management/queries')
+            self.assertEqual(response.status_code, 200)
+
+            response = self.app.post('/alert', data=json.dumps(self.major_alert), headers=self.headers)
+            self.assertEqual(response.status_code, 201)
+            for group in ['Network', 'Web']:
+                response = self.app.get('/alerts?group=%s&environment=Production' % group, headers=self.headers)
+                self.assertEqual(response.status_code, 200)
+        finally:
+            app.config['SLOW_QUERY_THRESHOLD'] = threshold
+
+        response = self.app.get('/management/queries?limit=100', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['status'], 'ok')
+
+        shapes = [q for q in data['queries'] if q['collection'] == 'alerts' and q['command'] == 'find'
+                  and 'group' in q['shape']['filter']]
+        self.assertEqual(len(shapes), 1, 'queries for different values have the same shape')
+        query = shapes[0]
+        self.assertEqual(query['count'], 2)
+        self.assertEqual(query['shape']['filter']['group'], '?')
+        self.assertIn('explain', query)
+        self.assertEqual([f for f, _ in query['suggestedIndexes'][0]['key']][:2], ['environment', 'group'])
+
+        response = self.app.get('/management/queries?explain=false&limit=1', headers=self.headers)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(len(data['queries']), 1)
+        self.assertNotIn('explain', data['queries'][0])
+
+    def test_suggest_index(self):
+
+        from alerta.app.database import slowlog
+
+        self.assertEqual(slowlog.suggest_index({'status': 'open', 'lastReceiveTime': {'$gt': 0}, 'environment': {'$in': ['Production']}},
+                                               [('severity', -1)]),
+                         [([('environment', 1), ('status', 1), ('severity', -1), ('lastReceiveTime', 1)], 2)])
+        self.assertEqual(slowlog.suggest_index({'_id': 'abc'}, []), [])
+
+        # equality fields in any order
+        self.assertEqual(slowlog.covered_by([('status', 1), ('environment', 1)], 2, {'env_status': [('environment', 1), ('status', 1), ('x', 1)]}),
+                         'env_status')
+        self.assertIsNone(slowlog.covered_by([('status', 1)], 1, {'env_status': [('environment', 1), ('status', 1)]}))
+
+        # sort and range fields by position and direction
+        key = [('environment', 1), ('status', 1), ('severity', -1)]
+        self.assertIsNone(slowlog.covered_by(key, 2, {'sev_status_env': [('severity', 1), ('status', 1), ('environment', 1)]}))
+        self.assertIsNone(slowlog.covered_by([('environment', 1), ('severity', -1), ('createTime', 1)], 1,
+                                             {'env_sev_time': [('environment', 1), ('severity', 1), ('createTime', 1)]}))
+        self.assertEqual(slowlog.covered_by(key, 2, {'status_env_sev': [('status', 1), ('environment', 1), ('severity', -1)]}), 'status_env_sev')
+        self.assertEqual(slowlog.covered_by([('severity', -1)], 0, {'severity': [('severity', 1)]}), 'severity', 'read backwards')
+        self.assertIsNone(slowlog.covered_by([('environment', 1), ('lastReceiveTime', 1)], 1,
+                                             {'time_env': [('lastReceiveTime', 1), ('environment', 1)]}))
+
+    def test_sync_indexes(self):
+
+        report = db.sync_indexes()
+        self.assertTrue(report)
+        self.assertFalse([i for i in report if i['state'] in ['missing', 'conflict', 'failed']])
+
+        if app.config['DATABASE_ENGINE'] == 'sqlite':
+            from alerta.app.database.sqlite import FixedIndexError
+
+            self.assertIn({'collection': 'alerts', 'name': 'alerts_text', 'state': 'skipped'},
+                          [dict((k, i[k]) for k in ['collection', 'name', 'state']) for i in report])
+            alerts = db.get_db()['alerts']
+            self.assertEqual(alerts.create_index([('status', 1), ('lastReceiveTime', -1)]), 'alerts_status_lastReceiveTime')
+            with self.assertRaises(FixedIndexError):
+                alerts.create_index([('service', 1)])
+            with self.assertRaises(FixedIndexError):
+                alerts.drop_index('alerts_status_lastReceiveTime')
+
+            # unique like MongoDB, with a missing customer the same as any other
+            from pymongo.errors import DuplicateKeyError
+
+            heartbeats = db.get_db()['heartbeats']
+            heartbeats.insert_one({'origin': 'net01/agent', 'customer': None})
+            with self.assertRaises(DuplicateKeyError):
+                heartbeats.insert_one({'origin': 'net01/agent'})
+            heartbeats.insert_one({'origin': 'net01/agent', 'customer': 'foo'})
+
+            # databases created before the index was unique are upgraded
+            conn = db.get_db().conn
+            conn.execute('DROP INDEX heartbeats_origin_customer')
+            conn.execute('CREATE INDEX heartbeats_origin_customer ON heartbeats (origin, customer)')
+            heartbeats.create_table(conn)
+            self.assertTrue(heartbeats.index_information()['heartbeats_origin_customer'].get('unique'))
+
+    def test_profile(self):
+
+        import pstats
+        import tempfile
+        import threading
+
+        stopped = threading.Event()
+        threaded = {'wsgi.multithread': True}
+
+        def send_alerts():
+            client = app.test_client()
+            while not stopped.is_set():
+                client.post('/alert', data=json.dumps(self.major_alert), headers=self.headers)
+
+        thread = threading.Thread(target=send_alerts)
+        thread.start()
+        try:
+            response = self.app.get('/management/profile?seconds=0.5&interval=2', environ_overrides=threaded)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(int(response.headers['X-Profile-Samples']), 0)
+            stacks = response.data.decode('utf-8').splitlines()
+            self.assertTrue(any('receive_alert' in s for s in stacks))
+            self.assertFalse(any('profile (' in s for s in stacks), 'the profile request is not sampled')
+            self.assertTrue(all(s.rsplit(' ', 1)[1].isdigit() for s in stacks))
+
+            response = self.app.get('/management/profile?seconds=0.5&interval=2&format=pstats', environ_overrides=threaded)
+            self.assertEqual(response.status_code, 200)
+        finally:
+            stopped.set()
+            thread.join()
+
+        with tempfile.NamedTemporaryFile(suffix='.pstats') as f:
+            f.write(response.data)
+            f.flush()
+            stats = pstats.Stats(f.name)
+        self.assertTrue(any(func[2] == 'receive_alert' for func in stats.stats))
+
+        response = self.app.get('/management/profile?seconds=3600', environ_overrides=threaded)
+        self.assertEqual(response.status_code, 400)
+        for params in ['seconds=nan', 'seconds=inf', 'interval=nan', 'interval=inf']:
+            response = self.app.get('/management/profile?' + params, environ_overrides=threaded)
+            self.assertEqual(response.status_code, 400, params)
+
+        response = self.app.get('/management/profile?seconds=0.5')
+        self.assertEqual(response.status_code, 409, 'the profile request would block the only request thread')
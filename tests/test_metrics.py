@@ -2,7 +2,7 @@
 import time
 import unittest
 
-from alerta.app.metrics import Gauge, Timer
+from alerta.app.metrics import Gauge, Histogram, Timer
 
 
 class MetricsTestCase(unittest.TestCase):
@@ -27,3 +27,118 @@ class MetricsTestCase(unittest.TestCase):
         timer = [t for t in Timer.get_timers() if t.title == 'Test timer'][0]
         self.assertGreaterEqual(timer.count, 1)
         self.assertGreaterEqual(timer.total_time, 999)
+
+    def test_database_commands(self):
+
+        from alerta.app import app, db
+        from alerta.app.database import monitor
+
+        app.config['TESTING'] = True
+        app.config['AUTH_REQUIRED'] = False
+        app.config['DATABASE_COMMANDS_HEADER'] = True
+        client = app.test_client()
+        monitor.flush_endpoint_stats()  # requests made by other tests
+        db.destroy_db()
+
+        alert = '{"resource": "net01", "event": "node_down", "environment": "Production", "service": ["Network"]}'
+        response = client.post('/alert', data=alert, headers={'Content-type': 'application/json'})
+        self.assertEqual(response.status_code, 201)
+        commands, time_ms = response.headers['X-Database-Commands'].split('; time=')
+        self.assertGreater(int(commands), 0)
+        self.assertGreaterEqual(float(time_ms), 0)
+
+        app.config['DATABASE_COMMANDS_BUDGET'] = 1
+        with self.assertLogs(app.logger, level='WARNING') as logs:
+            client.get('/alerts')
+        app.config['DATABASE_COMMANDS_BUDGET'] = 50
+        self.assertIn('GET /alerts made', logs.output[0])
+
+        self.assertEqual(monitor.flush_endpoint_stats(), 2)
+        timer = [t for t in Timer.get_timers() if t.group == 'database' and t.name == 'POST_alert'][0]
+        self.assertEqual(timer.count, 1)
+
+        app.config['DATABASE_COMMANDS_HEADER'] = False
+        response = client.get('/alerts')
+        self.assertNotIn('X-Database-Commands', response.headers)
+
+        # without housekeeping, the first request after the interval writes the metrics
+        interval = app.config['DATABASE_METRICS_FLUSH_INTERVAL']
+        app.config['DATABASE_METRICS_FLUSH_INTERVAL'] = 1
+        try:
+            time.sleep(1.1)
+            client.get('/alerts')
+        finally:
+            app.config['DATABASE_METRICS_FLUSH_INTERVAL'] = interval
+        self.assertEqual(monitor.endpoint_stats, {})
+        timer = [t for t in Timer.get_timers() if t.group == 'database' and t.name == 'GET_alerts'][0]
+        self.assertEqual(timer.count, 3)
+
+        db.destroy_db()
+
+    def test_server_timing(self):
+
+        from alerta.app import app, db
+
+        app.config['TESTING'] = True
+        app.config['AUTH_REQUIRED'] = False
+        client = app.test_client()
+        Histogram.flush_all()  # requests made by other tests
+        db.destroy_db()
+
+        alert = '{"resource": "net01", "event": "node_down", "environment": "Production", "service": ["Network"]}'
+        response = client.post('/alert', data=alert, headers={'Content-type': 'application/json'})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Server-Timing', response.headers, 'not sent unless enabled')
+
+        server_timing_header = app.config['SERVER_TIMING_HEADER']
+        app.config['SERVER_TIMING_HEADER'] = True
+        try:
+            response = client.post('/alert', data=alert, headers={'Content-type': 'application/json'})
+            response_alerts = client.get('/alerts')
+        finally:
+            app.config['SERVER_TIMING_HEADER'] = server_timing_header
+        stages = [metric.split(';')[0] for metric in response.headers['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['auth', 'parse', 'pre_receive', 'blackout', 'dedup', 'write', 'post_receive', 'serialize', 'db', 'total'])
+
+        self.assertIn('query;dur=', response_alerts.headers['Server-Timing'])
+
+        self.assertGreater(Histogram.flush_all(), 0)
+        histogram = [h for h in Histogram.get_histograms() if h.group == 'timing' and h.name == 'POST_alert_write'][0]
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(sum(histogram.counts), 2)
+        self.assertEqual(len(histogram.counts), len(app.config['HISTOGRAM_BUCKETS']) + 1)
+        self.assertIn('alerta_timing_POST_alert_write_bucket{le="+Inf"} 2\n', Histogram.get_histograms(format='prometheus'))
+
+        db.destroy_db()
+
+    def test_histograms_flushed_by_requests(self):
+
+        from alerta.app import app, db
+
+        app.config['TESTING'] = True
+        app.config['AUTH_REQUIRED'] = False
+        client = app.test_client()
+        Histogram.flush_all()  # requests made by other tests
+        db.destroy_db()
+
+        interval = app.config['HISTOGRAM_FLUSH_INTERVAL']
+        try:
+            # times under a millisecond are not lost when written on every request
+            app.config['HISTOGRAM_FLUSH_INTERVAL'] = 0
+            for _ in range(2):
+                client.get('/alerts')
+            histogram = [h for h in Histogram.get_histograms() if h.name == 'GET_alerts_parse'][0]
+            self.assertEqual(histogram.count, 2)
+            self.assertGreater(histogram.total_time, 0)
+
+            # without housekeeping, the first request after the interval writes the histograms
+            app.config['HISTOGRAM_FLUSH_INTERVAL'] = 1
+            client.get('/alerts')
+            self.assertEqual([h for h in Histogram.get_histograms() if h.name == 'GET_alerts_parse'][0].count, 2)
+            time.sleep(1.1)
+            client.get('/alerts')
+            self.assertEqual([h for h in Histogram.get_histograms() if h.name == 'GET_alerts_parse'][0].count, 4)
+        finally:
+            app.config['HISTOGRAM_FLUSH_INTERVAL'] = interval
+
+        db.destroy_db()
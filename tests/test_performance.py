@@ -0,0 +1,56 @@
+
+import os
+import unittest
+
+from alerta.app import app, db
+from benchmarks import budget
+
+
+class PerformanceTestCase(unittest.TestCase):
+    """
+    Database operations per request are checked on every run. Throughput and latency depend on
+    the machine, so are only checked when PERFORMANCE_TESTS is set and the baseline was saved
+    on the same machine with "python -m benchmarks.budget --update".
+    """
+    def setUp(self):
+
+        budget.configure(app)
+        self.baseline = budget.load_baseline()
+
+    def tearDown(self):
+
+        db.destroy_db()
+
+    def test_database_operations(self):
+
+        results = budget.measure(requests=50, seed=20)
+        failures = budget.check_operations(results, self.baseline)
+        self.assertEqual(failures, [], '\n'.join(failures))
+
+    def test_new_alert_operations(self):
+
+        client = app.test_client()
+        alert = '{"resource": "net01", "event": "node_down", "environment": "Production", "service": ["Network"]}'
+
+        response = client.post('/alert', data=alert, headers={'Content-type': 'application/json'})
+        self.assertEqual(response.status_code, 201)
+        first = int(response.headers['X-Database-Commands'].split(';')[0])
+
+        response = client.post('/alert', data=alert, headers={'Content-type': 'application/json'})
+        self.assertEqual(response.status_code, 201)
+        duplicate = int(response.headers['X-Database-Commands'].split(';')[0])
+
+        self.assertLessEqual(first, self.baseline['operations']['alert-storm']['POST /alert'])
+        self.assertLessEqual(duplicate, self.baseline['operations']['duplicates']['POST /alert'])
+
+    @unittest.skipUnless(os.environ.get('PERFORMANCE_TESTS'), 'set PERFORMANCE_TESTS to check throughput and latency')
+    def test_throughput_and_latency(self):
+
+        database = app.config['DATABASE_ENGINE']
+        if database not in self.baseline['timings']:
+            self.skipTest('no baseline timings for %s database' % database)
+
+        runs = [budget.measure(requests=self.baseline['requests'], seed=self.baseline['seed']) for _ in range(budget.RUNS)]
+        tolerance = float(os.environ.get('PERFORMANCE_TOLERANCE', budget.TOLERANCE))
+        failures = budget.check_timings(budget.combine(runs, pick='best'), self.baseline, database, tolerance)
+        self.assertEqual(failures, [], '\n'.join(failures))
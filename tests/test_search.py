@@ -0,0 +1,110 @@
+
+import unittest
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from uuid import uuid4
+
+from alerta.app import app, db
+
+
+class SearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        app.config['TESTING'] = True
+        app.config['AUTH_REQUIRED'] = False
+        self.app = app.test_client()
+
+        db.sync_indexes()  # text search requires the text index
+
+        self.resource = str(uuid4()).upper()[:8]
+
+        self.disk_alert = {
+            'event': 'DiskFull',
+            'resource': self.resource,
+            'environment': 'Production',
+            'service': ['Storage'],
+            'severity': 'major',
+            'text': 'Disk partition /var is full',
+            'rawData': 'filesystem mounted on /var has no space left'
+        }
+
+        self.cpu_alert = {
+            'event': 'HighCpu',
+            'resource': self.resource,
+            'environment': 'Production',
+            'service': ['Compute'],
+            'severity': 'minor',
+            'text': 'CPU utilisation above threshold'
+        }
+
+        self.headers = {
+            'Content-type': 'application/json'
+        }
+
+    def tearDown(self):
+
+        db.destroy_db()
+
+    def test_search_alerts(self):
+
+        response = self.app.post('/alert', data=json.dumps(self.disk_alert), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        disk_alert_id = json.loads(response.data.decode('utf-8'))['id']
+
+        response = self.app.post('/alert', data=json.dumps(self.cpu_alert), headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+        response = self.app.get('/alerts/search?search=disk')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['alerts'][0]['id'], disk_alert_id)
+        self.assertIn('score', data['alerts'][0])
+        self.assertNotIn('rawData', data['alerts'][0])
+        self.assertNotIn('history', data['alerts'][0])
+
+        # rawData is not part of the text index
+        response = self.app.get('/alerts/search?search=mounted')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 0)
+
+        response = self.app.get('/alerts/search?search=threshold&environment=Development')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['total'], 0)
+
+    def test_search_missing_terms(self):
+
+        response = self.app.get('/alerts/search')
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_pages(self):
+
+        for i in range(6):
+            alert = dict(self.disk_alert, resource='%s-%d' % (self.resource, i))
+            response = self.app.post('/alert', data=json.dumps(alert), headers=self.headers)
+            self.assertEqual(response.status_code, 201)
+
+        resources = list()
+        for page in [1, 2, 3]:
+            response = self.app.get('/alerts/search?search=disk&limit=2&page=%d' % page)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data.decode('utf-8'))
+            self.assertEqual(data['total'], 6)
+            self.assertEqual(len(data['alerts']), 2)
+            self.assertEqual(data['more'], page < 3)
+            resources.extend(a['resource'] for a in data['alerts'])
+        self.assertEqual(sorted(resources), sorted('%s-%d' % (self.resource, i) for i in range(6)))
+
+        response = self.app.get('/alerts/search?search=disk&limit=2&page=4')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(data['message'], 'not found')
+        self.assertEqual(data['total'], 6, 'a page past the end still counts the matches')
+        self.assertEqual(data['alerts'], [])
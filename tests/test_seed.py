@@ -0,0 +1,42 @@
+
+import unittest
+
+from alerta.app import app, db
+from alerta.app.seed import Generator, seed
+
+
+class SeedTestCase(unittest.TestCase):
+
+    def setUp(self):
+
+        app.config['TESTING'] = True
+        app.config['AUTH_REQUIRED'] = False
+        self.app = app.test_client()
+
+    def tearDown(self):
+
+        db.destroy_db()
+
+    def test_reproducible(self):
+
+        first = [alert['_id'] for alert in Generator(seed=1).alerts(100)]
+        second = [alert['_id'] for alert in Generator(seed=1).alerts(100)]
+        other = [alert['_id'] for alert in Generator(seed=2).alerts(100)]
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_seed(self):
+
+        inserted = seed(db, count=500, archive=50, batch=200, progress=False, seed=1, customers=3)
+        self.assertEqual(inserted, 550)
+        self.assertEqual(db.get_count(), 500)
+
+        keys = set((a.environment, a.customer, a.resource, a.event) for a in db.get_alerts(query={'status': {'$exists': True}}, limit=500))
+        self.assertEqual(len(keys), 500)
+
+        response = self.app.get('/alerts?status=open&sort-by=lastReceiveTime&limit=10')
+        self.assertEqual(response.status_code, 200)
+
+        # alerts that already exist are skipped
+        self.assertEqual(db.bulk_insert_alerts(list(Generator(seed=1, customers=3).alerts(10))), 0)
@@ -0,0 +1,34 @@
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from alerta.app import app
+from alerta.app import shell
+
+
+class ShellTestCase(unittest.TestCase):
+
+    def test_run_by_default(self):
+
+        with mock.patch.object(app, 'run') as run:
+            shell.main([])
+        run.assert_called_once_with(host='0.0.0.0', port=8080, debug=False, threaded=True, use_reloader=False)
+
+        with mock.patch.object(app, 'run') as run:
+            shell.main(['-P', '9090', '--debug'])
+        run.assert_called_once_with(host='0.0.0.0', port=9090, debug=True, threaded=True, use_reloader=False)
+
+        with mock.patch.object(app, 'run') as run:
+            shell.main(['run'])
+        self.assertTrue(run.called)
+
+    def test_subcommand(self):
+
+        with mock.patch.object(app, 'run') as run, mock.patch.object(shell, 'indexes', return_value=0) as indexes:
+            with self.assertRaises(SystemExit):
+                shell.main(['indexes', 'verify'])
+        self.assertFalse(run.called)
+        self.assertEqual(indexes.call_args[0][0].action, 'verify')